@@ -0,0 +1,113 @@
+"""!@package AuxiliaryBenchmark
+A set of benchmarks for the auxiliary app's hot paths. Every benchmark prints a small table to the console.
+
+Usage: `python AuxiliaryBenchmark.py <benchmark>`, run `python AuxiliaryBenchmark.py --help` for the list. The GUI
+benchmarks need a display, or `QT_QPA_PLATFORM=offscreen`.
+"""
+
+import argparse
+import os
+import random
+import threading
+import time
+
+from PySide6 import QtCore, QtWidgets
+
+from AuxiliaryKeyCreator import AuxiliaryKeyCreator
+from AuxiliaryKeyGenWorker import AuxiliaryKeyGenWorker
+from AuxiliaryParallelKeyGen import AuxiliaryParallelKeyGen
+from Crypto.PublicKey import RSA
+
+
+class AuxiliaryBenchmark():
+    """!The benchmark class. Each public method is one benchmark."""
+
+    def __init__(self, repeats=3):
+        """!Constructor.
+
+        \param repeats (int): how many different prime searches each measurement is made with
+        """
+
+        self._repeats = repeats
+
+    def keygen_wait(self):
+        """!It compares the time of generating the RSA keys while the GUI thread waits for the generation by spinning
+        its event loop (as [AuxiliaryGUI](#AuxiliaryGUI) used to) with the one while it waits idle for the signals of
+        [AuxiliaryKeyGenWorker](#AuxiliaryKeyGenWorker). Every repeat uses its own seeded source of randomness for both
+        ways of waiting, so both make exactly the same prime search.
+        """
+
+        QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        key_creator = AuxiliaryKeyCreator()
+
+        def busy_wait(seed):
+            key_dict = {}
+            generation = threading.Thread(target=key_creator.generate_rsa_keys,
+                                          args=(key_dict, random.Random(seed).randbytes))
+            loop = QtCore.QEventLoop()
+            generation.start()
+            while generation.is_alive():
+                loop.processEvents()
+            generation.join()
+
+        def worker(seed):
+            worker = AuxiliaryKeyGenWorker(key_creator, "0000", stage_pause=0, randfunc=random.Random(seed).randbytes)
+            loop = QtCore.QEventLoop()
+            worker.stage_done.connect(worker.cancel)
+            worker.stage_done.connect(loop.quit)
+            worker.start()
+            loop.exec()
+            worker.wait()
+
+        print("%-6s %16s %16s %12s" % ("seed", "busy-wait [s]", "worker [s]", "vs busy"))
+        totals = [0.0, 0.0]
+        for seed in range(self._repeats):
+            times = []
+            for wait in (busy_wait, worker):
+                start = time.perf_counter()
+                wait(seed)
+                times.append(time.perf_counter() - start)
+            totals = [total + spent for total, spent in zip(totals, times)]
+            print("%-6d %16.2f %16.2f %11.0f%%" % (seed, times[0], times[1], 100 * times[1] / times[0]))
+        print("%-6s %16.2f %16.2f %11.0f%%" % ("total", totals[0], totals[1], 100 * totals[1] / totals[0]))
+
+    def parallel_keygen(self, bits=4096):
+        """!It compares the mean latency of generating a single RSA key with `RSA.generate()` on one core with the one
+        of [AuxiliaryParallelKeyGen](#AuxiliaryParallelKeyGen) with growing numbers of worker processes, up to the
+        number of CPUs. The parallel latency includes starting the pool. Every key is also exported to .pem format and
+        imported back, as the key creator's keys are.
+
+        \param bits (int): the modulus' length in bits
+        """
+
+        counts = [1]
+        while counts[-1] * 2 <= (os.cpu_count() or 1):
+            counts.append(counts[-1] * 2)
+        if counts[-1] != (os.cpu_count() or 1):
+            counts.append(os.cpu_count())
+
+        def measure(generate):
+            spent = 0.0
+            for _ in range(self._repeats):
+                start = time.perf_counter()
+                key = generate()
+                spent += time.perf_counter() - start
+                assert key.size_in_bits() == bits and RSA.import_key(key.export_key(format='PEM')) == key
+            return spent / self._repeats
+
+        print("%-16s %12s %12s" % ("engine", "mean [s]", "speed-up"))
+        serial = measure(lambda: RSA.generate(bits))
+        print("%-16s %12.2f %11.2fx" % ("RSA.generate", serial, 1.0))
+        for workers in counts:
+            keygen = AuxiliaryParallelKeyGen(workers)
+            parallel = measure(lambda: keygen.generate(bits))
+            print("%-16s %12.2f %11.2fx" % ("%d workers" % workers, parallel, serial / parallel))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks of the auxiliary app")
+    parser.add_argument('benchmark', choices=['keygen_wait', 'parallel_keygen'])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    getattr(AuxiliaryBenchmark(args.repeats), args.benchmark)()
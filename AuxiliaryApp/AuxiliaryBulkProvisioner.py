@@ -0,0 +1,285 @@
+"""!@package AuxiliaryBulkProvisioner
+It provisions many signer identities at once. The identities are read from a CSV file, each one gets its own keypair,
+encrypted private key and certificate generated on a process pool, and every bundle lands in its own output
+directory. A manifest with the fingerprints of all the bundles is written at the end.
+
+Usage: `python AuxiliaryBulkProvisioner.py identities.csv output_dir [--workers N] [--kdf-profile NAME] [--ca-dir DIR]`,
+where the CSV file has a header with the `name` and `pin` columns (and an optional `directory` column naming the
+bundle's directory, a single name inside the output directory). Every bundle is generated in a temporary directory,
+renamed to its final name only once complete, so a failed identity leaves nothing behind and can simply be provisioned
+again: running the tool once more with the same CSV file keeps the complete bundles as they are, generates the missing
+ones, and merges them into the existing manifest. With `--ca-dir`, the certificates are issued by the [local CA](#AuxiliaryLocalCA) instead of
+being self-signed.
+"""
+
+import argparse
+import csv
+import getpass
+import json
+import os
+import re
+import shutil
+import sys
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from cryptography import x509
+from Crypto.PublicKey import RSA
+from cryptography.hazmat.primitives import hashes
+
+from AuxiliaryKeyCreator import AuxiliaryKeyCreator
+from AuxiliaryLocalCA import AuxiliaryLocalCA
+from FileIO import FileIO
+from PinDerivation import PinDerivation
+
+
+Identity = namedtuple('Identity', ['name', 'pin', 'directory'])
+
+## The files of a complete bundle: the encrypted private key, the public key and the certificate.
+BUNDLE_FILES = ("ProjectBSKPrivateKey.pem", "ProjectBSKPublicKey.pem", "certyfikat.pem")
+
+## The local CA loaded once in every worker process (None when the certificates are self-signed).
+_worker_issuer = None
+
+
+def init_worker(ca_dir, ca_pin):
+    """!Initializer of the pool's worker processes. It unlocks the local CA once per process.
+
+    \param ca_dir (str): the CA's directory, or None for self-signed certificates
+    \param ca_pin (str): the PIN protecting the CA's private key
+    """
+
+    global _worker_issuer
+    if ca_dir is not None:
+        _worker_issuer = AuxiliaryLocalCA(ca_dir)
+        _worker_issuer.load(ca_pin)
+
+
+def provision_identity(identity, output_dir, kdf):
+    """!Generates a complete bundle for a single identity. It is run in the pool's worker processes.
+
+    \param identity (Identity): the identity to provision
+    \param output_dir (str): the root directory for all bundles
+    \param kdf (dict): scrypt parameters for wrapping the private key
+
+    \return (dict) the identity's manifest entry
+    """
+
+    bundle_dir = os.path.join(output_dir, identity.directory)
+    if os.path.isdir(bundle_dir) and not os.listdir(bundle_dir):
+        os.rmdir(bundle_dir)
+    if os.path.exists(bundle_dir):
+        raise FileExistsError(bundle_dir)
+    tmp_dir = tempfile.mkdtemp(prefix="." + identity.directory + ".", dir=output_dir)
+    try:
+        entry = write_bundle(identity, tmp_dir, kdf)
+        os.rename(tmp_dir, bundle_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return entry
+
+
+def write_bundle(identity, bundle_dir, kdf):
+    """!Generates an identity's keys and certificate and writes its bundle, see `provision_identity()`.
+
+    \param identity (Identity): the identity to provision
+    \param bundle_dir (str): the directory the bundle is written to
+    \param kdf (dict): scrypt parameters for wrapping the private key
+
+    \return (dict) the identity's manifest entry
+    """
+
+    key_creator = AuxiliaryKeyCreator(kdf, _worker_issuer)
+    key_dict = {
+        'key_priv': None,
+        'key_pub': None
+    }
+    key_creator.generate_rsa_keys(key_dict)
+    pin_hash = key_creator.hash_pin_with_sha256(identity.pin)
+    key_priv_with_aes = key_creator.cipher_key_with_aes(pin_hash)
+    cert = key_creator.create_certificate(identity.name)
+
+    key_creator.write_private_key(os.path.join(bundle_dir, BUNDLE_FILES[0]), key_priv_with_aes)
+    for file_name, data in zip(BUNDLE_FILES[1:], (key_dict['key_pub'], cert)):
+        FileIO.atomic_write(os.path.join(bundle_dir, file_name), data)
+
+    return {
+        'name': identity.name,
+        'directory': identity.directory,
+        'public_key_sha256': key_creator.public_key_fingerprint(),
+        'certificate_sha256': AuxiliaryBulkProvisioner.certificate_fingerprint(cert)
+    }
+
+
+def existing_bundle(identity, output_dir):
+    """!It reads the manifest entry of an identity's bundle left by an earlier run, from the bundle's files.
+
+    \param identity (Identity): the identity
+    \param output_dir (str): the root directory for all bundles
+
+    \return (dict) the identity's manifest entry, or None if the identity has no bundle yet
+
+    \exception FileExistsError if the bundle's directory exists but is not a complete bundle
+    """
+
+    bundle_dir = os.path.join(output_dir, identity.directory)
+    if not os.path.exists(bundle_dir) or (os.path.isdir(bundle_dir) and not os.listdir(bundle_dir)):
+        return None
+    if not all(os.path.isfile(os.path.join(bundle_dir, file_name)) for file_name in BUNDLE_FILES):
+        raise FileExistsError(bundle_dir)
+    with open(os.path.join(bundle_dir, BUNDLE_FILES[1]), "rb") as file:
+        public_key = RSA.import_key(file.read())
+    with open(os.path.join(bundle_dir, BUNDLE_FILES[2]), "rb") as file:
+        cert = file.read()
+    return {
+        'name': identity.name,
+        'directory': identity.directory,
+        'public_key_sha256': PinDerivation.key_id(public_key),
+        'certificate_sha256': AuxiliaryBulkProvisioner.certificate_fingerprint(cert)
+    }
+
+
+class AuxiliaryBulkProvisioner():
+    """!The bulk provisioning class. It realizes all the functionalities of this package."""
+
+    def __init__(self, output_dir, workers=None, kdf=None, ca_dir=None, ca_pin=None):
+        """!Constructor. It sets the constants used.
+
+        \param output_dir (str): the root directory for all bundles
+        \param workers (int): number of worker processes, defaults to the number of cores
+        \param kdf (dict): scrypt parameters for wrapping the private keys, defaults to the default profile
+        \param ca_dir (str): the directory of the local CA issuing the certificates, None for self-signed ones
+        \param ca_pin (str): the PIN protecting the CA's private key
+        """
+
+        Constants = namedtuple('Constants', ['MANIFEST_NAME'])
+        self._constants = Constants(MANIFEST_NAME="manifest.json")
+
+        self._output_dir = output_dir
+        self._workers = workers or os.cpu_count()
+        self._kdf = kdf or PinDerivation.kdf_profile()
+        self._ca_dir = ca_dir
+        self._ca_pin = ca_pin
+
+    @staticmethod
+    def read_identities(csv_path):
+        """!It reads the identities to provision from a CSV file.
+
+        \param csv_path (str): path to the CSV file
+
+        \return (List[Identity]) the identities read
+        """
+
+        identities = []
+        used_directories = set()
+        with open(csv_path, newline='', encoding='utf-8') as file:
+            for row in csv.DictReader(file):
+                name, pin = row['name'].strip(), row['pin'].strip()
+                if not pin.isdigit():
+                    raise ValueError("PIN for '%s' is not numeric" % name)
+                directory = (row.get('directory') or '').strip() or re.sub(r'[^\w.-]+', '_', name)
+                if directory in ('', '.', '..') or re.search(r'[\\/:]', directory):
+                    raise ValueError("Output directory '%s' has to be a single name" % directory)
+                if directory in used_directories:
+                    raise ValueError("Duplicate output directory '%s'" % directory)
+                used_directories.add(directory)
+                identities.append(Identity(name=name, pin=pin, directory=directory))
+        return identities
+
+    @staticmethod
+    def certificate_fingerprint(cert):
+        """!It computes the SHA256 fingerprint of a certificate.
+
+        \param cert (bytes): the certificate in .pem format
+
+        \return (str) the fingerprint as a hex string
+        """
+
+        return x509.load_pem_x509_certificate(cert).fingerprint(hashes.SHA256()).hex()
+
+    @property
+    def manifest_path(self):
+        """!\return (str) path to the manifest"""
+
+        return os.path.join(self._output_dir, self._constants.MANIFEST_NAME)
+
+    def load_manifest(self):
+        """!\return (dict) the manifest written by an earlier run, or an empty one if there is none"""
+
+        try:
+            with open(self.manifest_path, "r", encoding='utf-8') as file:
+                manifest = json.load(file)
+        except (FileNotFoundError, ValueError):
+            manifest = {}
+        manifest.setdefault('bundles', [])
+        manifest.setdefault('failed', [])
+        return manifest
+
+    def provision(self, identities):
+        """!Main provisioning method. It generates the missing bundles in parallel and merges them into the manifest.
+        The identities whose bundles are already complete are reported as existing and kept as they are; the failures
+        of the earlier runs are replaced by the outcome of this one.
+
+        \param identities (List[Identity]): the identities to provision
+
+        \return (dict) the manifest, with the identities of this run which failed under `failed`
+        """
+
+        os.makedirs(self._output_dir, exist_ok=True)
+        bundles, failed, to_generate = [], [], []
+        for identity in identities:
+            try:
+                entry = existing_bundle(identity, self._output_dir)
+            except Exception as e:
+                failed.append({'name': identity.name, 'directory': identity.directory, 'error': str(e)})
+                print("Nie udało się wygenerować pakietu dla: " + identity.name)
+                continue
+            if entry is None:
+                to_generate.append(identity)
+            else:
+                bundles.append(entry)
+                print("Pakiet już istnieje dla: " + identity.name)
+
+        with ProcessPoolExecutor(max_workers=self._workers, initializer=init_worker,
+                                 initargs=(self._ca_dir, self._ca_pin)) as pool:
+            futures = {pool.submit(provision_identity, identity, self._output_dir, self._kdf): identity
+                       for identity in to_generate}
+            for future in as_completed(futures):
+                identity = futures[future]
+                try:
+                    bundles.append(future.result())
+                    print("Wygenerowano pakiet dla: " + identity.name)
+                except Exception as e:
+                    failed.append({'name': identity.name, 'directory': identity.directory, 'error': str(e)})
+                    print("Nie udało się wygenerować pakietu dla: " + identity.name)
+
+        manifest = self.load_manifest()
+        this_run = {identity.directory for identity in identities}
+        merged = {entry['directory']: entry for entry in manifest['bundles'] if entry['directory'] not in this_run}
+        merged.update((entry['directory'], entry) for entry in bundles)
+        manifest['bundles'] = sorted(merged.values(), key=lambda entry: entry['directory'])
+        manifest['failed'] = [entry for entry in manifest['failed']
+                              if entry['directory'] not in this_run and entry['directory'] not in merged] + failed
+        if self._ca_dir is not None:
+            with open(AuxiliaryLocalCA(self._ca_dir).cert_path, "rb") as file:
+                manifest['ca_certificate_sha256'] = self.certificate_fingerprint(file.read())
+        FileIO.atomic_write(self.manifest_path, json.dumps(manifest, indent=2, ensure_ascii=False).encode('utf-8'))
+        return {**manifest, 'failed': failed}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Bulk provisioning of signer identities")
+    parser.add_argument('csv_path')
+    parser.add_argument('output_dir')
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--kdf-profile', choices=sorted(PinDerivation.KDF_PROFILES), default=None)
+    parser.add_argument('--ca-dir', default=None)
+    args = parser.parse_args()
+
+    ca_pin = getpass.getpass("PIN CA: ") if args.ca_dir is not None else None
+    provisioner = AuxiliaryBulkProvisioner(args.output_dir, args.workers, PinDerivation.kdf_profile(args.kdf_profile),
+                                           args.ca_dir, ca_pin)
+    result = provisioner.provision(provisioner.read_identities(args.csv_path))
+    sys.exit(1 if result['failed'] else 0)
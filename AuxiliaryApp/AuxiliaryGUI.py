@@ -1,18 +1,22 @@
 """!@package AuxiliaryGUI
 It revolves around the user interface of the auxiliary application, controls the process of key
-generation, and enables it based on feedback from [DeviceListener](#DeviceListener).
+generation, and enables it based on feedback from [DeviceListener](#DeviceListener). The generation runs on
+[AuxiliaryKeyGenWorker](#AuxiliaryKeyGenWorker)'s thread, and the GUI follows it through the worker's signals. On a
+multi-core machine, the primes are searched for on all the cores (see
+[AuxiliaryParallelKeyGen](#AuxiliaryParallelKeyGen)).
 """
 
-from threading import Thread
-
 from PySide6 import QtCore, QtWidgets
 from collections import namedtuple
-import time
+import os
 
 from PySide6.QtCore import QCoreApplication
 
 from AuxiliaryKeyCreator import AuxiliaryKeyCreator
+from AuxiliaryKeyGenWorker import AuxiliaryKeyGenWorker
+from AuxiliaryParallelKeyGen import AuxiliaryParallelKeyGen
 from DLThread import DLThread
+from DeviceEventCoalescer import DeviceEventCoalescer
 from DeviceListener import DeviceListener
 
 
@@ -28,18 +32,23 @@ class AuxiliaryGUI(QtWidgets.QWidget):
         self._constants = Constants(NR_OF_STAGES=6)
 
         self._current_stage_nr = 0
-        self._key_creator = AuxiliaryKeyCreator()
+        self._key_creator = AuxiliaryKeyCreator(
+            keygen=AuxiliaryParallelKeyGen() if (os.cpu_count() or 1) > 1 else None)
+        self._worker = None
 
         print("Inicjowanie DeviceListenera...")
-        self._listener = DeviceListener(on_change=self.on_devices_changed)
+        self._listener = DeviceListener(on_change=lambda: self._coalescer.notify())
+        self._coalescer = DeviceEventCoalescer(self._listener.list_drives, parent=self)
+        self._coalescer.medium_changed.connect(self.on_devices_changed)
 
         print("Pobieranie informacji o dyskach...")
-        self._is_d_drive_connected = self.find_d_drive()
+        self._is_d_drive_connected = self.find_d_drive(self._coalescer.refresh())
 
         print("Inicjowanie GUI...")
         self._d_drive_comm = QtWidgets.QLabel("Pendrive nie jest podpiety" if not self._is_d_drive_connected else "Pendrive jest podpiety")
         self._ending_comm = QtWidgets.QLabel("")
         self._button = QtWidgets.QPushButton("Rozpocznij generowanie")
+        self._button_cancel = QtWidgets.QPushButton("Przerwij generowanie")
         self._button_close = QtWidgets.QPushButton("Wyjdź z programu")
 
         self._layout = QtWidgets.QVBoxLayout(self)
@@ -75,20 +84,23 @@ class AuxiliaryGUI(QtWidgets.QWidget):
         self.generation_stages_init()
 
         self._button.clicked.connect(self.proceed)
+        self._button_cancel.clicked.connect(self.cancel)
         self._button_close.clicked.connect(self.end_listening)
         self._button_close.clicked.connect(QCoreApplication.instance().quit)
 
         self._grid.setEnabled(False)
 
         self._button.setEnabled(self._is_d_drive_connected)
+        self._button_cancel.setEnabled(False)
 
         self._layout.addWidget(self._info, alignment=QtCore.Qt.AlignmentFlag.AlignTop)
         self._layout.addWidget(self._d_drive_comm, alignment=QtCore.Qt.AlignmentFlag.AlignBottom)
         self._layout.addWidget(self._ending_comm, alignment=QtCore.Qt.AlignmentFlag.AlignTop)
         self._layout.addWidget(self._button, alignment=QtCore.Qt.AlignmentFlag.AlignBottom)
+        self._layout.addWidget(self._button_cancel, alignment=QtCore.Qt.AlignmentFlag.AlignBottom)
         self._layout.addWidget(self._button_close, alignment=QtCore.Qt.AlignmentFlag.AlignBottom)
 
-        self._listenerThread = DLThread(target=self._listener.start)
+        self._listenerThread = DLThread(target=self._listener.start, listener=self._listener)
         self._listenerThread.start()
         print("Inicjalizacja zakonczona")
 
@@ -116,10 +128,11 @@ class AuxiliaryGUI(QtWidgets.QWidget):
     def proceed(self):
         """!\brief Controller of the generation process.
 
-        Controller of the generation process. It resets the app with `generation_stages_init()`, and executes all the
-        steps necessary for the generation process to succeed, by invoking the adequate methods of
-         [AuxiliaryKeyCreator](#AuxiliaryKeyCreator) class. It shows the user all relevant progress messages, and
-         changes the position of the progress arrow. Lastly, it presents the result of actions taken to the user.
+        Controller of the generation process. It resets the app with `generation_stages_init()`, asks for the PIN, and
+         starts [AuxiliaryKeyGenWorker](#AuxiliaryKeyGenWorker), which executes the remaining steps by invoking the
+         adequate methods of [AuxiliaryKeyCreator](#AuxiliaryKeyCreator) class on its own thread. The worker's signals
+         show the user all relevant progress messages, and change the position of the progress arrow (see
+         `on_stage_done()`). Lastly, the result of actions taken is presented to the user.
         """
 
         self.generation_stages_init()
@@ -132,54 +145,84 @@ class AuxiliaryGUI(QtWidgets.QWidget):
         self._button.repaint()
 
         self.show_current_arrow(self._current_stage_nr)
-        pin = int(self.ask_for_pin())
+        pin = self.ask_for_pin()
         self.set_texts()
-        time.sleep(0.5)
-
         self.show_current_arrow(self._current_stage_nr)
-        key_dict = {
-            'key_priv': None,
-            'key_pub': None
-        }
-        a = Thread(target=self._key_creator.generate_rsa_keys, args=(key_dict, ))
-        a.start()
-        while a.is_alive():
-            QtWidgets.QApplication.instance().processEvents()
-        a.join()
-        key_priv = key_dict['key_priv']
-        key_pub = key_dict['key_pub']
-        self.set_texts()
-        time.sleep(0.5)
 
-        self.show_current_arrow(self._current_stage_nr)
-        pin_hash = self._key_creator.hash_pin_with_sha256(pin)
-        self.set_texts()
-        time.sleep(0.5)
+        self._worker = AuxiliaryKeyGenWorker(self._key_creator, pin, parent=self)
+        self._worker.stage_done.connect(self.on_stage_done)
+        self._worker.progress.connect(self.on_progress)
+        self._worker.finished.connect(self.on_finished)
+        self._worker.failed.connect(self.on_failed)
+        self._worker.cancelled.connect(self.on_cancelled)
+        self._button_cancel.setEnabled(True)
+        self._worker.start()
 
-        self.show_current_arrow(self._current_stage_nr)
-        key_priv_with_aes = self._key_creator.cipher_key_with_aes(pin_hash, key_priv)
-        self.set_texts()
-        time.sleep(0.5)
+    @QtCore.Slot()
+    def cancel(self):
+        """!It asks the running generation to stop (see `AuxiliaryKeyGenWorker.cancel()`)."""
 
-        self.show_current_arrow(self._current_stage_nr)
-        self._key_creator.write_public_key_to_file(key_pub)
-        self.set_texts()
-        time.sleep(0.5)
+        if self._worker is not None:
+            self._worker.cancel()
+
+    @QtCore.Slot(int)
+    def on_stage_done(self, stage):
+        """!It marks a stage done by the worker, and moves the progress arrow to the next one. From the first writing
+        stage on, the generation cannot be cancelled.
+
+        \param stage (int): the stage's number
+        """
 
-        self.show_current_arrow(self._current_stage_nr)
-        b = Thread(target=self._key_creator.write_private_key_to_pendrive, args=(key_priv_with_aes,))
-        b.start()
-        while b.is_alive():
-            QtWidgets.QApplication.instance().processEvents()
-        b.join()
         self.set_texts()
+        if self._current_stage_nr < self._constants.NR_OF_STAGES:
+            self.show_current_arrow(self._current_stage_nr)
+        if self._current_stage_nr >= AuxiliaryKeyGenWorker.FIRST_WRITING_STAGE:
+            self._button_cancel.setEnabled(False)
+
+    @QtCore.Slot(int)
+    def on_progress(self, draws):
+        """!It shows the progress of the prime search.
+
+        \param draws (int): the number of random numbers (or candidates, for the parallel search) drawn by the prime
+        search so far
+        """
+
+        if self._current_stage_nr == 1:
+            self._stage_comms[1].setText(self._start_texts[1] + " (wylosowano %d liczb)" % draws)
+
+    @QtCore.Slot()
+    def on_finished(self):
+        """!It presents the successful end of the generation to the user."""
 
         self._arrows[self._current_stage_nr - 1].hide()
-        self._ending_comm.setText("Wykonano wszystkie zadania")
+        self._ending_comm.setText(self._ending_comm_text)
+        self.end_generation()
 
-        self._button.setEnabled(True)
-        self._button.repaint()
+    @QtCore.Slot(str)
+    def on_failed(self, error):
+        """!It presents a failed generation to the user.
+
+        \param error (str): the error's description
+        """
+
+        self._ending_comm.setText("Generowanie nie powiodło się: " + error)
+        self.end_generation()
 
+    @QtCore.Slot()
+    def on_cancelled(self):
+        """!It resets the app after a cancelled generation."""
+
+        self.generation_stages_init()
+        self._ending_comm.setText("Przerwano generowanie")
+        self.end_generation()
+
+    def end_generation(self):
+        """!It releases the worker and enables the buttons accordingly."""
+
+        self._worker = None
+        self._button_cancel.setEnabled(False)
+        self._button.setEnabled(self._is_d_drive_connected)
+        self._button.repaint()
 
     def ask_for_pin(self):
         """!\brief Getting pin from the user
@@ -217,16 +260,19 @@ class AuxiliaryGUI(QtWidgets.QWidget):
         self._stage_checks[self._current_stage_nr].setChecked(True)
         self._current_stage_nr += 1
 
-    def find_d_drive(self):
+    def find_d_drive(self, drives=None):
         """!\brief Checking the pendrive's status.
 
-        It calls the listener's `list_drives()` function, and checks if the pendrive (with a private key present) is
-        amongst them.
+        It checks if the pendrive is amongst the given drives, or the ones returned by the listener's `list_drives()`
+        function if none are given.
+
+        \param drives (List[Drive]): the drives to check
 
-        \return (bool) whether the pendrive with a key was found or
+        \return (bool) whether the pendrive was found or
         """
 
-        drives = self._listener.list_drives()
+        if drives is None:
+            drives = self._listener.list_drives()
         removable_drives = [d for d in drives if d.is_removable]
         for drive in removable_drives:
             if drive.letter == 'D:':
@@ -234,35 +280,36 @@ class AuxiliaryGUI(QtWidgets.QWidget):
 
         return False
 
-    def on_devices_changed(self):
+    @QtCore.Slot(list, list)
+    def on_devices_changed(self, appeared, disappeared):
         """!\brief Checking the device setup changes.
 
-        It's called by [DeviceListener](#DeviceListener) class when a change in drives' configuration has been detected.
-         It calls the `find_d_drive()` method to ascertain the desired pendrive's presence, and if so, it loads the
-         encrypted private key (via initializing the [AuxiliaryKeyCreator](#AuxiliaryKeyCreator) class), and starts the
-         signing process.
+        It's called on the GUI thread, through [DeviceEventCoalescer](#DeviceEventCoalescer), once per physical
+         change of the removable drives. It calls the `find_d_drive()` method on the coalescer's drive snapshot to
+         ascertain the desired pendrive's presence, and enables the generation accordingly.
+
+        \param appeared (List[Drive]): removable drives that appeared
+        \param disappeared (List[Drive]): removable drives that disappeared
         """
 
-        self._d_drive_comm.setText("Sprawdzam zmiany urzadzen zewnetrznych...")
-        self._d_drive_comm.repaint()
-        self._button.setEnabled(False)
-        self._button.repaint()
-        is_found = self.find_d_drive()
+        is_found = self.find_d_drive(self._coalescer.snapshot)
         if not self._is_d_drive_connected and is_found:
             self._is_d_drive_connected = True
             self._d_drive_comm.setText("Pendrive jest podpiety")
-            self._button.setEnabled(True)
+            self._button.setEnabled(self._worker is None)
         elif self._is_d_drive_connected and not is_found:
             self._is_d_drive_connected = False
             self._d_drive_comm.setText("Pendrive nie jest podpiety")
             self._button.setEnabled(False)
 
-        self._d_drive_comm.repaint()
-        self._button.repaint()
-        self.repaint()
-
     def end_listening(self):
-        """!A method for ending the listener's thread."""
+        """!A method for ending the listener's thread. A running generation is cancelled and awaited first, so the
+        keys are never left half-written.
+        """
 
+        if self._worker is not None:
+            self._worker.cancel()
+            self._worker.wait()
+        self._coalescer.cancel()
         self._listenerThread.kill()
         self._listenerThread.join()
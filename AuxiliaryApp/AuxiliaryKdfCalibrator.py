@@ -0,0 +1,116 @@
+"""!@package AuxiliaryKdfCalibrator
+It measures the host and picks the scrypt parameters wrapping the private key, so that unlocking the key takes about
+the requested time without exceeding the memory budget. The cost never goes below `MIN_LOG_N`, the weakest protection
+accepted: a memory budget too small for it is refused, and a time target it cannot meet is only reported, in the result
+and on the console. The result can be saved to the file read by
+[AuxiliaryKeyCreator](#AuxiliaryKeyCreator).
+
+Usage: `python AuxiliaryKdfCalibrator.py [--target-ms 500] [--memory-mb 128] [--save]`
+"""
+
+import argparse
+import json
+import time
+from collections import namedtuple
+
+from Crypto.Protocol.KDF import scrypt
+from Crypto.Random import get_random_bytes
+
+from FileIO import FileIO
+from PinDerivation import PinDerivation
+
+
+class AuxiliaryKdfCalibrator():
+    """!The calibrator class. It realizes all the functionalities of this package."""
+
+    def __init__(self, target_seconds=0.5, memory_budget=128 * 2 ** 20):
+        """!Constructor. It sets the constants used and the calibration goals.
+
+        \param target_seconds (float): the desired unlock time
+        \param memory_budget (int): the maximum memory in bytes a single unlock may use (recent PyCryptodome versions
+        refuse to unlock keys needing more than 256 MiB by default)
+        """
+
+        Constants = namedtuple('Constants', ['BLOCK_SIZE', 'PARALLELIZATION', 'MIN_LOG_N', 'MAX_LOG_N', 'PROBE_LOG_N',
+                                             'KEY_LENGTH', 'PATH_TO_KDF_CONFIG'])
+        self._constants = Constants(BLOCK_SIZE=8, PARALLELIZATION=1, MIN_LOG_N=14, MAX_LOG_N=22, PROBE_LOG_N=14,
+                                    KEY_LENGTH=32, PATH_TO_KDF_CONFIG="kdf.json")
+        self._target_seconds = target_seconds
+        self._memory_budget = memory_budget
+
+    def measure(self, n, r, p):
+        """!It measures a single scrypt derivation with the given parameters.
+
+        \param n (int): CPU/memory cost
+        \param r (int): block size
+        \param p (int): parallelization
+
+        \return (float) time in seconds
+        """
+
+        password, salt = get_random_bytes(32), get_random_bytes(16)
+        start = time.perf_counter()
+        scrypt(password, salt, self._constants.KEY_LENGTH, n, r, p)
+        return time.perf_counter() - start
+
+    def calibrate(self):
+        """!It picks the largest power-of-two cost that fits both the time target and the memory budget. The time of
+        one probe derivation is extrapolated linearly (scrypt's cost is linear in N), and the pick is then measured.
+        The cost is at least `MIN_LOG_N`; if even that takes longer than the target, it is picked anyway and the result
+        says so (`over_target`).
+
+        \return (dict) the chosen parameters, along with the measured unlock time
+
+        \exception ValueError if the memory budget is too small for the minimum cost
+        """
+
+        r, p = self._constants.BLOCK_SIZE, self._constants.PARALLELIZATION
+        minimum = {'n': 2 ** self._constants.MIN_LOG_N, 'r': r, 'p': p}
+        if PinDerivation.kdf_memory(minimum) > self._memory_budget:
+            raise ValueError("Budżet pamięci %d B jest mniejszy niż minimum %d B wymagane przez N=2^%d"
+                             % (self._memory_budget, PinDerivation.kdf_memory(minimum), self._constants.MIN_LOG_N))
+        probe_n = 2 ** self._constants.PROBE_LOG_N
+        seconds_per_n = self.measure(probe_n, r, p) / probe_n
+
+        log_n = self._constants.MIN_LOG_N
+        while log_n < self._constants.MAX_LOG_N:
+            candidate = {'n': 2 ** (log_n + 1), 'r': r, 'p': p}
+            if PinDerivation.kdf_memory(candidate) > self._memory_budget:
+                break
+            if seconds_per_n * candidate['n'] > self._target_seconds:
+                break
+            log_n += 1
+
+        kdf = {'profile': 'calibrated', 'n': 2 ** log_n, 'r': r, 'p': p}
+        kdf['measured_ms'] = round(self.measure(kdf['n'], r, p) * 1000, 1)
+        kdf['memory_bytes'] = PinDerivation.kdf_memory(kdf)
+        kdf['over_target'] = log_n == self._constants.MIN_LOG_N and kdf['measured_ms'] > self._target_seconds * 1000
+        if kdf['over_target']:
+            print("Uwaga: minimalny koszt N=2^%d zajmuje %.1f ms, więcej niż docelowe %.1f ms"
+                  % (log_n, kdf['measured_ms'], self._target_seconds * 1000))
+        return kdf
+
+    def save(self, kdf):
+        """!It atomically saves the chosen parameters for [AuxiliaryKeyCreator](#AuxiliaryKeyCreator).
+
+        \param kdf (dict): the parameters
+        """
+
+        FileIO.atomic_write(self._constants.PATH_TO_KDF_CONFIG, json.dumps(kdf, indent=2).encode('utf-8'))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="scrypt cost calibration")
+    parser.add_argument('--target-ms', type=float, default=500)
+    parser.add_argument('--memory-mb', type=int, default=128)
+    parser.add_argument('--save', action='store_true')
+    args = parser.parse_args()
+
+    calibrator = AuxiliaryKdfCalibrator(args.target_ms / 1000, args.memory_mb * 2 ** 20)
+    try:
+        result = calibrator.calibrate()
+    except ValueError as e:
+        parser.error(str(e))
+    print(json.dumps(result, indent=2))
+    if args.save:
+        calibrator.save(result)
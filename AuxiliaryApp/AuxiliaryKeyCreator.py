@@ -2,101 +2,175 @@
 It provides all the functionalities necessary from the technical perspective to execute the key generation proccess.
 """
 
+import datetime
+import json
 from collections import namedtuple
-import time
 
-from Crypto.Hash import SHA256
 from Crypto.Cipher import AES
 from Crypto.PublicKey import RSA
+from Crypto.Random import get_random_bytes
 
-from OpenSSL import crypto
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.x509.oid import NameOID
+
+from FileIO import FileIO
+from PinDerivation import PinDerivation
 
 
 class AuxiliaryKeyCreator():
     """!The generator class. It realizes all the functionalities of this package."""
 
-    def __init__(self):
-        """!Constructor. It sets the constants used."""
+    def __init__(self, kdf=None, issuer=None, keygen=None):
+        """!Constructor. It sets the constants used and picks the scrypt parameters for wrapping the key.
 
-        Constants = namedtuple('Constants', ['LENGTH_OF_RSA_KEY', 'KEY_FORMAT', 'CIPHER_MODE', 'PATH_FOR_TO__PUBLIC_KEY_FILE'])
-        self._constants = Constants(LENGTH_OF_RSA_KEY=4096, KEY_FORMAT='PEM', CIPHER_MODE=AES.MODE_CBC, PATH_FOR_TO__PUBLIC_KEY_FILE=
-                                        "C:/Studia/BSK/ProjektBSK/AuxiliaryApp")
+        \param kdf (dict): scrypt parameters; if not given, the ones saved by
+        [AuxiliaryKdfCalibrator](#AuxiliaryKdfCalibrator) are used, or the default profile if there are none
+        \param issuer (AuxiliaryLocalCA): a loaded local CA issuing the certificates; if not given, the certificates
+        are self-signed
+        \param keygen (AuxiliaryParallelKeyGen): an engine searching for the primes on several cores; if not given,
+        the key is generated on the calling thread with `RSA.generate()`
+        """
 
-    def generate_rsa_keys(self, arg):
+        Constants = namedtuple('Constants', ['LENGTH_OF_RSA_KEY', 'KEY_FORMAT', 'CIPHER_MODE', 'PATH_FOR_TO__PUBLIC_KEY_FILE',
+                                             'PATH_TO_PRIVATE_KEY', 'COMMON_NAME', 'PATH_TO_KDF_CONFIG'])
+        self._constants = Constants(LENGTH_OF_RSA_KEY=4096, KEY_FORMAT='PEM', CIPHER_MODE=AES.MODE_CBC, PATH_FOR_TO__PUBLIC_KEY_FILE=
+                                        "C:/Studia/BSK/ProjektBSK/AuxiliaryApp", PATH_TO_PRIVATE_KEY="D:/ProjectBSKPrivateKey.pem",
+                                    COMMON_NAME="Adam Zarzycki 193243", PATH_TO_KDF_CONFIG="kdf.json")
+        self._kdf = kdf or self.load_kdf_config(self._constants.PATH_TO_KDF_CONFIG)
+        self._issuer = issuer
+        self._keygen = keygen
+        self._keypair = None
+        self._key_priv_with_aes = None
+        self._cert = None
+        self._pin_metadata = None
+
+    def generate_rsa_keys(self, arg, randfunc=None, poll=None):
         """!Main generator method.
 
         It generates the RSA keys and exports them to .pem format
 
         \param arg ({__setitem__}): a way of returning the keys to [AuxiliaryGUI](#AuxiliaryGUI).
+        \param randfunc (Callable[[int], bytes]): the source of randomness of the prime search (see
+        [AuxiliaryKeyGenWorker](#AuxiliaryKeyGenWorker)), `get_random_bytes` by default; not used by the parallel
+        engine, whose workers draw their own randomness
+        \param poll (Callable[[int], None]): passed on to the parallel engine (see
+        [AuxiliaryParallelKeyGen](#AuxiliaryParallelKeyGen)), not used otherwise
         """
 
-        self._keypair = RSA.generate(self._constants.LENGTH_OF_RSA_KEY)
+        if self._keygen is not None:
+            self._keypair = self._keygen.generate(self._constants.LENGTH_OF_RSA_KEY, poll=poll)
+        else:
+            self._keypair = RSA.generate(self._constants.LENGTH_OF_RSA_KEY, randfunc=randfunc)
         arg['key_priv'] = self._keypair.export_key(format=self._constants.KEY_FORMAT)
         arg['key_pub'] = self._keypair.public_key().export_key(format=self._constants.KEY_FORMAT)
 
 
     def hash_pin_with_sha256(self, pin):
-        """!It hashes the pin provided with SHA256.
+        """!It derives the key's passphrase from the pin provided, with a fresh salt (see [PinDerivation](#PinDerivation)).
 
-        \param pin (int): the pin provided
+        \param pin (str): the pin provided
 
-        \return (bytes) hash of the pin
+        \return (bytes) the passphrase
         """
 
-        self._pin_hash = SHA256.new(bytes(pin))
+        self._pin_metadata = PinDerivation.new_metadata(self._kdf)
+        self._pin_hash = PinDerivation.derive_passphrase(pin, self._pin_metadata)
         return self._pin_hash
 
     def cipher_key_with_aes(self, pin_hash):
-        """!It encrypts the private key with AES256 algorithm.
+        """!It encrypts the private key with AES256 algorithm, deriving the AES key with scrypt using the chosen cost
+        parameters. This is the only scrypt derivation of the whole generation process.
 
-        \param pin_hash (bytes): hash of the pin used as AES passphrase
+        \param pin_hash (bytes): passphrase derived from the pin
 
         \return (bytes) the encrypted private key
         """
-        key_priv_with_aes = self._keypair.export_key(passphrase=pin_hash.digest(),
-                                                format=self._constants.KEY_FORMAT,
-                                pkcs=8,
-                                protection='scryptAndAES256-CBC')
-        return key_priv_with_aes
+        self._key_priv_with_aes = PinDerivation.wrap_key(self._keypair, pin_hash, self._kdf)
+        return self._key_priv_with_aes
+
+    @staticmethod
+    def load_kdf_config(path):
+        """!It loads the scrypt parameters saved by [AuxiliaryKdfCalibrator](#AuxiliaryKdfCalibrator).
+
+        \param path (str): path to the saved parameters
+
+        \return (dict) the parameters, or the default profile if the file does not exist
+        """
+
+        try:
+            with open(path, "r", encoding='utf-8') as file:
+                return json.load(file)
+        except FileNotFoundError:
+            return PinDerivation.kdf_profile()
 
     def write_public_key_to_file(self):
-        """!It writes the public key to a .pem file."""
+        """!It writes the public key and its certificate to .pem files."""
 
-        with open(self._constants.PATH_FOR_TO__PUBLIC_KEY_FILE + "/ProjectBSKPublicKey.pem", "wb") as file:
-            key_pub_save = self._keypair.public_key().export_key(format=self._constants.KEY_FORMAT)
-            file.write(key_pub_save)
         self.gen_cert()
+        key_pub_save = self._keypair.public_key().export_key(format=self._constants.KEY_FORMAT)
+        FileIO.atomic_write(self._constants.PATH_FOR_TO__PUBLIC_KEY_FILE + "/ProjectBSKPublicKey.pem", key_pub_save)
+        FileIO.atomic_write(self._constants.PATH_FOR_TO__PUBLIC_KEY_FILE + "/certyfikat.pem", self._cert)
 
     def write_private_key_to_pendrive(self, key_priv_with_aes):
-        """!It writes the private key to a .pem file.
+        """!It writes the private key to a .pem file, along with the metadata needed to derive its passphrase.
+
+        \param key_priv_with_aes (bytes): the encrypted private key
+        """
+
+        self.write_private_key(self._constants.PATH_TO_PRIVATE_KEY, key_priv_with_aes)
+
+    def write_private_key(self, path, key_priv_with_aes):
+        """!It writes the private key and its PIN metadata (including the key ID) to the given path.
 
+        \param path (str): path to the private key file
         \param key_priv_with_aes (bytes): the encrypted private key
         """
 
-        with open("D:/ProjectBSKPrivateKey.pem", "wb") as file:
-            file.write(key_priv_with_aes)
+        PinDerivation.write_wrapped_key(path, key_priv_with_aes,
+                                        dict(self._pin_metadata, key_id=self.public_key_fingerprint()))
 
     def gen_cert(self):
-        """!It generates a certificate based on the generated public key, needed for later PAdES digital signature, and saves it
-        to a file.
+        """!It generates a certificate based on the generated keypair, needed for later PAdES digital signature. The
+        keypair is taken from memory, so neither the public key file nor the pendrive are read back.
+
+        \return (bytes) the certificate in .pem format
+        """
+
+        self._cert = self.create_certificate(self._constants.COMMON_NAME)
+        return self._cert
+
+    def create_certificate(self, common_name):
+        """!It generates a certificate straight from the keypair held in memory, without touching any files. The
+        certificate is issued by the local CA if one was given, and self-signed otherwise.
+
+        \param common_name (str): the CN of the certificate's subject
+
+        \return (bytes) the certificate in .pem format
+        """
+
+        if self._issuer is not None:
+            return self._issuer.issue(self._keypair.public_key(), common_name)
+
+        key = serialization.load_der_private_key(self._keypair.export_key(format='DER'), password=None)
+        name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert_sign = (x509.CertificateBuilder()
+                     .subject_name(name).issuer_name(name).public_key(key.public_key())
+                     .serial_number(int.from_bytes(get_random_bytes(8), 'big') >> 1)
+                     .not_valid_before(now).not_valid_after(now + datetime.timedelta(days=10 * 365))
+                     .add_extension(x509.KeyUsage(digital_signature=True, content_commitment=True,
+                                                  key_encipherment=False, data_encipherment=False, key_agreement=False,
+                                                  key_cert_sign=False, crl_sign=False, encipher_only=False,
+                                                  decipher_only=False), critical=False)
+                     .add_extension(x509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+                     .sign(key, hashes.SHA256()))
+        return cert_sign.public_bytes(serialization.Encoding.PEM)
+
+    def public_key_fingerprint(self):
+        """!It computes the SHA256 fingerprint of the public key (its DER `SubjectPublicKeyInfo` encoding).
+
+        \return (str) the fingerprint as a hex string
         """
 
-        timestamp_epoch_time_start = 0
-        key = crypto.load_publickey(crypto.FILETYPE_PEM,
-                                    open("C:/Studia/BSK/ProjektBSK/AuxiliaryApp/ProjectBSKPublicKey.pem").read())
-        keyPriv = crypto.load_privatekey(crypto.FILETYPE_PEM,
-                                         open("D:/ProjectBSKPrivateKey.pem").read(), self._pin_hash.digest())
-        timestamp_epoch_time_end = 10 * 365 * 24 * 60 * 60
-        cert_sign = crypto.X509()
-        cert_sign.get_subject().CN = "Adam Zarzycki 193243"
-        cert_sign.set_serial_number(int(time.time()))
-        cert_sign.gmtime_adj_notBefore(timestamp_epoch_time_start)
-        cert_sign.gmtime_adj_notAfter(timestamp_epoch_time_end)
-        cert_sign.set_issuer(cert_sign.get_subject())
-        cert_sign.set_pubkey(key)
-        cert_sign.add_extensions([crypto.X509Extension(b"keyUsage", False, b"digitalSignature,nonRepudiation")])
-        cert_sign.sign(keyPriv, "sha256")
-        sign_cert = crypto.dump_certificate(crypto.FILETYPE_PEM, cert_sign)
-
-        with open("certyfikat.pem", "wb") as certfile:
-            certfile.write(sign_cert)
+        return PinDerivation.key_id(self._keypair)
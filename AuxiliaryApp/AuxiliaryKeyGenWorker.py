@@ -0,0 +1,155 @@
+"""!@package AuxiliaryKeyGenWorker
+It runs the key generation process of [AuxiliaryGUI](#AuxiliaryGUI) on a background thread, so the GUI thread stays
+idle (instead of spinning its event loop until the generation ends) and the whole CPU is left to the prime search.
+The progress is reported through Qt signals, which are safely delivered to the GUI thread.
+
+The RSA prime search draws its candidates (and the bases of its Miller-Rabin tests) from the worker's source of
+randomness; the worker counts the draws to report the search's progress, and checks for cancellation with every draw,
+so a cancelled generation stops right away. When the key creator searches for the primes on several cores (see
+[AuxiliaryParallelKeyGen](#AuxiliaryParallelKeyGen)), the search polls the worker instead, with the number of candidates
+tested so far, and the worker stops it the same way. Once the keys start being written, the generation can no longer be
+cancelled, so the public and private keys are always written together.
+"""
+
+import threading
+import time
+
+from Crypto.Random import get_random_bytes
+from PySide6 import QtCore
+
+
+class KeyGenerationCancelled(Exception):
+    """!Raised inside the worker's thread when the generation has been cancelled."""
+
+
+class AuxiliaryKeyGenWorker(QtCore.QObject):
+    """!The key generation worker class. It realizes all the functionalities of this package.
+
+    Attributes:
+    + stage_done: signal emitted with the number of every finished stage (see `STAGES`)
+    + progress: signal emitted with the number of random numbers drawn (or of candidates tested, by the parallel
+    search) by the prime search so far, at most every `PROGRESS_INTERVAL` seconds
+    + finished: signal emitted when all the stages are done
+    + failed: signal emitted with the error's description when a stage fails
+    + cancelled: signal emitted when the generation stops after `cancel()`
+    """
+
+    stage_done = QtCore.Signal(int)
+    progress = QtCore.Signal(int)
+    finished = QtCore.Signal()
+    failed = QtCore.Signal(str)
+    cancelled = QtCore.Signal()
+
+    ## The stages run by the worker, numbered as in [AuxiliaryGUI](#AuxiliaryGUI) (stage 0 is asking for the PIN).
+    STAGES = (1, 2, 3, 4, 5)
+    ## The first stage writing to the disk; it cannot be cancelled any more from there on.
+    FIRST_WRITING_STAGE = 4
+    PROGRESS_INTERVAL = 0.1
+
+    def __init__(self, key_creator, pin, stage_pause=0.5, randfunc=get_random_bytes, parent=None):
+        """!Constructor.
+
+        \param key_creator (AuxiliaryKeyCreator): the key creator running the stages
+        \param pin (str): the PIN the private key is protected with
+        \param stage_pause (float): the pause after every stage, so each of them can be seen in the GUI, in seconds
+        \param randfunc (Callable[[int], bytes]): the source of randomness of the prime search
+        \param parent (QObject): the Qt parent, living in the GUI thread
+        """
+
+        super().__init__(parent)
+        self._key_creator = key_creator
+        self._pin = pin
+        self._stage_pause = stage_pause
+        self._randfunc = randfunc
+        self._cancel = threading.Event()
+        self._thread = None
+        self._draws = 0
+        self._last_progress = 0.0
+
+    def start(self):
+        """!It starts the generation on a daemon thread."""
+
+        self._thread = threading.Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def cancel(self):
+        """!It asks the generation to stop. It stops during the prime search or before the next stage, unless the keys
+        are already being written.
+        """
+
+        self._cancel.set()
+
+    def wait(self, timeout=None):
+        """!It waits for the generation's thread to end.
+
+        \param timeout (float): the longest wait in seconds, None for no limit
+
+        \return (bool) whether the thread has ended
+        """
+
+        if self._thread is not None:
+            self._thread.join(timeout)
+        return self._thread is None or not self._thread.is_alive()
+
+    def _draw(self, length):
+        """!The prime search's source of randomness. It counts the draws, reports the progress and stops the search
+        if the generation has been cancelled.
+
+        \param length (int): the number of random bytes
+
+        \return (bytes) the random bytes
+        """
+
+        if self._cancel.is_set():
+            raise KeyGenerationCancelled()
+        self._draws += 1
+        now = time.monotonic()
+        if now - self._last_progress >= self.PROGRESS_INTERVAL:
+            self._last_progress = now
+            self.progress.emit(self._draws)
+        return self._randfunc(length)
+
+    def _poll(self, tested):
+        """!Polled by the parallel prime search. It reports the progress and stops the search if the generation has
+        been cancelled.
+
+        \param tested (int): the number of candidates tested so far
+        """
+
+        if self._cancel.is_set():
+            raise KeyGenerationCancelled()
+        self._draws = tested
+        self.progress.emit(tested)
+
+    def run(self):
+        """!It runs all the stages, one after another, on the calling thread."""
+
+        key_dict = {
+            'key_priv': None,
+            'key_pub': None
+        }
+        try:
+            for stage in self.STAGES:
+                if stage <= self.FIRST_WRITING_STAGE and self._cancel.is_set():
+                    raise KeyGenerationCancelled()
+                if stage == 1:
+                    self._key_creator.generate_rsa_keys(key_dict, randfunc=self._draw, poll=self._poll)
+                    self.progress.emit(self._draws)
+                elif stage == 2:
+                    pin_hash = self._key_creator.hash_pin_with_sha256(self._pin)
+                elif stage == 3:
+                    key_priv_with_aes = self._key_creator.cipher_key_with_aes(pin_hash)
+                elif stage == 4:
+                    self._key_creator.write_public_key_to_file()
+                else:
+                    self._key_creator.write_private_key_to_pendrive(key_priv_with_aes)
+                self.stage_done.emit(stage)
+                if stage != self.STAGES[-1]:
+                    time.sleep(self._stage_pause)
+        except KeyGenerationCancelled:
+            self.cancelled.emit()
+            return
+        except Exception as e:
+            self.failed.emit(str(e) or type(e).__name__)
+            return
+        self.finished.emit()
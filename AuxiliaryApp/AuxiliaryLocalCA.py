@@ -0,0 +1,275 @@
+"""!@package AuxiliaryLocalCA
+A local issuing certificate authority. Instead of every signer getting its own self-signed certificate, signer
+certificates are issued under a single root, so the verifying side needs to trust that one root only.
+
+The CA's private key is wrapped with a PIN exactly like the signers' keys (see [PinDerivation](#PinDerivation)).
+
+The CA publishes revocation data as a CRL file (`ca.crl`), to be copied next to its root in the verifying side's trust
+store, so signatures can carry it for long-term validation. If the CA is created with a CRL URL, the issued
+certificates point to it, and validators then require the CRL. The CA's settings file (`ca.json`) keeps every revoked
+certificate with the date it was revoked at, and the number of the last CRL issued, so every new CRL gets a higher
+number and keeps the revocation dates of the previous ones.
+
+Usage: `python AuxiliaryLocalCA.py init <ca_dir> --name "Root CA name" [--crl-url <url>]`, and
+`python AuxiliaryLocalCA.py crl <ca_dir> [--revoke <serial> ...]`
+"""
+
+import argparse
+import datetime
+import getpass
+import json
+import os
+from collections import namedtuple
+
+from Crypto.PublicKey import RSA
+from Crypto.Random import get_random_bytes
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.x509.oid import NameOID
+
+from FileIO import FileIO
+from PinDerivation import PinDerivation
+
+
+class AuxiliaryLocalCA():
+    """!The local CA class. It realizes all the functionalities of this package."""
+
+    def __init__(self, ca_dir):
+        """!Constructor. It sets the constants used.
+
+        \param ca_dir (str): the directory holding the CA's key and certificate
+        """
+
+        Constants = namedtuple('Constants', ['LENGTH_OF_RSA_KEY', 'KEY_FILE', 'CERT_FILE', 'CONFIG_FILE', 'CRL_FILE',
+                                             'CA_VALIDITY', 'CERT_VALIDITY', 'CRL_VALIDITY_DAYS'])
+        self._constants = Constants(LENGTH_OF_RSA_KEY=4096, KEY_FILE="ca_key.pem", CERT_FILE="ca_cert.pem",
+                                    CONFIG_FILE="ca.json", CRL_FILE="ca.crl", CA_VALIDITY=20 * 365 * 24 * 60 * 60,
+                                    CERT_VALIDITY=10 * 365 * 24 * 60 * 60, CRL_VALIDITY_DAYS=30)
+        self._ca_dir = ca_dir
+        self._ca_key = None
+        self._ca_cert = None
+        self._config = {'crl_url': None, 'revoked': [], 'crl_number': 0}
+
+    @property
+    def key_path(self):
+        """!\return (str) path to the CA's encrypted private key"""
+
+        return os.path.join(self._ca_dir, self._constants.KEY_FILE)
+
+    @property
+    def cert_path(self):
+        """!\return (str) path to the CA's certificate"""
+
+        return os.path.join(self._ca_dir, self._constants.CERT_FILE)
+
+    @property
+    def crl_path(self):
+        """!\return (str) path to the CA's CRL"""
+
+        return os.path.join(self._ca_dir, self._constants.CRL_FILE)
+
+    @property
+    def config_path(self):
+        """!\return (str) path to the CA's settings and list of revoked certificates"""
+
+        return os.path.join(self._ca_dir, self._constants.CONFIG_FILE)
+
+    def write_config(self):
+        """!It atomically saves the CA's settings and list of revoked certificates."""
+
+        FileIO.atomic_write(self.config_path, json.dumps(self._config, indent=2).encode('utf-8'))
+
+    @property
+    def cert_pem(self):
+        """!\return (bytes) the CA's certificate in .pem format"""
+
+        return self._ca_cert.public_bytes(serialization.Encoding.PEM)
+
+    @staticmethod
+    def serial_number():
+        """!\return (int) a random, positive 63-bit certificate serial number"""
+
+        return int.from_bytes(get_random_bytes(8), 'big') >> 1
+
+    def certificate_builder(self, common_name, public_key, validity):
+        """!It starts a certificate valid from now on, with a random serial number.
+
+        \param common_name (str): the CN of the certificate's subject
+        \param public_key (RSAPublicKey): the subject's public key
+        \param validity (int): the validity period in seconds
+
+        \return (CertificateBuilder) the builder, still without the issuer and the extensions
+        """
+
+        now = datetime.datetime.now(datetime.timezone.utc)
+        return (x509.CertificateBuilder()
+                .subject_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)]))
+                .public_key(public_key)
+                .serial_number(self.serial_number())
+                .not_valid_before(now)
+                .not_valid_after(now + datetime.timedelta(seconds=validity))
+                .add_extension(x509.SubjectKeyIdentifier.from_public_key(public_key), critical=False))
+
+    @staticmethod
+    def key_usage(digital_signature=False, content_commitment=False, key_cert_sign=False, crl_sign=False):
+        """!\return (KeyUsage) the key usage extension with the given usages, and no others"""
+
+        return x509.KeyUsage(digital_signature=digital_signature, content_commitment=content_commitment,
+                             key_encipherment=False, data_encipherment=False, key_agreement=False,
+                             key_cert_sign=key_cert_sign, crl_sign=crl_sign, encipher_only=False, decipher_only=False)
+
+    @staticmethod
+    def import_key(keypair):
+        """!\return (RSAPrivateKey) the PyCryptodome keypair as a key the certificates are signed with"""
+
+        return serialization.load_der_private_key(keypair.export_key(format='DER'), password=None)
+
+    def create(self, common_name, pin, kdf=None, crl_url=None):
+        """!It generates the CA's keypair and self-signed root certificate, and saves them in the CA's directory, along
+        with an empty CRL.
+
+        \param common_name (str): the CN of the root certificate
+        \param pin (str): the PIN protecting the CA's private key
+        \param kdf (dict): scrypt parameters for wrapping the CA's private key
+        \param crl_url (str): the URL the CRL is published at, written into the issued certificates
+        """
+
+        os.makedirs(self._ca_dir, exist_ok=True)
+        if os.path.exists(self.key_path):
+            raise FileExistsError(self.key_path)
+
+        keypair = RSA.generate(self._constants.LENGTH_OF_RSA_KEY)
+        self._ca_key = self.import_key(keypair)
+        builder = self.certificate_builder(common_name, self._ca_key.public_key(), self._constants.CA_VALIDITY)
+        self._ca_cert = (builder
+                         .issuer_name(x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, common_name)]))
+                         .add_extension(x509.BasicConstraints(ca=True, path_length=0), critical=True)
+                         .add_extension(self.key_usage(key_cert_sign=True, crl_sign=True), critical=True)
+                         .sign(self._ca_key, hashes.SHA256()))
+
+        metadata = PinDerivation.new_metadata(kdf)
+        wrapped = PinDerivation.wrap_key(keypair, PinDerivation.derive_passphrase(pin, metadata), metadata['kdf'])
+        PinDerivation.write_wrapped_key(self.key_path, wrapped, metadata)
+        FileIO.atomic_write(self.cert_path, self.cert_pem)
+        self._config = {'crl_url': crl_url, 'revoked': [], 'crl_number': 0}
+        self.write_config()
+        self.issue_crl()
+
+    def load(self, pin):
+        """!It loads the CA's certificate and unlocks its private key.
+
+        \param pin (str): the PIN protecting the CA's private key
+        """
+
+        with open(self.key_path, "rb") as file:
+            keypair = RSA.import_key(file.read(), PinDerivation.passphrase_for(self.key_path, pin))
+        self._ca_key = self.import_key(keypair)
+        with open(self.cert_path, "rb") as file:
+            self._ca_cert = x509.load_pem_x509_certificate(file.read())
+        if os.path.isfile(self.config_path):
+            with open(self.config_path, "r", encoding='utf-8') as file:
+                self._config = json.load(file)
+            if 'crl_number' not in self._config:
+                self._config['crl_number'] = self.last_crl_number()
+            if any(not isinstance(entry, dict) for entry in self._config['revoked']):
+                # the settings of older versions listed the serial numbers only, so the date of the first load is the
+                # best date that can be kept for them
+                now = datetime.datetime.now(datetime.timezone.utc).isoformat()
+                self._config['revoked'] = [entry if isinstance(entry, dict) else
+                                           {'serial_number': entry, 'revocation_date': now}
+                                           for entry in self._config['revoked']]
+                self.write_config()
+
+    def issue(self, public_key, common_name):
+        """!It issues a signer certificate for the given public key.
+
+        \param public_key (RsaKey): the signer's public key
+        \param common_name (str): the CN of the signer's certificate
+
+        \return (bytes) the certificate in .pem format
+        """
+
+        subject_key = serialization.load_der_public_key(public_key.export_key(format='DER'))
+        builder = (self.certificate_builder(common_name, subject_key, self._constants.CERT_VALIDITY)
+                   .issuer_name(self._ca_cert.subject)
+                   .add_extension(x509.BasicConstraints(ca=False, path_length=None), critical=True)
+                   .add_extension(self.key_usage(digital_signature=True, content_commitment=True), critical=True)
+                   .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(self._ca_key.public_key()),
+                                  critical=False))
+        if self._config.get('crl_url'):
+            builder = builder.add_extension(x509.CRLDistributionPoints([
+                x509.DistributionPoint([x509.UniformResourceIdentifier(self._config['crl_url'])], None, None, None)
+            ]), critical=False)
+        return builder.sign(self._ca_key, hashes.SHA256()).public_bytes(serialization.Encoding.PEM)
+
+    def last_crl_number(self):
+        """!\return (int) the number of the CRL saved in the CA's directory, 0 if there is none"""
+
+        try:
+            with open(self.crl_path, "rb") as file:
+                crl = x509.load_der_x509_crl(file.read())
+            return crl.extensions.get_extension_for_class(x509.CRLNumber).value.crl_number
+        except (FileNotFoundError, x509.ExtensionNotFound):
+            return 0
+
+    def revoke(self, serial_number):
+        """!It adds a certificate to the list of revoked certificates, with the current date as its revocation date. The
+        revocation takes effect with the next `issue_crl()`.
+
+        \param serial_number (int): the revoked certificate's serial number
+        """
+
+        if all(entry['serial_number'] != serial_number for entry in self._config['revoked']):
+            now = datetime.datetime.now(datetime.timezone.utc)
+            self._config['revoked'].append({'serial_number': serial_number, 'revocation_date': now.isoformat()})
+            self.write_config()
+
+    def issue_crl(self):
+        """!It signs a new CRL listing all the revoked certificates with their revocation dates, valid for
+        `CRL_VALIDITY_DAYS`, and saves it in the CA's directory in DER format. The CRL's number is the previous one
+        plus one, saved before the CRL is, so a number is never issued twice.
+
+        \return (bytes) the CRL in DER format
+        """
+
+        self._config['crl_number'] += 1
+        self.write_config()
+        now = datetime.datetime.now(datetime.timezone.utc)
+        builder = (x509.CertificateRevocationListBuilder()
+                   .issuer_name(self._ca_cert.subject)
+                   .last_update(now)
+                   .next_update(now + datetime.timedelta(days=self._constants.CRL_VALIDITY_DAYS))
+                   .add_extension(x509.AuthorityKeyIdentifier.from_issuer_public_key(self._ca_key.public_key()), False)
+                   .add_extension(x509.CRLNumber(self._config['crl_number']), False))
+        for entry in self._config['revoked']:
+            builder = builder.add_revoked_certificate(
+                x509.RevokedCertificateBuilder().serial_number(entry['serial_number'])
+                .revocation_date(datetime.datetime.fromisoformat(entry['revocation_date'])).build())
+        crl = builder.sign(self._ca_key, hashes.SHA256()).public_bytes(serialization.Encoding.DER)
+        FileIO.atomic_write(self.crl_path, crl)
+        return crl
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Local issuing CA")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    init_parser = subparsers.add_parser('init', help="create the CA's key and root certificate")
+    init_parser.add_argument('ca_dir')
+    init_parser.add_argument('--name', required=True)
+    init_parser.add_argument('--kdf-profile', choices=sorted(PinDerivation.KDF_PROFILES), default=None)
+    init_parser.add_argument('--crl-url', default=None)
+    crl_parser = subparsers.add_parser('crl', help="revoke certificates and issue a new CRL")
+    crl_parser.add_argument('ca_dir')
+    crl_parser.add_argument('--revoke', type=int, nargs='*', default=[])
+    args = parser.parse_args()
+
+    ca = AuxiliaryLocalCA(args.ca_dir)
+    if args.command == 'init':
+        ca.create(args.name, getpass.getpass("PIN CA: "), PinDerivation.kdf_profile(args.kdf_profile), args.crl_url)
+        print("Utworzono CA w katalogu: " + args.ca_dir)
+    else:
+        ca.load(getpass.getpass("PIN CA: "))
+        for serial_number in args.revoke:
+            ca.revoke(serial_number)
+        ca.issue_crl()
+        print("Wystawiono listę CRL: " + ca.crl_path)
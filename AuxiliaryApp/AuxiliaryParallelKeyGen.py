@@ -0,0 +1,184 @@
+"""!@package AuxiliaryParallelKeyGen
+An RSA key generation engine spreading the search for the primes over a process pool, so a single key is generated
+faster on a multi-core machine.
+
+Most of the time of an RSA key generation goes to drawing random candidates for each of the primes and testing them.
+Here, every worker process draws and tests its own candidates for the same prime, and the first prime found stops all
+the other workers, through a shared event. The primes meet the same criteria as the ones of PyCryptodome's
+`RSA.generate()` (FIPS 186-4): every candidate passes the same filters (the lower bound making `p * q` exactly as long
+as the modulus, `p - 1` coprime with `e`, and `p` and `q` far enough apart) and the same probabilistic primality test
+(Miller-Rabin rounds with random bases, followed by a Lucas test), and the key is rejected again if its private
+exponent is too small. The key is built with `RSA.construct()`, which checks its consistency, so it is an ordinary
+`RsaKey`, exported to .pem format as any other.
+
+With a single worker, the pool only adds the cost of starting a process and of sharing the counter of tested
+candidates, so the key is generated with `RSA.generate()` on the calling process instead.
+
+The module imports no GUI code, as it is imported again by the worker processes on the systems which spawn them.
+"""
+
+import math
+import multiprocessing
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from Crypto.Math.Numbers import Integer
+from Crypto.Math.Primality import PROBABLY_PRIME, test_probable_prime
+from Crypto.PublicKey import RSA
+from Crypto.Random import get_random_bytes
+
+## The stop event and the counter of tested candidates, inherited by every worker process of the pool.
+_stop = None
+_tested = None
+
+
+def init_worker(stop, tested):
+    """!Initializer of the pool's worker processes.
+
+    \param stop (multiprocessing.Event): the event stopping the search
+    \param tested (multiprocessing.Value): the counter of candidates tested by all the workers
+    """
+
+    global _stop, _tested
+    _stop, _tested = stop, tested
+
+
+def search_prime(exact_bits, e, min_value, other, min_distance):
+    """!It draws and tests candidates for a prime until one is found, or until another worker finds one. It is run
+    in the pool's worker processes.
+
+    \param exact_bits (int): the prime's length in bits
+    \param e (int): the public exponent, `prime - 1` has to be coprime with it
+    \param min_value (int): the prime has to be greater than it
+    \param other (int): the other prime of the key, None while looking for the first one
+    \param min_distance (int): the prime has to differ from the other prime by more than it
+
+    \return (int) the prime, or None if the search was stopped
+    """
+
+    while not _stop.is_set():
+        candidate = Integer.random(exact_bits=exact_bits) | 1
+        with _tested.get_lock():
+            _tested.value += 1
+        if candidate <= min_value or (candidate - 1).gcd(e) != 1:
+            continue
+        if other is not None and abs(int(candidate) - other) <= min_distance:
+            continue
+        if test_probable_prime(candidate) == PROBABLY_PRIME:
+            _stop.set()
+            return int(candidate)
+    return None
+
+
+class AuxiliaryParallelKeyGen():
+    """!The parallel key generation class. It realizes all the functionalities of this package."""
+
+    ## How often the waiting for the workers is interrupted to report the progress, in seconds.
+    POLL_INTERVAL = 0.1
+
+    def __init__(self, workers=None):
+        """!Constructor.
+
+        \param workers (int): the number of worker processes, the number of CPUs by default
+        """
+
+        self._workers = workers or os.cpu_count() or 1
+        self._stop = multiprocessing.Event()
+        self._tested = multiprocessing.Value('q', 0)
+
+    @property
+    def workers(self):
+        """!\return (int) the number of worker processes"""
+
+        return self._workers
+
+    def generate(self, bits, e=65537, poll=None):
+        """!It generates an RSA key. The pool of worker processes lives for the duration of the call. With a single
+        worker, the key is generated by `RSA.generate()` on the calling process, polled through its source of
+        randomness, and `poll` is given the number of random numbers drawn instead.
+
+        \param bits (int): the modulus' length in bits
+        \param e (int): the public exponent
+        \param poll (Callable[[int], None]): called every `POLL_INTERVAL` seconds of the search with the number of
+        candidates tested so far; an exception it raises stops the search and is passed on
+
+        \return (RsaKey) the key
+        """
+
+        if self._workers == 1:
+            return RSA.generate(bits, randfunc=self._polling_randfunc(poll), e=e)
+
+        size_q = bits // 2
+        size_p = bits - size_q
+        min_q = math.isqrt(1 << (2 * size_q - 1))
+        min_p = math.isqrt(1 << (2 * size_p - 1)) if size_p != size_q else min_q
+        min_distance = 1 << (bits // 2 - 100)
+
+        self._tested.value = 0
+        with ProcessPoolExecutor(max_workers=self._workers, initializer=init_worker,
+                                 initargs=(self._stop, self._tested)) as executor:
+            while True:
+                p = self._find_prime(executor, poll, size_p, e, min_p, None, 0)
+                q = self._find_prime(executor, poll, size_q, e, min_q, p, min_distance)
+                n = p * q
+                lcm = (p - 1) * (q - 1) // math.gcd(p - 1, q - 1)
+                d = pow(e, -1, lcm)
+                if n.bit_length() == bits and d >= 1 << (bits // 2):
+                    break
+
+        if p > q:
+            p, q = q, p
+        return RSA.construct((n, e, d, p, q, pow(p, -1, q)))
+
+    def _polling_randfunc(self, poll):
+        """!It wraps the source of randomness of `RSA.generate()`, counting the draws and calling `poll` with their
+        number every `POLL_INTERVAL` seconds.
+
+        \param poll (Callable[[int], None]): see `generate()`
+
+        \return (Callable[[int], bytes]) the source of randomness
+        """
+
+        if poll is None:
+            return get_random_bytes
+        state = {'draws': 0, 'last_poll': time.monotonic()}
+
+        def randfunc(length):
+            state['draws'] += 1
+            now = time.monotonic()
+            if now - state['last_poll'] >= self.POLL_INTERVAL:
+                state['last_poll'] = now
+                poll(state['draws'])
+            return get_random_bytes(length)
+
+        return randfunc
+
+    def _find_prime(self, executor, poll, exact_bits, e, min_value, other, min_distance):
+        """!It runs the search for one prime on all the workers, and waits until they have all stopped.
+
+        \param executor (ProcessPoolExecutor): the pool
+        \param poll (Callable[[int], None]): see `generate()`
+        \param exact_bits, e, min_value, other, min_distance: see `search_prime()`
+
+        \return (int) the prime
+        """
+
+        self._stop.clear()
+        searches = [executor.submit(search_prime, exact_bits, e, min_value, other, min_distance)
+                    for _ in range(self._workers)]
+        try:
+            pending, prime = set(searches), None
+            while prime is None:
+                done, pending = wait(pending, timeout=self.POLL_INTERVAL, return_when=FIRST_COMPLETED)
+                primes = [search.result() for search in done if search.result() is not None]
+                if primes:
+                    prime = primes[0]
+                elif not pending:
+                    raise RuntimeError("Przerwano wyszukiwanie liczby pierwszej")
+                elif poll is not None:
+                    poll(self._tested.value)
+        finally:
+            self._stop.set()
+            wait(searches)
+        return prime
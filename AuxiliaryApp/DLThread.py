@@ -4,19 +4,20 @@ A wrapper for python's `threading.Thread` class, with added [DeviceListener](#De
 
 import threading
 
-import win32api
-import win32con
-
 
 class DLThread(threading.Thread):
     """!The main class, inheriting from `threading.Thread` python class."""
 
-    def __init__(self, *args, **keywords):
-        """!Constructor."""
+    def __init__(self, *args, listener=None, **keywords):
+        """!Constructor.
+
+        \param listener (DeviceListener): the listener run by the thread
+        """
 
         super().__init__(*args, **keywords)
+        self._listener = listener
 
     def kill(self):
-        """!It stops the associated listener by sending an appropriate win32api message."""
+        """!It stops the associated listener through its backend."""
 
-        win32api.PostThreadMessage(self.ident, win32con.WM_QUIT, 0, 0)
+        self._listener.stop()
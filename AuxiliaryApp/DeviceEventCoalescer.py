@@ -0,0 +1,92 @@
+"""!@package DeviceEventCoalescer
+It turns the bursts of notifications sent by [DeviceListener](#DeviceListener) for a single USB insert or removal into
+one event. Notifications are debounced, after the burst the removable drives are enumerated once and compared with the
+previous snapshot, and only an actual difference is reported, through a Qt signal that is safely delivered to the GUI
+thread.
+"""
+
+import threading
+from typing import Callable, Dict, List
+
+from PySide6 import QtCore
+
+from DeviceBackend import Drive
+
+
+class DeviceEventCoalescer(QtCore.QObject):
+    """!The coalescer class. It realizes all the functionalities of this package.
+
+    Attributes:
+    + medium_changed: signal emitted with the lists of removable drives that appeared and disappeared
+    """
+
+    medium_changed = QtCore.Signal(list, list)
+
+    def __init__(self, list_drives: Callable[[], List[Drive]], debounce_seconds=0.3, parent=None):
+        """!Constructor.
+
+        \param list_drives (Callable[[], List[Drive]]): method enumerating the drives
+        \param debounce_seconds (float): how long after the last notification the drives are enumerated
+        \param parent (QObject): the Qt parent, living in the GUI thread
+        """
+
+        super().__init__(parent)
+        self._list_drives = list_drives
+        self._debounce_seconds = debounce_seconds
+        self._snapshot: Dict[str, Drive] = {}
+        self._timer = None
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+
+    @property
+    def snapshot(self) -> List[Drive]:
+        """!\return (List[Drive]) the removable drives found by the last enumeration"""
+
+        with self._lock:
+            return list(self._snapshot.values())
+
+    def refresh(self) -> List[Drive]:
+        """!It enumerates the drives right away and makes the result the current snapshot, without emitting anything.
+
+        \return (List[Drive]) the removable drives
+        """
+
+        snapshot = {drive.letter: drive for drive in self._list_drives() if drive.is_removable}
+        with self._lock:
+            self._snapshot = snapshot
+        return list(snapshot.values())
+
+    def notify(self):
+        """!Called by the listener for every notification, on the listener's thread. It (re)starts the debounce
+        timer.
+        """
+
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+            self._timer = threading.Timer(self._debounce_seconds, self._flush)
+            self._timer.daemon = True
+            self._timer.start()
+
+    def cancel(self):
+        """!It cancels a pending enumeration."""
+
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def _flush(self):
+        """!Called once the burst is over. It enumerates the drives, compares them with the previous snapshot and emits
+        `medium_changed` if anything changed.
+        """
+
+        with self._flush_lock:
+            snapshot = {drive.letter: drive for drive in self._list_drives() if drive.is_removable}
+            with self._lock:
+                previous, self._snapshot = self._snapshot, snapshot
+
+            appeared = [drive for letter, drive in snapshot.items() if previous.get(letter) != drive]
+            disappeared = [drive for letter, drive in previous.items() if snapshot.get(letter) != drive]
+            if appeared or disappeared:
+                self.medium_changed.emit(appeared, disappeared)
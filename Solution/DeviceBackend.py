@@ -0,0 +1,63 @@
+"""!@package DeviceBackend
+The interface of the platform-specific drive detection backends used by [DeviceListener](#DeviceListener), and the
+[Drive](#Drive) dataclass they report.
+"""
+
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable, List
+
+
+@dataclass
+class Drive:
+    """!A dataclass for storing found drives' information.
+
+    Attributes:
+    + letter: drive's letter (on Windows) or mount point (on Linux)
+    + label: drive's label
+    + drive_type: drive's type
+    + device: the underlying block device, if known
+    + volume_id: an identifier of the volume surviving re-insertion (filesystem UUID or volume serial), if known
+    """
+
+    letter: str
+    label: str
+    drive_type: str
+    device: str = ''
+    volume_id: str = ''
+
+    @property
+    def is_removable(self) -> bool:
+        """!Whether the drive is removable or not."""
+
+        return self.drive_type == 'Removable Disk'
+
+
+class DeviceBackend(ABC):
+    """!The backend interface. A backend enumerates the mounted drives and blocks waiting for changes. A backend
+    missing any of the abstract methods cannot be constructed.
+    """
+
+    @abstractmethod
+    def list_drives(self) -> List[Drive]:
+        """!Lists all attached drives.
+
+        \return (List[Drive]) a list of drives
+        """
+
+    @abstractmethod
+    def watch(self, on_change: Callable[[], None]):
+        """!Blocks the calling thread, calling `on_change()` every time a drive appears or disappears, until `stop()`
+        is called.
+
+        \param on_change (Callable[[], None]): method to be called
+        """
+
+    @abstractmethod
+    def stop(self):
+        """!Makes `watch()` return. It is safe to call it from another thread."""
+
+    def close(self):
+        """!Releases the backend's resources."""
+
+        pass
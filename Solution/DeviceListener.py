@@ -1,144 +1,62 @@
 """!@package DeviceListener
-The listener package for detecting changes in drives' configuration, based on
-[this article]( https://abdus.dev/posts/python-monitor-usb/), and configured to fit the project requirements.
+The listener package for detecting changes in drives' configuration. The platform-specific work is delegated to a
+[DeviceBackend](#DeviceBackend): [Win32DeviceBackend](#Win32DeviceBackend) on Windows, based on
+[this article]( https://abdus.dev/posts/python-monitor-usb/), and [LinuxDeviceBackend](#LinuxDeviceBackend) on Linux.
 """
 
-import json
-import subprocess
-from dataclasses import dataclass
+import sys
 from typing import Callable, List
 
-import win32api, win32con, win32gui
-
-
-@dataclass
-class Drive:
-    """!A dataclass for storing found drives' information.
-
-    Attributes:
-    + letter: drive's letter
-    + label: drive's label
-    + drive_type: drive's type
-    """
-
-    letter: str
-    label: str
-    drive_type: str
-
-    @property
-    def is_removable(self) -> bool:
-        """!Whether the drive is removable or not."""
-
-        return self.drive_type == 'Removable Disk'
+from DeviceBackend import DeviceBackend, Drive
 
 
 class DeviceListener:
-    """!Main listener class. It realizes all of ths package's functionalities.
-
-    Attributes:
-    + WM_DEVICECHANGE_EVENTS: a dictionary of event codes with their description
-    """
-
-    WM_DEVICECHANGE_EVENTS = {
-        0x0019: ('DBT_CONFIGCHANGECANCELED', 'A request to change the current configuration (dock or undock) has been canceled.'),
-        0x0018: ('DBT_CONFIGCHANGED', 'The current configuration has changed, due to a dock or undock.'),
-        0x8006: ('DBT_CUSTOMEVENT', 'A custom event has occurred.'),
-        0x8000: ('DBT_DEVICEARRIVAL', 'A device or piece of media has been inserted and is now available.'),
-        0x8001: ('DBT_DEVICEQUERYREMOVE', 'Permission is requested to remove a device or piece of media. Any application can deny this request and cancel the removal.'),
-        0x8002: ('DBT_DEVICEQUERYREMOVEFAILED', 'A request to remove a device or piece of media has been canceled.'),
-        0x8004: ('DBT_DEVICEREMOVECOMPLETE', 'A device or piece of media has been removed.'),
-        0x8003: ('DBT_DEVICEREMOVEPENDING', 'A device or piece of media is about to be removed. Cannot be denied.'),
-        0x8005: ('DBT_DEVICETYPESPECIFIC', 'A device-specific event has occurred.'),
-        0x0007: ('DBT_DEVNODES_CHANGED', 'A device has been added to or removed from the system.'),
-        0x0017: ('DBT_QUERYCHANGECONFIG', 'Permission is requested to change the current configuration (dock or undock).'),
-        0xFFFF: ('DBT_USERDEFINED', 'The meaning of this message is user-defined.'),
-    }
-
-    def __init__(self, on_change: Callable[[], None]):
-        """!Constructor. Sets the method called.
+    """!Main listener class. It realizes all of ths package's functionalities."""
+
+    def __init__(self, on_change: Callable[[], None], backend: DeviceBackend = None):
+        """!Constructor. Sets the method called and the backend used.
 
         \param on_change (Callable[[], None]): method to be called
+        \param backend (DeviceBackend): the backend, the current platform's one by default
         """
 
         self.on_change = on_change
+        self._backend = backend or self.default_backend()
 
-    def _create_window(self):
-        """!Creates a new win32 message window.
+    @staticmethod
+    def default_backend() -> DeviceBackend:
+        """!Creates the backend of the current platform.
 
-        \return (int) handler for the new window
+        \return (DeviceBackend) the backend
         """
 
-        wc = win32gui.WNDCLASS()
-        wc.lpfnWndProc = self._on_message
-        wc.lpszClassName = self.__class__.__name__
-        wc.hInstance = win32api.GetModuleHandle(None)
-        class_atom = win32gui.RegisterClass(wc)
-        return win32gui.CreateWindow(class_atom, self.__class__.__name__, 0, 0, 0, 0, 0, 0, 0, wc.hInstance, None)
+        if sys.platform == 'win32':
+            from Win32DeviceBackend import Win32DeviceBackend
+            return Win32DeviceBackend()
+        if sys.platform.startswith('linux'):
+            from LinuxDeviceBackend import LinuxDeviceBackend
+            return LinuxDeviceBackend()
+        raise NotImplementedError("No drive detection backend for platform: " + sys.platform)
 
     def start(self):
-        """!Entry point of the class. Calls for a new window and starts taking in messages."""
+        """!Entry point of the class. It blocks, taking in the backend's notifications until `stop()` is called."""
 
-        self.hwnd = self._create_window()
-        win32gui.PumpMessages()
+        self._backend.watch(self.on_change)
 
-    def close(self):
-        """!Closes the window."""
-
-        win32gui.CloseWindow(self.hwnd)
+    def stop(self):
+        """!Makes `start()` return. It is safe to call it from another thread."""
 
-    def _on_message(self, hwnd: int, msg: int, wparam: int, lparam: int):
-        """!The method called after a new message arrives. It checks whether an important change occurred, and calls
-        the provided `on_change()` method.
+        self._backend.stop()
 
-        \param hwnd (int): handler for the window
-        \param msg (int): the processed message
-        \param wparam (int): the higher part of the message word
-        \param lparam (int): the lower part of the message word
-
-        \return 0 - method finished correctly
-        """
+    def close(self):
+        """!Releases the backend's resources."""
 
-        if msg != win32con.WM_DEVICECHANGE:
-            return 0
-        event, description = self.WM_DEVICECHANGE_EVENTS[wparam]
-        if event in ('DBT_DEVICEREMOVECOMPLETE', 'DBT_DEVICEARRIVAL'):
-            self.on_change()
-        return 0
+        self._backend.close()
 
-    @staticmethod
-    def list_drives() -> List[Drive]:
+    def list_drives(self) -> List[Drive]:
         """!Lists all attached drives, with the detail level provided by [Drive](#Drive) class.
 
-        \return (ListDrive]) a list of drives
+        \return (List[Drive]) a list of drives
         """
 
-        proc = subprocess.run(
-            args=[
-                'powershell',
-                '-noprofile',
-                '-command',
-                'Get-WmiObject -Class Win32_LogicalDisk | Select-Object deviceid,volumename,drivetype | ConvertTo-Json'
-            ],
-            text=True,
-            stdout=subprocess.PIPE
-        )
-        if proc.returncode != 0 or not proc.stdout.strip():
-            return []
-        devices = json.loads(proc.stdout)
-
-        drive_types = {
-            0: 'Unknown',
-            1: 'No Root Directory',
-            2: 'Removable Disk',
-            3: 'Local Disk',
-            4: 'Network Drive',
-            5: 'Compact Disc',
-            6: 'RAM Disk',
-        }
-
-        return [Drive(
-            letter=d['deviceid'],
-            label=d['volumename'],
-            drive_type=drive_types[d['drivetype']]
-        ) for d in devices]
-
+        return self._backend.list_drives()
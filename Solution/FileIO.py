@@ -0,0 +1,33 @@
+"""!@package FileIO
+File writing shared by the whole project. A file is written atomically: the data goes to a temporary file of its own
+next to the target, which is then renamed over the target, so the target is either left untouched or fully written,
+and writers of the same file never share a temporary file.
+"""
+
+import os
+import tempfile
+
+
+class FileIO():
+    """!The file IO class. All of its methods are static, as it holds no state."""
+
+    @staticmethod
+    def atomic_write(path, data):
+        """!It writes the data to a unique temporary file next to the target and renames it over the target.
+
+        \param path (str): path to the target file
+        \param data (bytes): the data to write
+        """
+
+        directory, name = os.path.split(os.path.abspath(path))
+        descriptor, tmp_path = tempfile.mkstemp(prefix=name + ".", suffix=".tmp", dir=directory)
+        try:
+            with os.fdopen(descriptor, "wb") as file:
+                file.write(data)
+                file.flush()
+                os.fsync(file.fileno())
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
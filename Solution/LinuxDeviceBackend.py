@@ -0,0 +1,146 @@
+"""!@package LinuxDeviceBackend
+The Linux drive detection backend. Drives are enumerated by parsing `/proc/self/mountinfo` and the `removable` flags in
+sysfs, and mount table changes are awaited with `poll()` on `/proc/self/mountinfo`, so no process is ever spawned.
+"""
+
+import os
+import re
+import select
+from typing import Callable, List
+
+from DeviceBackend import DeviceBackend, Drive
+
+
+class LinuxDeviceBackend(DeviceBackend):
+    """!The Linux backend."""
+
+    def __init__(self, mountinfo_path='/proc/self/mountinfo', sysfs_block_path='/sys/class/block',
+                 labels_path='/dev/disk/by-label', uuids_path='/dev/disk/by-uuid'):
+        """!Constructor.
+
+        \param mountinfo_path (str): path to the mount table
+        \param sysfs_block_path (str): path to the sysfs block device class
+        \param labels_path (str): path to the directory of filesystem label symlinks
+        \param uuids_path (str): path to the directory of filesystem UUID symlinks
+        """
+
+        self._mountinfo_path = mountinfo_path
+        self._sysfs_block_path = sysfs_block_path
+        self._labels_path = labels_path
+        self._uuids_path = uuids_path
+        self._stop_read, self._stop_write = os.pipe()
+
+    @staticmethod
+    def _unescape(field):
+        """!Decodes the octal escapes used in the mount table (e.g. `\\040` for a space) and the hex escapes used in
+        the names of label symlinks (e.g. `\\x20`).
+
+        \param field (str): the escaped field
+
+        \return (str) the decoded field
+        """
+
+        if '\\' not in field:
+            return field
+        return re.sub(r'\\([0-7]{3})|\\x([0-9a-fA-F]{2})',
+                      lambda match: chr(int(match.group(1), 8) if match.group(1) else int(match.group(2), 16)), field)
+
+    def _is_removable(self, device_name):
+        """!Checks the sysfs `removable` flag of the disk a block device belongs to. Partitions are looked up through
+        their parent disk. Disks attached over USB are treated as removable even if they do not set the flag.
+
+        \param device_name (str): the kernel name of the block device (e.g. `sdb1`)
+
+        \return (bool) whether the device is removable
+        """
+
+        device_path = os.path.realpath(os.path.join(self._sysfs_block_path, device_name))
+        if os.path.exists(os.path.join(device_path, 'partition')):
+            device_path = os.path.dirname(device_path)
+        try:
+            with open(os.path.join(device_path, 'removable'), 'rb') as file:
+                if file.read(1) == b'1':
+                    return True
+        except OSError:
+            return False
+        return '/usb' in device_path
+
+    def _symlink_names(self, directory):
+        """!Reads a `/dev/disk/by-*` directory.
+
+        \param directory (str): the directory of symlinks
+
+        \return (Dict[str, str]) the symlinks' names by kernel block device name
+        """
+
+        names = {}
+        try:
+            with os.scandir(directory) as it:
+                for entry in it:
+                    target = os.path.basename(os.readlink(entry.path))
+                    names[target] = self._unescape(entry.name)
+        except OSError:
+            pass
+        return names
+
+    def list_drives(self) -> List[Drive]:
+        """!Lists all mounted block devices, with the detail level provided by [Drive](#Drive) class.
+
+        \return (List[Drive]) a list of drives
+        """
+
+        drives = []
+        labels = uuids = None
+        seen = set()
+        with open(self._mountinfo_path, 'r', encoding='utf-8', errors='replace') as file:
+            for line in file:
+                left, _, right = line.partition(' - ')
+                fields, right_fields = left.split(), right.split()
+                if len(fields) < 5 or len(right_fields) < 2:
+                    continue
+                source = self._unescape(right_fields[1])
+                if not source.startswith('/dev/'):
+                    continue
+                mount_point = self._unescape(fields[4])
+                if mount_point in seen:
+                    continue
+                seen.add(mount_point)
+                device_name = os.path.basename(os.path.realpath(source))
+                if labels is None:
+                    labels, uuids = self._symlink_names(self._labels_path), self._symlink_names(self._uuids_path)
+                drives.append(Drive(
+                    letter=mount_point,
+                    label=labels.get(device_name, ''),
+                    drive_type='Removable Disk' if self._is_removable(device_name) else 'Local Disk',
+                    device=source,
+                    volume_id=uuids.get(device_name, '')
+                ))
+        return drives
+
+    def watch(self, on_change: Callable[[], None]):
+        """!Waits with `poll()` for changes of the mount table, calling `on_change()` after each one.
+
+        \param on_change (Callable[[], None]): method to be called
+        """
+
+        with open(self._mountinfo_path, 'rb') as mountinfo:
+            poller = select.poll()
+            poller.register(mountinfo.fileno(), select.POLLPRI | select.POLLERR)
+            poller.register(self._stop_read, select.POLLIN)
+            while True:
+                events = poller.poll()
+                if any(fd == self._stop_read for fd, _ in events):
+                    os.read(self._stop_read, 1)
+                    return
+                on_change()
+
+    def stop(self):
+        """!Wakes `watch()` up through a pipe and makes it return."""
+
+        os.write(self._stop_write, b'\0')
+
+    def close(self):
+        """!Closes the pipe used for stopping."""
+
+        os.close(self._stop_read)
+        os.close(self._stop_write)
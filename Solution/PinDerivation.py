@@ -0,0 +1,247 @@
+"""!@package PinDerivation
+It turns the PIN typed by the user into the passphrase protecting the private key. The PIN is treated as a string (so
+leading zeros matter) and mixed with a random salt using HMAC-SHA256, which costs the same for every PIN length. The
+salt is kept in a small metadata file stored next to the encrypted key.
+
+Keys created before this scheme have no metadata file and are protected with the legacy `SHA256(bytes(int(pin)))`
+passphrase. They are still accepted, and can be re-wrapped with `python PinDerivation.py migrate <key_path>`.
+
+The cost of the scrypt derivation wrapping the key is selected with a KDF profile. The parameters used are embedded in
+the PKCS#8 structure by PyCryptodome and are also recorded in the metadata file.
+
+The metadata file also records the key ID (the SHA256 fingerprint of the public key), so a wrapped key can be identified
+without the PIN, and the SHA256 fingerprint of the wrapped key it belongs to. The metadata is written before the key
+(see `write_wrapped_key()`), and it is ignored as long as the key next to it is not the one it belongs to, so a crash
+between the two writes leaves the previous key usable.
+"""
+
+import argparse
+import getpass
+import hashlib
+import json
+from collections import namedtuple
+
+from Crypto.Hash import HMAC, SHA256
+from Crypto.PublicKey import RSA
+from Crypto.Random import get_random_bytes
+
+from FileIO import FileIO
+
+
+class PinDerivation():
+    """!The PIN derivation class. All of its methods are static, as it holds no state."""
+
+    Constants = namedtuple('Constants', ['VERSION', 'PIN_ENCODING', 'SALT_LENGTH', 'METADATA_SUFFIX', 'LEGACY_SUFFIX',
+                                         'DOMAIN_TAG'])
+    CONSTANTS = Constants(VERSION=2, PIN_ENCODING='hmac-sha256', SALT_LENGTH=16, METADATA_SUFFIX='.json',
+                          LEGACY_SUFFIX='.legacy', DOMAIN_TAG=b'ProjectBSK-PIN-v2:')
+
+    ## Named scrypt cost profiles; `n` is the CPU/memory cost, `r` the block size and `p` the parallelization.
+    KDF_PROFILES = {
+        'interactive': {'profile': 'interactive', 'n': 2 ** 14, 'r': 8, 'p': 1},
+        'standard': {'profile': 'standard', 'n': 2 ** 16, 'r': 8, 'p': 1},
+        'strong': {'profile': 'strong', 'n': 2 ** 17, 'r': 8, 'p': 1}
+    }
+    DEFAULT_KDF_PROFILE = 'standard'
+
+    @staticmethod
+    def kdf_profile(name=None):
+        """!\return (dict) a copy of the named KDF profile (the default profile if no name is given)"""
+
+        return dict(PinDerivation.KDF_PROFILES[name or PinDerivation.DEFAULT_KDF_PROFILE])
+
+    @staticmethod
+    def kdf_memory(kdf):
+        """!\return (int) the memory in bytes needed by a scrypt derivation with the given parameters"""
+
+        return 128 * kdf['r'] * kdf['n'] * kdf['p']
+
+    @staticmethod
+    def wrap_key(key, passphrase, kdf=None):
+        """!It encrypts the private key with AES256, using a scrypt derivation with the given parameters.
+
+        \param key (RsaKey): the private key
+        \param passphrase (bytes): the passphrase derived from the PIN
+        \param kdf (dict): scrypt parameters (the default profile if not given)
+
+        \return (bytes) the encrypted private key in .pem format
+        """
+
+        kdf = kdf or PinDerivation.kdf_profile()
+        return key.export_key(passphrase=passphrase, format='PEM', pkcs=8, protection='scryptAndAES256-CBC',
+                              prot_params={'iteration_count': kdf['n'], 'block_size': kdf['r'],
+                                           'parallelization': kdf['p']})
+
+    @staticmethod
+    def new_metadata(kdf=None):
+        """!It creates the metadata of a newly wrapped key, with a fresh random salt.
+
+        \param kdf (dict): scrypt parameters the key is wrapped with (the default profile if not given)
+
+        \return (dict) the metadata
+        """
+
+        return {
+            'version': PinDerivation.CONSTANTS.VERSION,
+            'pin_encoding': PinDerivation.CONSTANTS.PIN_ENCODING,
+            'salt': get_random_bytes(PinDerivation.CONSTANTS.SALT_LENGTH).hex(),
+            'kdf': dict(kdf or PinDerivation.kdf_profile())
+        }
+
+    @staticmethod
+    def derive_passphrase(pin, metadata):
+        """!It derives the passphrase from the PIN. The cost and memory use do not depend on the PIN's value or length.
+
+        \param pin (str): the PIN, as typed by the user
+        \param metadata (dict): the key's metadata holding the salt
+
+        \return (bytes) the passphrase
+        """
+
+        if metadata.get('pin_encoding') != PinDerivation.CONSTANTS.PIN_ENCODING:
+            raise ValueError("Unsupported PIN encoding: %s" % metadata.get('pin_encoding'))
+        mac = HMAC.new(bytes.fromhex(metadata['salt']), digestmod=SHA256)
+        mac.update(PinDerivation.CONSTANTS.DOMAIN_TAG + str(pin).encode('utf-8'))
+        return mac.digest()
+
+    @staticmethod
+    def legacy_passphrase(pin):
+        """!It computes the passphrase of keys created before the salted scheme. Its cost grows with the PIN's
+        numeric value, so it is used only for keys that have not been migrated yet.
+
+        \param pin (str): the PIN, as typed by the user
+
+        \return (bytes) the passphrase
+        """
+
+        return SHA256.new(bytes(int(pin))).digest()
+
+    @staticmethod
+    def key_id(key):
+        """!It computes the key ID, the SHA256 fingerprint of the public key's DER `SubjectPublicKeyInfo` encoding.
+
+        \param key (RsaKey): the key (private or public)
+
+        \return (str) the fingerprint as a hex string
+        """
+
+        return SHA256.new(key.public_key().export_key(format='DER')).hexdigest()
+
+    @staticmethod
+    def metadata_path(key_path):
+        """!\return (str) path of the metadata file belonging to the key"""
+
+        return key_path + PinDerivation.CONSTANTS.METADATA_SUFFIX
+
+    @staticmethod
+    def read_metadata(key_path):
+        """!It reads the metadata stored next to the key.
+
+        \param key_path (str): path to the encrypted key
+
+        \return (dict) the metadata, or None for a legacy key (or a key whose metadata was written, but not the key
+        itself)
+        """
+
+        try:
+            with open(PinDerivation.metadata_path(key_path), "r", encoding='utf-8') as file:
+                metadata = json.load(file)
+        except FileNotFoundError:
+            return None
+        if 'wrapped_sha256' in metadata:
+            try:
+                with open(key_path, "rb") as file:
+                    if hashlib.sha256(file.read()).hexdigest() != metadata['wrapped_sha256']:
+                        return None
+            except FileNotFoundError:
+                return None
+        return metadata
+
+    @staticmethod
+    def write_metadata(key_path, metadata):
+        """!It atomically writes the metadata next to the key.
+
+        \param key_path (str): path to the encrypted key
+        \param metadata (dict): the metadata
+        """
+
+        FileIO.atomic_write(PinDerivation.metadata_path(key_path), json.dumps(metadata, indent=2).encode('utf-8'))
+
+    @staticmethod
+    def write_wrapped_key(key_path, wrapped, metadata):
+        """!It writes a wrapped key and its metadata, the metadata first, bound to the key by the key's fingerprint
+        (see `read_metadata()`), so the key is never left without the metadata needed to unwrap it.
+
+        \param key_path (str): path to the encrypted key
+        \param wrapped (bytes): the wrapped key
+        \param metadata (dict): the key's metadata
+        """
+
+        PinDerivation.write_metadata(key_path, dict(metadata, wrapped_sha256=hashlib.sha256(wrapped).hexdigest()))
+        FileIO.atomic_write(key_path, wrapped)
+
+    @staticmethod
+    def passphrase_for(key_path, pin):
+        """!It derives the passphrase for the given key, picking the scheme based on the key's metadata.
+
+        \param key_path (str): path to the encrypted key
+        \param pin (str): the PIN, as typed by the user
+
+        \return (bytes) the passphrase
+        """
+
+        return PinDerivation.passphrase_from(PinDerivation.read_metadata(key_path), pin)
+
+    @staticmethod
+    def passphrase_from(metadata, pin):
+        """!It derives the passphrase for a key whose metadata has already been read (see `read_metadata()`).
+
+        \param metadata (dict): the key's metadata, None for a legacy key
+        \param pin (str): the PIN, as typed by the user
+
+        \return (bytes) the passphrase
+        """
+
+        if metadata is None:
+            return PinDerivation.legacy_passphrase(pin)
+        return PinDerivation.derive_passphrase(pin, metadata)
+
+    @staticmethod
+    def migrate(key_path, pin, kdf=None):
+        """!It re-wraps a legacy key with the salted scheme. A copy of the legacy key is kept next to it.
+
+        \param key_path (str): path to the encrypted key
+        \param pin (str): the PIN, as typed by the user
+        \param kdf (dict): scrypt parameters for the new wrapping (the default profile if not given)
+
+        \return (bool) whether the key was migrated (False if it had already been migrated)
+        """
+
+        if PinDerivation.read_metadata(key_path) is not None:
+            return False
+
+        with open(key_path, "rb") as file:
+            legacy_blob = file.read()
+        key = RSA.import_key(legacy_blob, PinDerivation.legacy_passphrase(pin))
+
+        metadata = PinDerivation.new_metadata(kdf)
+        metadata['key_id'] = PinDerivation.key_id(key)
+        wrapped = PinDerivation.wrap_key(key, PinDerivation.derive_passphrase(pin, metadata), metadata['kdf'])
+
+        FileIO.atomic_write(key_path + PinDerivation.CONSTANTS.LEGACY_SUFFIX, legacy_blob)
+        PinDerivation.write_wrapped_key(key_path, wrapped, metadata)
+        return True
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="PIN passphrase tools")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    migrate_parser = subparsers.add_parser('migrate', help="re-wrap a legacy key with the salted PIN scheme")
+    migrate_parser.add_argument('key_path')
+    migrate_parser.add_argument('--kdf-profile', choices=sorted(PinDerivation.KDF_PROFILES), default=None)
+    args = parser.parse_args()
+
+    if PinDerivation.migrate(args.key_path, getpass.getpass("PIN: "), PinDerivation.kdf_profile(args.kdf_profile)):
+        print("Klucz został przeniesiony na nowy schemat PIN-u")
+    else:
+        print("Klucz używa już nowego schematu PIN-u")
@@ -0,0 +1,242 @@
+"""!@package SolutionArchive
+Signing and verification of the pdfs inside ZIP and TAR archives, without extracting them to disk.
+
+The archive's members are read one after another, in a single pass (a compressed TAR is read as a stream), and every
+pdf is handed, as bytes, to a thread pool: to [SolutionSharedSigner](#SolutionSharedSigner) for signing, or to a
+[SolutionHashComparer](#SolutionHashComparer) of the worker's own for verification. The results are collected in the
+archive's order, through a window of at most `window` pdfs in flight, so the memory used is bounded by the window times
+the size of the largest pdf, whatever the size of the archive. The other members are copied to the signed archive as
+they are, in chunks. The signed archive has the format its name's suffix gives, and it is written next to its final
+path and renamed over it once complete.
+"""
+
+import collections
+import copy
+import os
+import shutil
+import tarfile
+import threading
+import time
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from SolutionHashComparer import SolutionHashComparer
+from SolutionJobJournal import SolutionJobJournal
+
+
+class SolutionArchive():
+    """!The archive class. It realizes all the functionalities of this package."""
+
+    Constants = namedtuple('Constants', ['TAR_SUFFIXES', 'ZIP_SUFFIX', 'CHUNK_SIZE'])
+    CONSTANTS = Constants(TAR_SUFFIXES={'.tar': '', '.tar.gz': 'gz', '.tgz': 'gz', '.tar.bz2': 'bz2', '.tar.xz': 'xz'},
+                          ZIP_SUFFIX='.zip', CHUNK_SIZE=1024 * 1024)
+
+    def __init__(self, workers=1, window=None):
+        """!Constructor.
+
+        \param workers (int): how many pdfs are signed or verified at once
+        \param window (int): how many pdfs can be held in memory at once, twice the number of workers by default
+        """
+
+        self._workers = max(1, workers)
+        self._window = window or 2 * self._workers
+        self._local = threading.local()
+
+    @classmethod
+    def is_archive(cls, path):
+        """!\return (bool) whether the file's name has the suffix of a supported archive"""
+
+        name = path.lower()
+        return name.endswith(cls.CONSTANTS.ZIP_SUFFIX) or any(name.endswith(suffix)
+                                                              for suffix in cls.CONSTANTS.TAR_SUFFIXES)
+
+    @staticmethod
+    def is_pdf(member):
+        """!\return (bool) whether the archive's member (a ZipInfo or a TarInfo) is a pdf file"""
+
+        if isinstance(member, zipfile.ZipInfo):
+            return not member.is_dir() and member.filename.lower().endswith('.pdf')
+        return member.isfile() and member.name.lower().endswith('.pdf')
+
+    @staticmethod
+    def member_name(member):
+        """!\return (str) the archive's member's name"""
+
+        return member.filename if isinstance(member, zipfile.ZipInfo) else member.name
+
+    @staticmethod
+    def read_members(path):
+        """!It reads an archive's members in order, in a single pass.
+
+        \param path (str): path to the archive
+
+        \return (Iterator[Tuple[ZipInfo|TarInfo, BinaryIO]]) every member and its content, readable only until the
+        next member is read (None for the members which are not files)
+        """
+
+        if zipfile.is_zipfile(path):
+            with zipfile.ZipFile(path) as archive:
+                for member in archive.infolist():
+                    if member.is_dir():
+                        yield member, None
+                        continue
+                    with archive.open(member) as file:
+                        yield member, file
+        else:
+            with tarfile.open(path, 'r|*') as archive:
+                for member in archive:
+                    yield member, archive.extractfile(member) if member.isfile() else None
+
+    @classmethod
+    def open_writer(cls, path, output_path):
+        """!It opens a new archive, of the format given by a name's suffix.
+
+        \param path (str): path the archive is written to
+        \param output_path (str): the name giving the format
+
+        \return (ZipFile|TarFile) the archive, open for writing
+        """
+
+        name = output_path.lower()
+        if name.endswith(cls.CONSTANTS.ZIP_SUFFIX):
+            return zipfile.ZipFile(path, 'w', zipfile.ZIP_DEFLATED)
+        for suffix, compression in cls.CONSTANTS.TAR_SUFFIXES.items():
+            if name.endswith(suffix):
+                return tarfile.open(path, 'w|' + compression)
+        raise ValueError("Nieznany format archiwum: " + output_path)
+
+    @classmethod
+    def write_member(cls, writer, member, data=None, file=None):
+        """!It writes a member to a new archive, with the name, dates and permissions of a member read from another
+        one, which can be of the other format.
+
+        \param writer (ZipFile|TarFile): the new archive
+        \param member (ZipInfo|TarInfo): the member read
+        \param data (bytes): the member's new content, if it has changed
+        \param file (BinaryIO): the member's unchanged content, copied in chunks
+        """
+
+        is_zip = isinstance(member, zipfile.ZipInfo)
+        size = len(data) if data is not None else (member.file_size if is_zip else member.size)
+        if isinstance(writer, zipfile.ZipFile):
+            info = zipfile.ZipInfo(cls.member_name(member), member.date_time if is_zip else
+                                   max((1980, 1, 1, 0, 0, 0), time.localtime(member.mtime)[:6]))
+            if is_zip:
+                info.compress_type, info.external_attr = member.compress_type, member.external_attr
+            else:
+                info.compress_type, info.external_attr = zipfile.ZIP_DEFLATED, (member.mode & 0xFFFF) << 16
+            info.file_size = size
+            if data is None and file is None:
+                writer.writestr(info, b'')
+                return
+            with writer.open(info, 'w') as destination:
+                if data is not None:
+                    destination.write(data)
+                else:
+                    shutil.copyfileobj(file, destination, cls.CONSTANTS.CHUNK_SIZE)
+        else:
+            if is_zip:
+                info = tarfile.TarInfo(member.filename)
+                info.mtime = int(time.mktime(member.date_time + (0, 0, -1)))
+                info.type = tarfile.DIRTYPE if member.is_dir() else tarfile.REGTYPE
+                info.mode = (member.external_attr >> 16) & 0o7777 or (0o755 if member.is_dir() else 0o644)
+            else:
+                info = copy.copy(member)
+            info.size = size if info.isfile() else 0
+            writer.addfile(info, BytesIO(data) if data is not None else file)
+
+    def sign(self, signer, input_path, output_path, self_check=False):
+        """!It signs all the pdfs of an archive into a new archive. A pdf which cannot be signed is copied unchanged.
+
+        \param signer (SolutionSharedSigner): the shared signer
+        \param input_path (str): path to the archive
+        \param output_path (str): path the signed archive is saved to
+        \param self_check (bool): whether every signature is checked in memory before it is written
+
+        \return (Dict[str, str]) the state of every pdf, by its name in the archive: `done` or `failed`
+        """
+
+        results = {}
+
+        def collect(member, document, job, writer):
+            try:
+                self.write_member(writer, member, data=job.result())
+                results[self.member_name(member)] = SolutionJobJournal.CONSTANTS.DONE
+            except Exception as e:
+                print(input_path + "!" + self.member_name(member) + ": " + str(e))
+                self.write_member(writer, member, data=document)
+                results[self.member_name(member)] = SolutionJobJournal.CONSTANTS.FAILED
+
+        tmp_path = output_path + ".tmp"
+        try:
+            with self.open_writer(tmp_path, output_path) as writer:
+                self._run(input_path, lambda document: signer.sign_bytes(document, self_check=self_check),
+                          lambda member, document, job: collect(member, document, job, writer),
+                          lambda member, file: self.write_member(writer, member, file=file))
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return results
+
+    def verify(self, input_path):
+        """!It verifies all the pdfs of an archive. Every worker thread verifies with a
+        [SolutionHashComparer](#SolutionHashComparer) of its own.
+
+        \param input_path (str): path to the archive
+
+        \return (Dict[str, int]) the result code of every pdf (see [SolutionHashComparer](#SolutionHashComparer)), by
+        its name in the archive, or None for the pdfs whose verification failed
+        """
+
+        results = {}
+
+        def collect(member, document, job):
+            try:
+                results[self.member_name(member)] = job.result()
+            except Exception as e:
+                print(input_path + "!" + self.member_name(member) + ": " + str(e))
+                results[self.member_name(member)] = None
+
+        self._run(input_path, lambda document: self._comparer().verify_bytes(document), collect, None)
+        return results
+
+    def _comparer(self):
+        """!\return (SolutionHashComparer) the calling thread's verifier, with the trust store loaded"""
+
+        if getattr(self._local, 'comparer', None) is None:
+            self._local.comparer = SolutionHashComparer()
+            self._local.comparer.set_public_key()
+        return self._local.comparer
+
+    def _run(self, input_path, process, collect, copy_member):
+        """!It processes the pdfs of an archive on the thread pool, in a single pass over the archive, and hands the
+        results over in the archive's order, keeping at most `window` pdfs in memory.
+
+        \param input_path (str): path to the archive
+        \param process (Callable[[bytes], Any]): the processing of a pdf, run on the pool
+        \param collect (Callable[[ZipInfo|TarInfo, bytes, Future], None]): called with every pdf and its job, in order
+        \param copy_member (Callable[[ZipInfo|TarInfo, BinaryIO], None]): called with every other member, in order,
+        once all the pdfs before it are collected; None to skip the other members
+        """
+
+        in_flight = collections.deque()
+
+        def drain(keep):
+            while len(in_flight) > keep:
+                collect(*in_flight.popleft())
+
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            for member, file in self.read_members(input_path):
+                if not self.is_pdf(member):
+                    if copy_member is not None:
+                        drain(0)
+                        copy_member(member, file)
+                    continue
+                document = file.read()
+                in_flight.append((member, document, executor.submit(process, document)))
+                drain(self._window - 1)
+            drain(0)
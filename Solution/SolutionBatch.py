@@ -0,0 +1,495 @@
+"""!@package SolutionBatch
+Batch signing and verification of all the pdfs in a directory, journaled with [SolutionJobJournal](#SolutionJobJournal)
+so an interrupted run can be restarted and resumes where it stopped.
+
+Usage: `python SolutionBatch.py sign <directory> [--journal <path>] [--restart] [--profile basic|ltv|lta]` (the PIN is
+asked for once, and `--workers` documents are signed at once with one shared signer; with `--self-check` every
+signature is checked in memory before its pdf is saved, and with `--compact` the signed pdfs are written in the compact
+output mode), `python SolutionBatch.py verify <directory> [--journal <path>]
+[--restart] [--verification-cache <path>]` (with a cache, the pdfs which only grew by incremental updates since they
+were last verified have only their new revisions examined), or
+`python SolutionBatch.py augment <directory> --trust-store <directory>`, which adds the certificate chains and
+revocation data (a DSS) to already signed pdfs, so they can be validated offline. With `--metrics-port` the run's
+metrics (see [SolutionMetrics](#SolutionMetrics)) are served over HTTP while it lasts, and with `--metrics-textfile`
+they are written to a file after every document. With `--archives`, `sign` and `verify` process the ZIP and TAR
+archives in the directory instead, without extracting them (see [SolutionArchive](#SolutionArchive)): every archive
+is one job, its pdfs are signed or verified by `--workers` threads, and its signed copy is saved to the output
+directory. With `--merkle`, `sign` signs all the pdfs as one batch, with a single signature of the root of their Merkle
+tree, and writes every pdf's inclusion proof next to it (see [SolutionMerkleBatch](#SolutionMerkleBatch)), and
+`verify` checks the pdfs against their batches' signed roots; these runs are journaled as the `merkle-sign` and
+`merkle-verify` job kinds, apart from the other ones, and `--restart` forgets them only when given with `--merkle`.
+With `--keystore <directory> --key-id <id>`, `sign` signs with a key of a keystore (see
+[SolutionKeyStore](#SolutionKeyStore)) instead of the pendrive's key.
+"""
+
+import argparse
+import getpass
+import hashlib
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from io import BytesIO
+
+from pyhanko.pdf_utils.reader import PdfFileReader
+from pyhanko.sign.validation import add_validation_info
+
+from FileIO import FileIO
+from SolutionArchive import SolutionArchive
+from SolutionHashComparer import SolutionHashComparer
+from SolutionJobJournal import SolutionJobJournal
+from SolutionKeyStore import SolutionKeyStore
+from SolutionMerkleBatch import SolutionMerkleBatch
+from SolutionMerkleVerifier import SolutionMerkleVerifier
+from SolutionMetrics import SolutionMetrics
+from SolutionPDFSigner import SolutionPDFSigner
+from SolutionTimeStamper import SolutionTimeStamper
+from SolutionTrustStore import SolutionTrustStore
+from SolutionVerificationCache import SolutionVerificationCache
+
+
+class SolutionBatch():
+    """!The batch runner class. It realizes all the functionalities of this package."""
+
+    def __init__(self, journal_path, metrics_textfile=None):
+        """!Constructor.
+
+        \param journal_path (str): path to the journal's database
+        \param metrics_textfile (str): path the metrics are written to after every document, if any
+        """
+
+        self._journal = SolutionJobJournal(journal_path)
+        self._metrics = SolutionMetrics.instance()
+        self._metrics_textfile = metrics_textfile
+
+    def _document_done(self, queue, remaining):
+        """!It updates the queue depth after a document, and the metrics textfile if there is one.
+
+        \param queue (str): the queue's name, `sign` or `verify`
+        \param remaining (int): the number of documents still waiting
+        """
+
+        self._metrics.set('bsk_queue_depth', remaining, queue=queue)
+        if self._metrics_textfile is not None:
+            self._metrics.write_textfile(self._metrics_textfile)
+
+    @staticmethod
+    def list_pdfs(directory):
+        """!\return (List[str]) absolute paths of the pdfs in the directory, sorted by name"""
+
+        return sorted(os.path.abspath(entry.path) for entry in os.scandir(directory)
+                      if entry.is_file() and entry.name.lower().endswith('.pdf'))
+
+    @staticmethod
+    def list_archives(directory):
+        """!\return (List[str]) absolute paths of the ZIP and TAR archives in the directory, sorted by name"""
+
+        return sorted(os.path.abspath(entry.path) for entry in os.scandir(directory)
+                      if entry.is_file() and SolutionArchive.is_archive(entry.name))
+
+    @staticmethod
+    def file_sha256(path):
+        """!\return (str) the SHA256 fingerprint of the file, as a hex string, or None if the file does not exist"""
+
+        digest = hashlib.sha256()
+        try:
+            with open(path, "rb") as file:
+                for chunk in iter(lambda: file.read(1024 * 1024), b''):
+                    digest.update(chunk)
+        except FileNotFoundError:
+            return None
+        return digest.hexdigest()
+
+    def _finish_signing(self, path, job):
+        """!It completes a file whose signed pdf has been written: if the signed pdf is intact, the original is removed
+        and the job is done.
+
+        \param path (str): path to the original pdf
+        \param job (JobState): the job's state
+
+        \return (bool) whether the job could be completed, False if the file has to be signed again
+        """
+
+        if self.file_sha256(job.output_path) != job.output_sha256:
+            return False
+        if os.path.exists(path):
+            os.remove(path)
+        self._journal.transition('sign', path, SolutionJobJournal.CONSTANTS.DONE, job.output_path, job.output_sha256)
+        return True
+
+    @staticmethod
+    def output_path(path, output_dir):
+        """!\return (str) path the signed pdf of the given pdf is saved to"""
+
+        return os.path.join(output_dir, 'signed' + os.path.basename(path))
+
+    def sign_file(self, signer, path, output_dir='../pdfs', self_check=False):
+        """!It signs a single pdf, unless the journal shows it is already done, recording every step in the journal.
+        The original is not modified until the signed pdf is saved, so a job interrupted before that is simply done
+        again. It can be called from many threads at once.
+
+        \param signer (SolutionSharedSigner): the shared signer
+        \param path (str): absolute path to the pdf
+        \param output_dir (str): the directory the signed pdf is saved to
+        \param self_check (bool): whether the signature is checked in memory before the signed pdf is saved
+
+        \return (str) the job's final state
+        """
+
+        constants = SolutionJobJournal.CONSTANTS
+        job = self._journal.state('sign', path)
+        if job is not None and job.state == constants.DONE:
+            return constants.DONE
+        if job is not None and job.state == constants.WRITTEN and self._finish_signing(path, job):
+            return constants.DONE
+
+        self._journal.transition('sign', path, constants.STARTED)
+        output_path = self.output_path(path, output_dir)
+        output_sha256 = signer.sign_file(path, output_path, self_check=self_check)
+        self._written(path, output_path, output_sha256)
+        return constants.DONE
+
+    def sign_archive(self, signer, archive, path, output_dir='../pdfs', self_check=False):
+        """!It signs all the pdfs of an archive into a signed copy of it, as `sign_file()` signs a pdf. If any of its
+        pdfs cannot be signed, the job fails, the signed copy is removed and the original is kept.
+
+        \param signer (SolutionSharedSigner): the shared signer
+        \param archive (SolutionArchive): the archive processor, with its thread pool's size
+        \param path (str): absolute path to the archive
+        \param output_dir (str): the directory the signed archive is saved to
+        \param self_check (bool): whether every signature is checked in memory before it is written
+
+        \return (str) the job's final state
+        """
+
+        constants = SolutionJobJournal.CONSTANTS
+        job = self._journal.state('sign', path)
+        if job is not None and job.state == constants.DONE:
+            return constants.DONE
+        if job is not None and job.state == constants.WRITTEN and self._finish_signing(path, job):
+            return constants.DONE
+
+        self._journal.transition('sign', path, constants.STARTED)
+        output_path = self.output_path(path, output_dir)
+        results = archive.sign(signer, path, output_path, self_check)
+        for name, state in results.items():
+            print(path + "!" + name + ": " + state)
+        failed = sum(state == constants.FAILED for state in results.values())
+        if failed:
+            os.remove(output_path)
+            raise ValueError("nie podpisano %d z %d dokumentów archiwum" % (failed, len(results)))
+        self._written(path, output_path, self.file_sha256(output_path))
+        return constants.DONE
+
+    def _written(self, path, output_path, output_sha256):
+        """!It completes a job whose output has just been saved: the original is removed and the job is done.
+
+        \param path (str): path to the original
+        \param output_path (str): path to the output
+        \param output_sha256 (str): the output's SHA256 fingerprint
+        """
+
+        constants = SolutionJobJournal.CONSTANTS
+        self._journal.transition('sign', path, constants.WRITTEN, output_path, output_sha256)
+        os.remove(path)
+        self._journal.transition('sign', path, constants.DONE, output_path, output_sha256)
+
+    def _sign_job(self, signer, path, output_dir, self_check, archive=None):
+        """!It runs `sign_file()`, or `sign_archive()` if an archive processor is given, recording a failure in the
+        journal instead of raising it.
+
+        \return (str) the job's final state
+        """
+
+        try:
+            if archive is not None:
+                return self.sign_archive(signer, archive, path, output_dir, self_check)
+            return self.sign_file(signer, path, output_dir, self_check)
+        except Exception as e:
+            self._journal.transition('sign', path, SolutionJobJournal.CONSTANTS.FAILED, error=str(e))
+            return SolutionJobJournal.CONSTANTS.FAILED
+
+    def sign(self, paths, pin, key_path=None, cert_path=None, timestamper=None, profile='basic', trust_store=None,
+             workers=1, output_dir='../pdfs', self_check=False, compact=False, archives=False, merkle=False,
+             keystore=None, key_id=None):
+        """!It signs all the given pdfs with one key, decrypted once. Files whose signed pdf has been written by an
+        interrupted run are completed too, even if their original is already gone. With more than one worker, the
+        documents are signed by a thread pool sharing one [SolutionSharedSigner](#SolutionSharedSigner).
+
+        \param paths (List[str]): absolute paths to the pdfs
+        \param pin (str): the key's PIN
+        \param key_path (str): path to the encrypted private key, the pendrive's key by default
+        \param cert_path (str): path to the key's certificate, the auxiliary app's certificate by default
+        \param timestamper (TimeStamper): the timestamping client, None for signatures without a trusted time
+        \param profile (str): the signature profile, see [SolutionPDFSigner](#SolutionPDFSigner)
+        \param trust_store (SolutionTrustStore): the source of the embedded validation data for long-term profiles
+        \param workers (int): how many documents are signed at once
+        \param output_dir (str): the directory the signed pdfs are saved to
+        \param self_check (bool): whether every signature is checked in memory before its pdf is saved; a pdf whose
+        signature fails the check is not saved, and its job fails
+        \param compact (bool): whether the signed pdfs are written in the compact output mode (see
+        [SolutionSharedSigner](#SolutionSharedSigner))
+        \param archives (bool): whether the paths are archives; they are signed one after another, each by a thread
+        pool of `workers` threads
+        \param merkle (bool): whether the pdfs not done yet are signed as one Merkle batch, hashed by `workers` threads;
+        they are left in place, with their sidecars next to them
+        \param keystore (SolutionKeyStore): the keystore the key is taken from, instead of `key_path` and `cert_path`
+        \param key_id (str): the key's ID in the keystore
+
+        \return (bool) whether the key was decrypted (in other words, if the pin was correct)
+        """
+
+        if keystore is not None:
+            shared_signer = keystore.unlock(key_id, pin, timestamper, profile, trust_store, compact)
+            if shared_signer is None:
+                return False
+        else:
+            signer = SolutionPDFSigner(key_path, cert_path, timestamper, profile, trust_store, compact)
+            signer.hash_pin(pin)
+            if not signer.decrypt():
+                return False
+            shared_signer = signer.shared_signer()
+
+        if merkle:
+            self.sign_merkle(shared_signer, paths, workers)
+            return True
+
+        written = set(self._journal.paths('sign', SolutionJobJournal.CONSTANTS.WRITTEN)) - set(paths)
+        queue = list(paths) + sorted(written)
+        self._metrics.set('bsk_queue_depth', len(queue), queue='sign')
+        if archives:
+            archive = SolutionArchive(workers)
+            for number, path in enumerate(queue, 1):
+                print(path + ": " + self._sign_job(shared_signer, path, output_dir, self_check, archive))
+                self._document_done('sign', len(queue) - number)
+            return True
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            jobs = {executor.submit(self._sign_job, shared_signer, path, output_dir, self_check): path
+                    for path in queue}
+            for number, job in enumerate(as_completed(jobs), 1):
+                print(jobs[job] + ": " + job.result())
+                self._document_done('sign', len(queue) - number)
+        return True
+
+    @staticmethod
+    def journal_kind(kind, merkle=False):
+        """!The job kind a run is journaled as. The Merkle batch runs have job kinds of their own, so a pdf signed or
+        verified in one mode is not taken for done in the other.
+
+        \param kind (str): `sign`, `verify` or `augment`
+        \param merkle (bool): whether the run works on Merkle batches
+
+        \return (str) the job kind
+        """
+
+        return 'merkle-' + kind if merkle else kind
+
+    def sign_merkle(self, signer, paths, workers=1):
+        """!It signs the given pdfs which are not done yet as one Merkle batch. The whole batch succeeds or fails
+        together. The jobs are journaled as `merkle-sign` (see `journal_kind()`).
+
+        \param signer (SolutionSharedSigner): the shared signer
+        \param paths (List[str]): absolute paths to the pdfs
+        \param workers (int): how many pdfs are hashed at once
+        """
+
+        constants = SolutionJobJournal.CONSTANTS
+        kind = self.journal_kind('sign', merkle=True)
+        queue = [path for path in paths
+                 if getattr(self._journal.state(kind, path), 'state', None) != constants.DONE]
+        self._metrics.set('bsk_queue_depth', len(queue), queue='sign')
+        if not queue:
+            return
+        for path in queue:
+            self._journal.transition(kind, path, constants.STARTED)
+        try:
+            sidecar_paths = SolutionMerkleBatch(signer, workers).sign(queue)
+        except Exception as e:
+            for path in queue:
+                self._journal.transition(kind, path, constants.FAILED, error=str(e))
+                print(path + ": " + constants.FAILED)
+            self._document_done('sign', 0)
+            return
+        for path, sidecar_path in zip(queue, sidecar_paths):
+            self._journal.transition(kind, path, constants.DONE, sidecar_path, self.file_sha256(sidecar_path))
+            print(path + ": " + constants.DONE)
+        self._document_done('sign', 0)
+
+    def verify(self, paths, cache=None, archives=False, workers=1, merkle=False):
+        """!It verifies all the given pdfs, skipping the ones the journal shows were verified (by this run or an earlier
+        one) and have not changed since, going by their size and modification time. The journal identifies the
+        verified version of a pdf by these two alone, so a pdf is read only by its verification.
+
+        \param paths (List[str]): absolute paths to the pdfs
+        \param cache (SolutionVerificationCache): the verdicts of earlier runs, so the pdfs which only grew since are
+        verified incrementally (see [SolutionHashComparer](#SolutionHashComparer)); None to verify them from scratch;
+        it is saved once, when the run ends
+        \param archives (bool): whether the paths are archives; the result code of an archive is 1 if all its pdfs
+        are valid, -1 if it has none, and 0 otherwise; the cache is not used for them
+        \param workers (int): how many pdfs of an archive are verified at once
+        \param merkle (bool): whether the pdfs are checked against their Merkle batches' signed roots (see
+        [SolutionMerkleVerifier](#SolutionMerkleVerifier)) instead of their own signatures; the cache is not used, and
+        the jobs are journaled as `merkle-verify` (see `journal_kind()`)
+        """
+
+        constants = SolutionJobJournal.CONSTANTS
+        kind = self.journal_kind('verify', merkle)
+        if archives:
+            archive = SolutionArchive(workers)
+        elif merkle:
+            comparer = SolutionMerkleVerifier()
+            comparer.set_public_key()
+        else:
+            comparer = SolutionHashComparer(cache)
+            comparer.set_public_key()
+        self._metrics.set('bsk_queue_depth', len(paths), queue='verify')
+        try:
+            for number, path in enumerate(paths, 1):
+                try:
+                    stat = os.stat(path)
+                    job = self._journal.state(kind, path)
+                    if (job is not None and job.state == constants.DONE
+                            and (job.size, job.mtime_ns) == (stat.st_size, stat.st_mtime_ns)):
+                        continue
+                    if archives:
+                        result = self.archive_result(path, archive.verify(path))
+                    else:
+                        directory, name = os.path.split(path)
+                        comparer.set_file(directory + os.sep, name)
+                        result = comparer.verify()
+                    self._journal.transition(kind, path, constants.DONE, path, result=result, size=stat.st_size,
+                                             mtime_ns=stat.st_mtime_ns)
+                    print(path + ": " + str(result))
+                except Exception as e:
+                    self._journal.transition(kind, path, constants.FAILED, error=str(e))
+                    print(path + ": " + constants.FAILED)
+                self._document_done('verify', len(paths) - number)
+        finally:
+            if cache is not None:
+                cache.flush()
+
+    @staticmethod
+    def archive_result(path, results):
+        """!It prints the results of an archive's pdfs and sums them up.
+
+        \param path (str): path to the archive
+        \param results (Dict[str, int]): the result codes of the archive's pdfs, None for the failed verifications
+
+        \return (int) the archive's result code (see `verify()`)
+        """
+
+        for name, result in results.items():
+            print(path + "!" + name + ": " + (SolutionJobJournal.CONSTANTS.FAILED if result is None else str(result)))
+        if not results:
+            return -1
+        return 1 if all(result == 1 for result in results.values()) else 0
+
+    def augment(self, paths, trust_store):
+        """!It adds the validation data of the first signature of every given pdf (its certificate chain and
+        revocation data) to the pdf's DSS, as an incremental update, so the signature stays intact. Every pdf is
+        replaced atomically.
+
+        \param paths (List[str]): absolute paths to the signed pdfs
+        \param trust_store (SolutionTrustStore): the trust store the validation data is taken from
+        """
+
+        constants = SolutionJobJournal.CONSTANTS
+        vc = trust_store.validation_context()
+        self._metrics.set('bsk_queue_depth', len(paths), queue='augment')
+        for number, path in enumerate(paths, 1):
+            job = self._journal.state('augment', path)
+            if job is not None and job.state == constants.DONE:
+                continue
+            try:
+                with open(path, "rb") as file:
+                    reader = PdfFileReader(file, strict=False)
+                    if len(reader.embedded_signatures) == 0:
+                        raise ValueError("dokument nie jest podpisany")
+                    output = BytesIO()
+                    add_validation_info(reader.embedded_signatures[0], vc, output=output)
+                augmented = output.getvalue()
+                FileIO.atomic_write(path, augmented)
+                self._journal.transition('augment', path, constants.DONE, path, hashlib.sha256(augmented).hexdigest())
+                print(path + ": " + constants.DONE)
+            except Exception as e:
+                self._journal.transition('augment', path, constants.FAILED, error=str(e))
+                print(path + ": " + constants.FAILED)
+            self._document_done('augment', len(paths) - number)
+
+    def summary(self, kind):
+        """!\return (Dict[str, int]) the number of files of the given job kind in every state"""
+
+        return self._journal.summary(kind)
+
+    def reset(self, kind):
+        """!It forgets the previous run of the given job kind.
+
+        \param kind (str): the job kind
+        """
+
+        self._journal.reset(kind)
+
+    def close(self):
+        """!Closes the journal."""
+
+        self._journal.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Batch signing and verification of pdfs")
+    parser.add_argument('kind', choices=['sign', 'verify', 'augment'])
+    parser.add_argument('directory')
+    parser.add_argument('--journal', default=None)
+    parser.add_argument('--restart', action='store_true')
+    parser.add_argument('--key-path', default=None)
+    parser.add_argument('--cert-path', default=None)
+    parser.add_argument('--keystore', default=None)
+    parser.add_argument('--key-id', default=None)
+    parser.add_argument('--tsa-url', default=None)
+    parser.add_argument('--profile', choices=['basic', 'ltv', 'lta'], default='basic')
+    parser.add_argument('--trust-store', default=None)
+    parser.add_argument('--workers', type=int, default=1)
+    parser.add_argument('--output-dir', default='../pdfs')
+    parser.add_argument('--self-check', action='store_true')
+    parser.add_argument('--compact', action='store_true')
+    parser.add_argument('--verification-cache', default=None)
+    parser.add_argument('--archives', action='store_true')
+    parser.add_argument('--merkle', action='store_true')
+    parser.add_argument('--metrics-port', type=int, default=None)
+    parser.add_argument('--metrics-textfile', default=None)
+    args = parser.parse_args()
+
+    if args.metrics_port is not None:
+        SolutionMetrics.instance().serve(args.metrics_port)
+    batch = SolutionBatch(args.journal or os.path.join(args.directory, ".journal.sqlite"), args.metrics_textfile)
+    if args.archives and args.merkle:
+        parser.error("--merkle nie obsługuje archiwów")
+    kind = batch.journal_kind(args.kind, args.merkle and args.kind != 'augment')
+    if args.restart:
+        batch.reset(kind)
+    paths = batch.list_archives(args.directory) if args.archives else batch.list_pdfs(args.directory)
+    trust_store = SolutionTrustStore(directories=[args.trust_store]) if args.trust_store is not None else None
+    if args.kind == 'sign':
+        timestamper = SolutionTimeStamper(args.tsa_url) if args.tsa_url is not None else None
+        keystore = None
+        if args.keystore is not None:
+            keystore = SolutionKeyStore(args.keystore)
+            if args.key_id is None or keystore.find(key_id=args.key_id) is None:
+                parser.error("--keystore wymaga --key-id klucza z magazynu kluczy")
+        if not batch.sign(paths, getpass.getpass("PIN: "), args.key_path, args.cert_path, timestamper, args.profile,
+                          trust_store, args.workers, args.output_dir, args.self_check, args.compact, args.archives,
+                          args.merkle, keystore, args.key_id):
+            print("Niepoprawny PIN")
+            sys.exit(1)
+    elif args.kind == 'augment':
+        if trust_store is None:
+            parser.error("augment wymaga --trust-store")
+        if args.archives:
+            parser.error("augment nie obsługuje archiwów")
+        batch.augment(paths, trust_store)
+    else:
+        cache = SolutionVerificationCache(args.verification_cache) if args.verification_cache is not None else None
+        batch.verify(paths, cache, args.archives, args.workers, args.merkle)
+    summary = batch.summary(kind)
+    batch.close()
+    print(summary)
+    sys.exit(1 if summary.get(SolutionJobJournal.CONSTANTS.FAILED) else 0)
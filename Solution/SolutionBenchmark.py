@@ -0,0 +1,444 @@
+"""!@package SolutionBenchmark
+A set of benchmarks for the main app's hot paths. Every benchmark prints a small table to the console.
+
+Usage: `python SolutionBenchmark.py <benchmark>`, run `python SolutionBenchmark.py --help` for the list.
+"""
+
+import argparse
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from Crypto.PublicKey import RSA
+from asn1crypto import pem
+from PySide6 import QtCore, QtWidgets
+from pyhanko_certvalidator.registry import SimpleCertificateStore
+from pyhanko.pdf_utils import generic, writer
+from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
+from pyhanko.sign import signers
+from pyhanko.sign.fields import SigSeedSubFilter
+from pyhanko.sign.timestamps import HTTPTimeStamper
+
+from PinDerivation import PinDerivation
+from SolutionDetachedVerifier import SolutionDetachedVerifier
+from SolutionLocalTSA import LocalTimeStamper, SolutionLocalTSA
+from SolutionMerkleBatch import SolutionMerkleBatch
+from SolutionBatch import SolutionBatch
+from SolutionGUI import SolutionGUI
+from SolutionPDFSigner import SolutionPDFSigner
+from SolutionSharedSigner import SolutionSharedSigner
+from SolutionTimeStamper import SolutionTimeStamper
+from SolutionTrustStore import SolutionTrustStore
+
+
+class PaintWatch(QtCore.QObject):
+    """!An event filter recording the time of a widget's first paint."""
+
+    def __init__(self, widget, times):
+        """!Constructor. It installs the filter on the widget.
+
+        \param widget (QWidget): the watched widget
+        \param times (dict): the times measured, the first paint's is stored under `painted`
+        """
+
+        super().__init__(widget)
+        self._times = times
+        widget.installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        """!It records the first paint event, see `QObject.eventFilter()`."""
+
+        if event.type() == QtCore.QEvent.Paint:
+            self._times.setdefault('painted', time.perf_counter())
+        return False
+
+
+class SolutionBenchmark():
+    """!The benchmark class. Each public method is one benchmark."""
+
+    ## The signing run in a fresh process by the `warm_up` benchmark; it prints the time from the PIN to the signed pdf.
+    WARM_UP_PROBE = """
+import sys, time
+from SolutionPDFSigner import SolutionPDFSigner
+signer = SolutionPDFSigner(sys.argv[1], sys.argv[2])
+if sys.argv[4] == 'True':
+    signer.warm_up()
+start = time.perf_counter()
+signer.set_file('./', 'document.pdf')
+signer.hash_pin(sys.argv[3])
+assert signer.decrypt() and signer.prepare_file() == 1
+signer.sign()
+print(time.perf_counter() - start)
+"""
+
+    def __init__(self, repeats=3):
+        """!Constructor.
+
+        \param repeats (int): how many times each measurement is repeated (the best time is reported)
+        """
+
+        self._repeats = repeats
+
+    def _measure(self, function):
+        """!It measures the best wall-clock time and the peak of allocated memory of a function call.
+
+        \param function (Callable[[], Any]): the measured function
+
+        \return (Tuple[float, int]) time in seconds and peak memory in bytes
+        """
+
+        best = float('inf')
+        peak = 0
+        for _ in range(self._repeats):
+            tracemalloc.start()
+            start = time.perf_counter()
+            function()
+            best = min(best, time.perf_counter() - start)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+        return best, peak
+
+    def pin_unlock(self):
+        """!It compares the salted PIN derivation with the legacy one, for growing PIN lengths. The salted derivation
+        is expected to keep the same time and memory regardless of the length, and so is the whole unlock.
+        """
+
+        key = RSA.generate(2048)
+        metadata = PinDerivation.new_metadata()
+
+        print("%-6s %-10s %14s %14s %14s" % ("digits", "scheme", "derive [ms]", "peak mem [B]", "unlock [ms]"))
+        for digits in (4, 6, 8, 10, 12):
+            pin = "9" * digits
+            blob = key.export_key(passphrase=PinDerivation.derive_passphrase(pin, metadata), format='PEM', pkcs=8,
+                                  protection='scryptAndAES256-CBC')
+            derive_time, derive_peak = self._measure(lambda: PinDerivation.derive_passphrase(pin, metadata))
+            unlock_time, _ = self._measure(
+                lambda: RSA.import_key(blob, PinDerivation.derive_passphrase(pin, metadata)))
+            print("%-6d %-10s %14.3f %14d %14.1f" % (digits, "salted", derive_time * 1000, derive_peak,
+                                                     unlock_time * 1000))
+
+        for digits in (4, 5, 6, 7):
+            pin = "9" * digits
+            derive_time, derive_peak = self._measure(lambda: PinDerivation.legacy_passphrase(pin))
+            print("%-6d %-10s %14.3f %14d %14s" % (digits, "legacy", derive_time * 1000, derive_peak, "-"))
+
+    def kdf_profiles(self):
+        """!It shows the unlock latency and scrypt memory of a key wrapped with each of the KDF profiles."""
+
+        key = RSA.generate(2048)
+        print("%-12s %10s %4s %4s %14s %14s" % ("profile", "N", "r", "p", "memory [MiB]", "unlock [ms]"))
+        for name in PinDerivation.KDF_PROFILES:
+            kdf = PinDerivation.kdf_profile(name)
+            metadata = PinDerivation.new_metadata(kdf)
+            passphrase = PinDerivation.derive_passphrase("1234", metadata)
+            blob = PinDerivation.wrap_key(key, passphrase, kdf)
+            unlock_time = min(self._time(lambda: RSA.import_key(blob, passphrase)) for _ in range(self._repeats))
+            print("%-12s %10d %4d %4d %14.0f %14.1f" % (name, kdf['n'], kdf['r'], kdf['p'],
+                                                        PinDerivation.kdf_memory(kdf) / 2 ** 20, unlock_time * 1000))
+
+    @staticmethod
+    def _blank_pdf(pages=1):
+        """!\return (bytes) a blank pdf with the given number of pages, a single one by default"""
+
+        pdf = writer.PdfFileWriter(stream_xrefs=False)
+        for _ in range(pages):
+            pdf.insert_page(writer.PageObject(contents=pdf.add_object(generic.StreamObject(stream_data=b'')),
+                                              media_box=(0, 0, 595, 842)))
+        output = BytesIO()
+        pdf.write(output)
+        return output.getvalue()
+
+    @staticmethod
+    def _sign_document(document, cms_signer, timestamper):
+        """!It signs a pdf in memory, the way [SolutionPDFSigner](#SolutionPDFSigner) does.
+
+        \param document (bytes): the pdf
+        \param cms_signer (Signer): the CMS signer
+        \param timestamper (TimeStamper): the timestamping client, or None
+
+        \return (bytes) the signed pdf
+        """
+
+        output = BytesIO()
+        signers.sign_pdf(IncrementalPdfFileWriter(BytesIO(document), strict=False),
+                         signature_meta=signers.PdfSignatureMetadata(field_name='Signature', md_algorithm='sha256',
+                                                                     subfilter=SigSeedSubFilter.PADES),
+                         signer=cms_signer, timestamper=timestamper, output=output)
+        return output.getvalue()
+
+    def tsa_throughput(self, documents=20, threads=4):
+        """!It compares the signing throughput without timestamps with the one of timestamped signing against a local
+        stand-in TSA ([SolutionLocalTSA](#SolutionLocalTSA)): with the pooled client, with pyhanko's default client
+        (a new connection per request), and with the pooled client shared by concurrent signers. The TSA runs in its
+        own process, as a real one would not share the signer's CPU time.
+
+        \param documents (int): how many documents are signed in every mode
+        \param threads (int): how many signers run at once in the concurrent mode
+        """
+
+        key, cert = SolutionLocalTSA.generate_identity("ProjectBSK Benchmark Signer")
+        cms_signer = SolutionPDFSigner.build_cms_signer(RSA.import_key(key.dump()), cert)
+        document = self._blank_pdf()
+        local_tsa, url = self._start_local_tsa()
+        pooled = SolutionTimeStamper(url, max_connections=threads)
+
+        def sequential(timestamper):
+            return lambda: [self._sign_document(document, cms_signer, timestamper) for _ in range(documents)]
+
+        def concurrent(timestamper):
+            def run():
+                with ThreadPoolExecutor(max_workers=threads) as executor:
+                    list(executor.map(lambda _: self._sign_document(document, cms_signer, timestamper),
+                                      range(documents)))
+            return run
+
+        modes = [("no TSA", sequential(None)), ("pooled TSA", sequential(pooled)),
+                 ("default TSA", sequential(HTTPTimeStamper(url))),
+                 ("no TSA, %d threads" % threads, concurrent(None)),
+                 ("pooled TSA, %d threads" % threads, concurrent(pooled))]
+
+        print("%-24s %10s %12s %12s" % ("mode", "total [s]", "docs/s", "vs no TSA"))
+        baseline = None
+        try:
+            for name, run in modes:
+                total = min(self._time(run) for _ in range(self._repeats))
+                if baseline is None or name.startswith("no TSA,"):
+                    baseline = total
+                print("%-24s %10.2f %12.1f %11.0f%%" % (name, total, documents / total, 100 * baseline / total))
+        finally:
+            pooled.close()
+            local_tsa.terminate()
+            local_tsa.wait()
+
+    def shared_signer(self, documents=20, threads=4):
+        """!It compares the signing throughput of pyhanko's own CMS signer, which parses the private key for every
+        signature, with the one of [SolutionSharedSigner](#SolutionSharedSigner), used sequentially and shared by a
+        thread pool.
+
+        \param documents (int): how many documents are signed in every mode
+        \param threads (int): how many threads share the signer in the concurrent mode
+        """
+
+        key, cert = SolutionLocalTSA.generate_identity("ProjectBSK Benchmark Signer")
+        plain = SolutionSharedSigner(signers.SimpleSigner(signing_cert=cert, signing_key=key,
+                                                          cert_registry=SimpleCertificateStore.from_certs([cert])))
+        shared = SolutionSharedSigner(SolutionSharedSigner.build_cms_signer(RSA.import_key(key.dump()), cert))
+        document = self._blank_pdf()
+
+        def sequential(signer):
+            return lambda: [signer.sign_bytes(document) for _ in range(documents)]
+
+        def concurrent(signer):
+            def run():
+                with ThreadPoolExecutor(max_workers=threads) as executor:
+                    list(executor.map(lambda _: signer.sign_bytes(document), range(documents)))
+            return run
+
+        modes = [("pyhanko signer", sequential(plain)), ("shared signer", sequential(shared)),
+                 ("shared signer, %d threads" % threads, concurrent(shared))]
+
+        print("%-26s %10s %12s %14s" % ("mode", "total [s]", "docs/s", "vs pyhanko"))
+        baseline = None
+        for name, run in modes:
+            total = min(self._time(run) for _ in range(self._repeats))
+            baseline = baseline or total
+            print("%-26s %10.2f %12.1f %13.0f%%" % (name, total, documents / total, 100 * baseline / total))
+
+    def warm_up(self, pin="1234"):
+        """!It measures the time from the PIN being entered to the signed pdf being saved, in a fresh process (so
+        nothing is imported or cached yet) with and without the speculative warm-up of
+        [SolutionPDFSigner](#SolutionPDFSigner), which runs while the PIN dialog is open. The key is wrapped with the
+        default KDF profile.
+
+        \param pin (str): the key's PIN
+        """
+
+        key, cert = SolutionLocalTSA.generate_identity("ProjectBSK Benchmark Signer")
+        metadata = PinDerivation.new_metadata()
+        with tempfile.TemporaryDirectory() as directory:
+            key_path, cert_path = os.path.join(directory, "key.pem"), os.path.join(directory, "cert.pem")
+            work_dir = os.path.join(directory, "work")
+            os.makedirs(os.path.join(directory, "pdfs"))
+            os.makedirs(work_dir)
+            with open(key_path, "wb") as file:
+                file.write(PinDerivation.wrap_key(RSA.import_key(key.dump()),
+                                                  PinDerivation.derive_passphrase(pin, metadata)))
+            PinDerivation.write_metadata(key_path, metadata)
+            with open(cert_path, "wb") as file:
+                file.write(pem.armor('CERTIFICATE', cert.dump()))
+
+            print("%-12s %16s" % ("mode", "after PIN [ms]"))
+            for name, warm in (("cold", False), ("warmed up", True)):
+                best = float('inf')
+                for _ in range(self._repeats):
+                    with open(os.path.join(work_dir, "document.pdf"), "wb") as file:
+                        file.write(self._blank_pdf())
+                    output = subprocess.run([sys.executable, '-c', self.WARM_UP_PROBE, key_path, cert_path, pin,
+                                             str(warm)], cwd=work_dir, capture_output=True, text=True, check=True,
+                                            env=dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(__file__))))
+                    best = min(best, float(output.stdout.split()[-1]))
+                print("%-12s %16.1f" % (name, best * 1000))
+
+    def compact_output(self, pages=(1, 20)):
+        """!It compares the size of the incremental update a signature adds in the default output mode with the one in
+        the compact mode of [SolutionSharedSigner](#SolutionSharedSigner), with and without a timestamp (from an
+        in-process stand-in TSA), and reports the bytes saved per file.
+
+        \param pages (Iterable[int]): the page counts of the blank pdfs signed
+        """
+
+        key, cert = SolutionLocalTSA.generate_identity("ProjectBSK Benchmark Signer")
+        tsa_key, tsa_cert = SolutionLocalTSA.generate_identity()
+        cms_signer = SolutionSharedSigner.build_cms_signer(RSA.import_key(key.dump()), cert)
+        modes = [("no TSA", None), ("local TSA", LocalTimeStamper(tsa_cert, tsa_key))]
+
+        print("%-10s %6s %14s %14s %12s %8s" % ("mode", "pages", "default [B]", "compact [B]", "saved [B]", "saved"))
+        for name, timestamper in modes:
+            default = SolutionSharedSigner(cms_signer, timestamper)
+            compact = SolutionSharedSigner(cms_signer, timestamper, compact=True)
+            for count in pages:
+                document = self._blank_pdf(count)
+                default_size = len(default.sign_bytes(document)) - len(document)
+                compact_size = len(compact.sign_bytes(document)) - len(document)
+                print("%-10s %6d %14d %14d %12d %7.0f%%" % (name, count, default_size, compact_size,
+                                                            default_size - compact_size,
+                                                            100 * (default_size - compact_size) / default_size))
+
+    def detached(self, size_mb=256):
+        """!It measures the throughput and the peak memory of signing a large file with a detached signature and of
+        verifying it, next to a plain chunked SHA256 of the file, which bounds them from above.
+
+        \param size_mb (int): the size of the file, in MiB
+        """
+
+        key, cert = SolutionLocalTSA.generate_identity("ProjectBSK Benchmark Signer")
+        signer = SolutionSharedSigner(SolutionSharedSigner.build_cms_signer(RSA.import_key(key.dump()), cert))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "large.bin")
+            with open(path, "wb") as file:
+                for _ in range(size_mb):
+                    file.write(os.urandom(1024 * 1024))
+            cert_path = os.path.join(directory, "cert.pem")
+            with open(cert_path, "wb") as file:
+                file.write(pem.armor('CERTIFICATE', cert.dump()))
+            verifier = SolutionDetachedVerifier()
+            verifier._trust_store = SolutionTrustStore(cert_paths=[cert_path])
+            verifier.set_public_key()
+            verifier.set_file(directory + os.sep, "large.bin")
+
+            operations = [("sha256", lambda: SolutionBatch.file_sha256(path)),
+                          ("sign", lambda: signer.sign_detached(path)),
+                          ("verify", lambda: verifier.verify())]
+            print("%-8s %12s %12s %16s" % ("step", "time [s]", "MiB/s", "peak memory [kB]"))
+            for name, operation in operations:
+                tracemalloc.start()
+                spent = min(self._time(operation) for _ in range(self._repeats))
+                peak = tracemalloc.get_traced_memory()[1]
+                tracemalloc.stop()
+                print("%-8s %12.2f %12.0f %16.0f" % (name, spent, size_mb / spent, peak / 1024))
+
+    def merkle_batch(self, documents=200):
+        """!It compares the signing throughput of a batch of small pdfs signed one by one (with embedded signatures,
+        and with detached ones) with the one of the same batch signed with a single signature of its Merkle tree's root
+        (see [SolutionMerkleBatch](#SolutionMerkleBatch)).
+
+        \param documents (int): the number of pdfs in the batch
+        """
+
+        key, cert = SolutionLocalTSA.generate_identity("ProjectBSK Benchmark Signer")
+        signer = SolutionSharedSigner(SolutionSharedSigner.build_cms_signer(RSA.import_key(key.dump()), cert))
+        with tempfile.TemporaryDirectory() as directory:
+            paths = [os.path.join(directory, "%d.pdf" % number) for number in range(documents)]
+            for path in paths:
+                with open(path, "wb") as file:
+                    file.write(self._blank_pdf())
+
+            modes = [("embedded", lambda: [signer.sign_file(path, path + ".signed") for path in paths]),
+                     ("detached", lambda: [signer.sign_detached(path) for path in paths]),
+                     ("merkle", lambda: SolutionMerkleBatch(signer).sign(paths))]
+            print("%-10s %12s %12s" % ("mode", "time [s]", "docs/s"))
+            for name, sign in modes:
+                spent = min(self._time(sign) for _ in range(self._repeats))
+                print("%-10s %12.3f %12.0f" % (name, spent, documents / spent))
+
+    def startup_latency(self, timeout=60):
+        """!It measures how long the main window takes to construct, to be painted for the first time, and to finish
+        the background drive probe, counting from the start of its construction. Without a display, run it with
+        `QT_QPA_PLATFORM=offscreen`.
+
+        \param timeout (float): how long to wait for the first paint and the probe, in seconds
+        """
+
+        app = QtWidgets.QApplication.instance() or QtWidgets.QApplication([])
+        print("%-6s %16s %16s %16s" % ("run", "constructed [ms]", "first paint [ms]", "probe done [ms]"))
+        for run in range(self._repeats):
+            times = {}
+            start = time.perf_counter()
+            widget = SolutionGUI()
+            times['constructed'] = time.perf_counter()
+            paint_watch = PaintWatch(widget, times)
+            widget.probe_finished.connect(lambda *_: times.setdefault('probed', time.perf_counter()))
+            widget.show()
+            loop = QtCore.QEventLoop()
+            poll = QtCore.QTimer(interval=5)
+            poll.timeout.connect(lambda: 'painted' in times and 'probed' in times and loop.quit())
+            poll.start()
+            QtCore.QTimer.singleShot(int(1000 * timeout), loop.quit)
+            loop.exec()
+            poll.stop()
+            widget.removeEventFilter(paint_watch)
+            widget.end_listening()
+            widget.close()
+            widget.deleteLater()
+            print("%-6d %16s %16s %16s" % (run + 1, *("%.1f" % (1000 * (times[key] - start)) if key in times else "-"
+                                                      for key in ('constructed', 'painted', 'probed'))))
+
+    @staticmethod
+    def _start_local_tsa():
+        """!It starts [SolutionLocalTSA](#SolutionLocalTSA) in a separate process, on a free port, and waits until it
+        accepts connections.
+
+        \return (Tuple[subprocess.Popen, str]) the TSA's process and URL
+        """
+
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        process = subprocess.Popen([sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                                 "SolutionLocalTSA.py"), '--port', str(port)],
+                                   stdout=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return process, "http://127.0.0.1:%d/" % port
+            except OSError:
+                if time.monotonic() > deadline or process.poll() is not None:
+                    process.kill()
+                    raise RuntimeError("Nie udało się uruchomić lokalnego serwera znaczników czasu")
+                time.sleep(0.1)
+
+    @staticmethod
+    def _time(function):
+        """!\return (float) the wall-clock time in seconds of a single function call"""
+
+        start = time.perf_counter()
+        function()
+        return time.perf_counter() - start
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmarks of the main app")
+    parser.add_argument('benchmark', choices=['pin_unlock', 'kdf_profiles', 'tsa_throughput', 'shared_signer',
+                                                    'compact_output', 'startup_latency', 'warm_up',
+                                                    'detached', 'merkle_batch'])
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+
+    getattr(SolutionBenchmark(args.repeats), args.benchmark)()
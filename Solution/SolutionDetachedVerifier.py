@@ -0,0 +1,70 @@
+"""!@package SolutionDetachedVerifier
+Verification of the detached CMS signatures of files of any kind, made by `SolutionSharedSigner.sign_detached()`.
+
+The signature of a file is looked for next to it, in the file with `.p7s` appended to its name. The signer is looked up
+in the same trust store as the one of [SolutionHashComparer](#SolutionHashComparer), and the file is hashed in
+fixed-size chunks, so its size does not matter for the memory used.
+"""
+
+import asyncio
+import os
+from collections import namedtuple
+
+from asn1crypto import cms
+from pyhanko.sign.validation.generic_cms import async_validate_detached_cms, extract_certificate_info
+
+from SolutionHashComparer import SolutionHashComparer
+from SolutionMetrics import SolutionMetrics
+from SolutionSharedSigner import SolutionSharedSigner
+
+
+## The parts of a detached signature the trust store looks the signer up by, as in an embedded pdf signature.
+DetachedSignature = namedtuple('DetachedSignature', ['signer_info', 'signer_cert'])
+
+
+class SolutionDetachedVerifier(SolutionHashComparer):
+    """!The detached signature verifier class. It realizes all the functionalities of this package."""
+
+    def __init__(self):
+        """!Constructor. The verification cache is not used, as it is kept for pdfs."""
+
+        super().__init__()
+
+    def signature_path(self):
+        """!\return (str) path to the chosen file's signature"""
+
+        return self._file_path + self._file_name + ".p7s"
+
+    def _verify(self):
+        """!It validates the chosen file's detached signature and prints the details.
+
+        \return (int) the result code of `verify()`: -1 if the file has no signature next to it
+        """
+
+        if not os.path.isfile(self.signature_path()):
+            return -1
+        with open(self.signature_path(), "rb") as file:
+            signature = file.read()
+        with open(self._file_path + self._file_name, "rb") as file:
+            SolutionMetrics.instance().inc('bsk_bytes_processed_total', os.fstat(file.fileno()).st_size,
+                                           operation='verify')
+            return 1 if self._validate_detached(file, signature) else 0
+
+    def _validate_detached(self, data, signature):
+        """!It validates a detached signature of some data and prints the details.
+
+        \param data (bytes|BinaryIO): the data, or a stream it is read from in chunks
+        \param signature (bytes): the DER encoded signature
+
+        \return (bool) whether the signature is valid and its signer trusted
+        """
+
+        signed_data = cms.ContentInfo.load(signature)['content']
+        signer = DetachedSignature(signed_data['signer_infos'][0], extract_certificate_info(signed_data).signer_cert)
+        if self._trust_store.lookup_signer(signer) is None:
+            print("Nieznany podpisujący - brak certyfikatu w magazynie zaufanych certyfikatów")
+            return False
+        status = asyncio.run(async_validate_detached_cms(data, signed_data, self._vc,
+                                                         chunk_size=SolutionSharedSigner.CHUNK_SIZE))
+        print(status.pretty_print_details())
+        return status.bottom_line
@@ -1,30 +1,57 @@
 """!@package SolutionGUI
 It revolves around the user interface of the main application, controls the processes of
 signing/verification, and enables them based on feedback from [DeviceListener](#DeviceListener).
+
+The window is shown right away: once the event loop starts, the drives are enumerated and searched for a key on a
+background thread, and the window shows that the pendrive is being looked for until the search is over.
+
+Files other than pdfs can be chosen too: they are signed with detached signatures saved next to them, and verified
+with [SolutionDetachedVerifier](#SolutionDetachedVerifier). A file signed in a Merkle batch (see
+[SolutionMerkleBatch](#SolutionMerkleBatch)) is verified with [SolutionMerkleVerifier](#SolutionMerkleVerifier).
+
+Given a keystore (see [SolutionKeyStore](#SolutionKeyStore)) and a key ID, the app signs with that key instead of
+looking for a pendrive.
 """
 
 from PySide6 import QtCore, QtWidgets
 from collections import namedtuple
+import threading
 import time
 
 from PySide6.QtCore import QCoreApplication
 from PySide6.QtWidgets import QFileDialog
 
 from DLThread import DLThread
+from DeviceEventCoalescer import DeviceEventCoalescer
 from DeviceListener import DeviceListener
+from SolutionDetachedVerifier import SolutionDetachedVerifier
 from SolutionHashComparer import SolutionHashComparer
+from SolutionKeyDiscovery import SolutionKeyDiscovery
+from SolutionMerkleBatch import SolutionMerkleBatch
+from SolutionMerkleVerifier import SolutionMerkleVerifier
 from SolutionPDFSigner import SolutionPDFSigner
-from pathlib import Path
+from SolutionQueueView import SolutionQueueView
 
 import os
 
 
 class SolutionGUI(QtWidgets.QWidget):
-    """!The main app GUI class. It realizes all the functionalities of this package."""
+    """!The main app GUI class. It realizes all the functionalities of this package.
+
+    Attributes:
+    + probe_finished: signal emitted from the probing thread with the probe's number, the path of the key found and
+    the path of the certificate found next to it (empty if there is none)
+    """
+
+    probe_finished = QtCore.Signal(int, str, str)
 
+    def __init__(self, keystore=None, key_id=None):
+        """!Constructor. It Initializes all the widget's elements, used constants, and places them in the layout.
 
-    def __init__(self):
-        """!Constructor. It Initializes all the widget's elements, used constants, and places them in the layout."""
+        \param keystore (SolutionKeyStore): the keystore holding the key used for signing, None to use the pendrive's
+        key
+        \param key_id (str): the key's ID in the keystore
+        """
         super().__init__()
 
         Constants = namedtuple('Constants', ['NR_OF_STAGES_SIGNING', 'NR_OF_STAGES_VERIFYING'])
@@ -33,19 +60,40 @@ class SolutionGUI(QtWidgets.QWidget):
         self._current_stage_nr = 0
         self._signer: SolutionPDFSigner = None
         self._hash_comparer = SolutionHashComparer()
+        self._detached_verifier = SolutionDetachedVerifier()
+        self._merkle_verifier = SolutionMerkleVerifier()
+        self._key_discovery = SolutionKeyDiscovery()
+        self._key_path = None
+        self._cert_path = None
+        self._keystore_entry = keystore.find(key_id=key_id) if keystore is not None else None
+        if keystore is not None and self._keystore_entry is None:
+            raise KeyError(key_id)
+        self._is_d_drive_connected = False
+        self._probe_number = 0
+        self._discovery_lock = threading.Lock()
+        self.probe_finished.connect(self.on_probe_finished)
 
         print("Inicjowanie DeviceListenera...")
-        self._listener = DeviceListener(on_change=self.on_devices_changed)
-
-        print("Pobieranie informacji o dyskach...")
-        self._is_d_drive_connected = self.find_d_drive()
+        self._listener = DeviceListener(on_change=lambda: self._coalescer.notify())
+        self._coalescer = DeviceEventCoalescer(self._listener.list_drives, parent=self)
+        self._coalescer.medium_changed.connect(self.on_devices_changed)
 
         print("Inicjowanie GUI...")
-        self._d_drive_comm = QtWidgets.QLabel("Pendrive nie jest podpięty" if not self._is_d_drive_connected else "Pendrive jest podpięty, klucz został pobrany")
+        self._d_drive_comm = QtWidgets.QLabel("Wyszukiwanie pendrive'a z kluczem...")
         self._ending_comm = QtWidgets.QLabel("")
         self._result_comm = QtWidgets.QLabel("")
+        self._queue_view = SolutionQueueView()
+        self._queue_view.set_key_path(self._key_path)
+        if self._keystore_entry is not None:
+            self._queue_view.set_keystore(keystore, key_id)
+            self._key_path = self._keystore_entry.key_path
+            self._is_d_drive_connected = True
+            self._d_drive_comm.setText("Klucz z magazynu kluczy: " + self._keystore_entry.subject)
+            self._signer = SolutionPDFSigner(keystore=keystore, key_id=key_id)
+            self._signer.start_warm_up()
         self._button_sign = QtWidgets.QPushButton("Rozpocznij podpisywanie")
         self._button_verify = QtWidgets.QPushButton("Rozpocznij weryfikacje")
+        self._button_queue = QtWidgets.QPushButton("Kolejka plików")
         self._button_close = QtWidgets.QPushButton("Wyjdź z programu")
 
         self._layout = QtWidgets.QVBoxLayout(self)
@@ -88,7 +136,9 @@ class SolutionGUI(QtWidgets.QWidget):
 
         self._button_sign.clicked.connect(self.proceed_sign)
         self._button_verify.clicked.connect(self.proceed_verify)
+        self._button_queue.clicked.connect(self.show_queue)
         self._button_close.clicked.connect(self.end_listening)
+        self._button_close.clicked.connect(self._queue_view.close)
         self._button_close.clicked.connect(QCoreApplication.instance().quit)
 
         self._grid.setEnabled(False)
@@ -102,10 +152,13 @@ class SolutionGUI(QtWidgets.QWidget):
         self._layout.addWidget(self._result_comm, alignment=QtCore.Qt.AlignmentFlag.AlignTop)
         self._layout.addWidget(self._button_sign, alignment=QtCore.Qt.AlignmentFlag.AlignBottom)
         self._layout.addWidget(self._button_verify, alignment=QtCore.Qt.AlignmentFlag.AlignBottom)
+        self._layout.addWidget(self._button_queue, alignment=QtCore.Qt.AlignmentFlag.AlignBottom)
         self._layout.addWidget(self._button_close, alignment=QtCore.Qt.AlignmentFlag.AlignBottom)
 
-        self._listenerThread = DLThread(target=self._listener.start)
+        self._listenerThread = DLThread(target=self._listener.start, listener=self._listener)
         self._listenerThread.start()
+        print("Pobieranie informacji o dyskach w tle...")
+        QtCore.QTimer.singleShot(0, self.start_probe)
         print("Inicjalizacja zakończona")
 
     def generation_stages_init(self):
@@ -153,12 +206,13 @@ class SolutionGUI(QtWidgets.QWidget):
         self._button_verify.repaint()
 
         self.show_current_arrow(self._current_stage_nr)
-        pin = int(self.ask_for_pin())
+        pin = self.ask_for_pin()
         self.set_texts_sign()
         time.sleep(0.5)
 
         self.show_current_arrow(self._current_stage_nr)
-        fileName = QFileDialog.getOpenFileName(self, "Open PDF", "C:\Studia\BSK\ProjektBSK\pdfs", "PDF Files (*.pdf)")[0]
+        fileName = QFileDialog.getOpenFileName(self, "Open PDF", "C:\Studia\BSK\ProjektBSK\pdfs",
+                                               "PDF Files (*.pdf);;All Files (*)")[0]
         name, path = os.path.basename(fileName), os.path.dirname(fileName) + '/'
         if name == "":
             self.generation_stages_init()
@@ -170,6 +224,7 @@ class SolutionGUI(QtWidgets.QWidget):
             self._result_comm.setText("Brak wybranego pliku")
             return
         self._signer.set_file(path, name)
+        detached = not name.lower().endswith('.pdf')
         self.set_texts_sign()
         time.sleep(0.5)
 
@@ -193,7 +248,7 @@ class SolutionGUI(QtWidgets.QWidget):
         time.sleep(0.5)
 
         self.show_current_arrow(self._current_stage_nr)
-        was_signed = self._signer.prepare_file()
+        was_signed = self._signer.prepare_file() if not detached else 1
         if was_signed == 0:
             self.generation_stages_init()
             self._button_sign.setEnabled(True if self._is_d_drive_connected else False)
@@ -216,7 +271,10 @@ class SolutionGUI(QtWidgets.QWidget):
         time.sleep(0.5)
 
         self.show_current_arrow(self._current_stage_nr)
-        self._signer.sign()
+        if detached:
+            self._signer.sign_detached()
+        else:
+            self._signer.sign()
         self.set_texts_sign()
         time.sleep(0.5)
 
@@ -255,7 +313,8 @@ class SolutionGUI(QtWidgets.QWidget):
         self._button_verify.repaint()
 
         self.show_current_arrow(self._current_stage_nr)
-        fileName = QFileDialog.getOpenFileName(self, "Open PDF", "C:\Studia\BSK\ProjektBSK\pdfs", "PDF Files (*.pdf)")[0]
+        fileName = QFileDialog.getOpenFileName(self, "Open PDF", "C:\Studia\BSK\ProjektBSK\pdfs",
+                                               "PDF Files (*.pdf);;All Files (*)")[0]
         name, path = os.path.basename(fileName), os.path.dirname(fileName)+'/'
         if name == "":
             self.generation_stages_init()
@@ -266,17 +325,21 @@ class SolutionGUI(QtWidgets.QWidget):
             self._button_verify.repaint()
             self._result_comm.setText("Brak wybranego pliku")
             return
-        self._hash_comparer.set_file(path, name)
+        if os.path.isfile(SolutionMerkleBatch.sidecar_path(path + name)):
+            verifier = self._merkle_verifier
+        else:
+            verifier = self._hash_comparer if name.lower().endswith('.pdf') else self._detached_verifier
+        verifier.set_file(path, name)
         self.set_texts_verify()
         time.sleep(0.5)
 
         self.show_current_arrow(self._current_stage_nr)
-        self._hash_comparer.set_public_key()
+        verifier.set_public_key()
         self.set_texts_verify()
         time.sleep(0.5)
 
         self.show_current_arrow(self._current_stage_nr)
-        valid = self._hash_comparer.verify()
+        valid = verifier.verify()
         if valid == -1:
             self.generation_stages_init()
             self._button_sign.setEnabled(True if self._is_d_drive_connected else False)
@@ -317,6 +380,16 @@ class SolutionGUI(QtWidgets.QWidget):
             self._stage_checks[self._current_stage_nr].setChecked(True)
             return pin
 
+    @QtCore.Slot()
+    def show_queue(self):
+        """!It shows the [SolutionQueueView](#SolutionQueueView) window, for signing and verifying many files at
+        once.
+        """
+
+        self._queue_view.resize(900, 500)
+        self._queue_view.show()
+        self._queue_view.raise_()
+
     def show_current_arrow(self, idx):
         """!Changes position of the arrow showing currently executed stage to the next stage."""
 
@@ -344,74 +417,89 @@ class SolutionGUI(QtWidgets.QWidget):
         self._stage_checks[self._current_stage_nr].setChecked(True)
         self._current_stage_nr += 1
 
-    def find_d_drive(self):
-        """!\brief Checking the pendrive's status.
+    def start_probe(self, drives=None):
+        """!\brief Checking the pendrive's status in the background.
 
-        It calls the listener's `list_drives()` function, and checks if the pendrive (with a private key present) is
-        amongst them.
+        It starts a thread running `find_d_drive()`. Its result is applied by `on_probe_finished()`, on the GUI thread;
+         when probes overlap, only the latest one's result is applied.
 
-        \return (bool) whether the pendrive with a key was found or
+        \param drives (List[Drive]): the drives to check, all the drives (enumerated on the thread) if not given
         """
 
-        drives = self._listener.list_drives()
-        removable_drives = [d for d in drives if d.is_removable]
-        for drive in removable_drives:
-            if drive.letter == 'D:':
-                my_file = Path("D:/ProjectBSKPrivateKey.pem")
-                if my_file.is_file():
-                    return True
+        if self._keystore_entry is not None:
+            return
+        self._probe_number += 1
+        threading.Thread(target=self.find_d_drive, args=(drives, self._probe_number), daemon=True).start()
 
-        return False
+    def find_d_drive(self, drives=None, probe_number=0):
+        """!\brief Checking the pendrive's status.
 
-    def on_devices_changed(self):
-        """!\brief Checking the device setup changes.
+        It checks if a pendrive with a private key present is amongst the given drives, or the ones returned by the
+        coalescer's `refresh()` method if none are given. All the removable drives are searched with
+        [SolutionKeyDiscovery](#SolutionKeyDiscovery). It runs on a probing thread (see `start_probe()`), and emits the
+        paths of the first key found and of its certificate with `probe_finished`.
 
-        It's called by [DeviceListener](#DeviceListener) class when a change in drives' configuration has been detected.
-         It calls the `find_d_drive()` method to ascertain the desired pendrive's presence, and if so, it loads the
-         encrypted private key (via initializing the [SolutionPDFSigner](#SolutionPDFSigner) class), and starts the
-         signing process.
+        \param drives (List[Drive]): the drives to check
+        \param probe_number (int): the probe's number
         """
 
-        self._d_drive_comm.setText("Sprawdzam zmiany urzadzeń zewnętrznych...")
-        self._d_drive_comm.repaint()
-        self._button_sign.setEnabled(False)
-        self._button_sign.repaint()
-        self._button_verify.setEnabled(False)
-        self._button_verify.repaint()
-        is_found = self.find_d_drive()
-        flag = False
-        if not self._is_d_drive_connected and is_found:
-            self._is_d_drive_connected = True
-            self._d_drive_comm.setText("Pendrive z kluczem jest podpięty, klucz został pobrany")
-            self._button_sign.setEnabled(True)
-            flag = True
-        elif self._is_d_drive_connected and not is_found:
-            self._is_d_drive_connected = False
+        if drives is None:
+            drives = self._coalescer.refresh()
+        with self._discovery_lock:
+            key = self._key_discovery.find(drives)
+        self.probe_finished.emit(probe_number, key.key_path if key is not None else "",
+                                 (key.cert_path or "") if key is not None else "")
+
+    @QtCore.Slot(int, str, str)
+    def on_probe_finished(self, probe_number, key_path, cert_path):
+        """!\brief Applying the pendrive's status.
+
+        It remembers the paths of the key found by the latest probe and of its certificate, and updates the window.
+         If a key other than the one in use has been found (at startup, after a pendrive was inserted, or when
+         another pendrive took its place), it loads the encrypted private key (via initializing the
+         [SolutionPDFSigner](#SolutionPDFSigner) class), starts preparing the signing in the background (see
+         `SolutionPDFSigner.warm_up()`), and starts the signing process, which asks for the PIN.
+
+        \param probe_number (int): the probe's number
+        \param key_path (str): path to the key found, empty if there is none
+        \param cert_path (str): path to the certificate found next to the key, empty if there is none (the auxiliary
+        app's certificate is used then)
+        """
+
+        if probe_number != self._probe_number:
+            return
+        previous_paths = (self._key_path, self._cert_path)
+        self._is_d_drive_connected = key_path != ""
+        self._key_path = key_path or None
+        self._cert_path = cert_path or None
+        self._queue_view.set_key_path(self._key_path, self._cert_path)
+        self._button_sign.setEnabled(self._is_d_drive_connected)
+        if not self._is_d_drive_connected:
             self._d_drive_comm.setText("Pendrive nie jest podpięty lub brak klucza")
-            self._button_sign.setEnabled(False)
+        elif (self._key_path, self._cert_path) != previous_paths:
+            self._d_drive_comm.setText("Pendrive z kluczem jest podpięty, klucz został pobrany")
+            self._signer = SolutionPDFSigner(key_path=self._key_path, cert_path=self._cert_path)
+            self._signer.start_warm_up()
+            self._button_sign.click()
 
-        self._button_verify.setEnabled(True)
+    @QtCore.Slot(list, list)
+    def on_devices_changed(self, appeared, disappeared):
+        """!\brief Checking the device setup changes.
 
-        self._d_drive_comm.repaint()
-        self._button_sign.repaint()
-        self._button_verify.repaint()
-        self.repaint()
+        It's called on the GUI thread, through [DeviceEventCoalescer](#DeviceEventCoalescer), once per physical
+         change of the removable drives. It starts a background probe of the coalescer's drive snapshot, to ascertain
+         the desired pendrive's presence (see `start_probe()`).
 
-        if flag:
-            self._signer = SolutionPDFSigner()
-            self._button_sign.click()
+        \param appeared (List[Drive]): removable drives that appeared
+        \param disappeared (List[Drive]): removable drives that disappeared
+        """
+
+        self.start_probe(self._coalescer.snapshot)
 
     def end_listening(self):
         """!A method for ending the listener's thread."""
 
+        self._coalescer.cancel()
+        self._queue_view.shutdown()
         self._listenerThread.kill()
         self._listenerThread.join()
-
-    def sign_if_pendrive_on_start(self):
-        """!A method for a thread to check whether the app should load the key and start the signing proccess on
-        execution.
-        """
-
-        if self._is_d_drive_connected:
-            self._signer = SolutionPDFSigner()
-            self._button_sign.click()
\ No newline at end of file
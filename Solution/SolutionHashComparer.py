@@ -1,27 +1,49 @@
 """!@package SolutionHashComparer
 It realizes all the functionalities needed for the verification process.
+
+With a [SolutionVerificationCache](#SolutionVerificationCache), verification is incremental: a document which only grew
+by incremental updates since its last verification has only its new revisions examined, so re-verifying a large
+document with many revisions takes time in proportion to what changed. The cached verdicts do not follow later changes
+of the trust store; the cache has to be cleared for that.
+
+Both with and without a cache, every signature of a document is judged, and the document is reported as valid only if
+all of them are valid.
 """
 
+import os
 from collections import namedtuple
+from io import BytesIO
 
 from Crypto.PublicKey import RSA
-from pyhanko.keys import load_cert_from_pemder
 from pyhanko.pdf_utils.reader import PdfFileReader
+from pyhanko.sign.diff_analysis import DEFAULT_DIFF_POLICY, ModificationLevel, SuspiciousModification
 from pyhanko.sign.validation import validate_pdf_signature
-from pyhanko_certvalidator import ValidationContext
+
+from SolutionMetrics import SolutionMetrics
+from SolutionTrustStore import SolutionTrustStore
+from SolutionVerificationCache import SolutionVerificationCache, VerifiedDocument, VerifiedSignature
 
 
 class SolutionHashComparer():
     """!The verifier class. It realizes all the functionalities of this package."""
 
-    def __init__(self):
-        """!Constructor. It sets the constants used."""
+    def __init__(self, cache=None):
+        """!Constructor. It sets the constants used.
+
+        \param cache (SolutionVerificationCache): the verdicts of earlier verifications, None to verify every document
+        from scratch
+        """
 
         Constants = namedtuple('Constants',
-                               ['LENGTH_OF_RSA_KEY', 'KEY_FORMAT', 'PATH_FOR_PUBLIC_KEY'])
+                               ['LENGTH_OF_RSA_KEY', 'KEY_FORMAT', 'PATH_FOR_PUBLIC_KEY', 'PATH_FOR_CERTIFICATE',
+                                'PATH_FOR_TRUST_STORE'])
         self._constants = Constants(LENGTH_OF_RSA_KEY=4096, KEY_FORMAT='PEM',
-                                    PATH_FOR_PUBLIC_KEY="C:/Studia/BSK/ProjektBSK/AuxiliaryApp/ProjectBSKPublicKey.pem")
+                                    PATH_FOR_PUBLIC_KEY="C:/Studia/BSK/ProjektBSK/AuxiliaryApp/ProjectBSKPublicKey.pem",
+                                    PATH_FOR_CERTIFICATE="C:/Studia/BSK/ProjektBSK/AuxiliaryApp/certyfikat.pem",
+                                    PATH_FOR_TRUST_STORE="C:/Studia/BSK/ProjektBSK/truststore")
+        self._cache = cache
         self._public_key = None
+        self._trust_store = None
         self._file_path = None
         self._file_name = None
         self._signature = None
@@ -38,36 +60,181 @@ class SolutionHashComparer():
         self._file_name = name
 
     def set_public_key(self):
-        """!It loads the public key and its certificate from a file."""
+        """!It loads the trusted certificates: the certificate generated by the auxiliary app and everything found in
+        the trust store directory (e.g. the local CA's root). The store is loaded only once and then reused.
+        """
 
-        with open(self._constants.PATH_FOR_PUBLIC_KEY, "rb") as file:
-            data = file.read()
-            self._public_key = RSA.import_key(data)
+        if os.path.isfile(self._constants.PATH_FOR_PUBLIC_KEY):
+            with open(self._constants.PATH_FOR_PUBLIC_KEY, "rb") as file:
+                data = file.read()
+                self._public_key = RSA.import_key(data)
 
-        root_cert = load_cert_from_pemder("C:/Studia/BSK/ProjektBSK/AuxiliaryApp/certyfikat.pem")
-        self._vc = ValidationContext(trust_roots=[root_cert])
+        if self._trust_store is None:
+            self._trust_store = SolutionTrustStore(cert_paths=[self._constants.PATH_FOR_CERTIFICATE],
+                                                   directories=[self._constants.PATH_FOR_TRUST_STORE])
+        self._vc = self._trust_store.validation_context()
 
     def verify(self):
-        """!It validates the signature, based on the public key and certificate loaded by `set_public_key()` method
-        It then prints the process' details to the console.
+        """!It validates all the signatures, based on the public key and certificate loaded by `set_public_key()` method
+        It then prints the process' details to the console. A pdf carrying its own validation data (a DSS) is validated
+        offline, using only that data and the trust roots.
 
-        \return  1: the signature is valid
-        \return  0: the signature is invalid
+        \return  1: all the signatures are valid
+        \return  0: a signature is invalid (or its signer is not in the trust store)
         \return -1: the chosen file has no signature to verify
         """
 
+        return self._measured(self._verify)
+
+    def verify_bytes(self, document):
+        """!It validates the signature of a pdf held in memory (e.g. read from an archive, see
+        [SolutionArchive](#SolutionArchive)), as `verify()` does. The verification cache is not used, as it is kept by
+        the documents' paths.
+
+        \param document (bytes): the pdf
+
+        \return (int) the result code of `verify()`
+        """
+
+        return self._measured(lambda: self._verify_stream(BytesIO(document), len(document)))
+
+    @staticmethod
+    def _measured(verification):
+        """!It runs a verification, recording its metrics.
+
+        \param verification (Callable[[], int]): the verification
+
+        \return (int) the verification's result code
+        """
+
+        metrics = SolutionMetrics.instance()
+        with metrics.timer('bsk_verify_seconds'):
+            result = verification()
+        metrics.inc('bsk_documents_verified_total')
+        metrics.inc('bsk_verify_results_total', code=result)
+        return result
+
+    def _verify(self):
+        """!The body of `verify()`.
+
+        \return (int) the result code of `verify()`
+        """
+
+        if self._cache is not None:
+            return self._verify_incremental()
         with open(self._file_path + self._file_name, 'rb') as doc:
-            self._r = PdfFileReader(doc, strict=False)
-            if len(self._r.embedded_signatures) == 0:
-                return -1
-            self._sig = self._r.embedded_signatures[0]
-            status = validate_pdf_signature(self._sig, self._vc)
-            print(status.pretty_print_details())
-            if status.bottom_line:
-                return 1
+            return self._verify_stream(doc, os.fstat(doc.fileno()).st_size)
+
+    def _verify_stream(self, doc, length):
+        """!It validates all the signatures of a pdf, without the cache.
 
-            return 0
+        \param doc (BinaryIO): the pdf
+        \param length (int): the pdf's length
+
+        \return (int) the result code of `verify()`
+        """
 
+        SolutionMetrics.instance().inc('bsk_bytes_processed_total', length, operation='verify')
+        self._r = PdfFileReader(doc, strict=False)
+        return self._verdict([VerifiedSignature(sig.field_name, sig.signed_revision, self._validate_signature(sig))
+                              for sig in self._r.embedded_signatures])
 
+    def _validate_signature(self, sig):
+        """!It validates a signature of the document being verified and prints the details.
 
+        \param sig (EmbeddedPdfSignature): the signature
+
+        \return (bool) whether the signature is valid
+        """
+
+        if self._trust_store.lookup_signer(sig) is None:
+            print("Nieznany podpisujący - brak certyfikatu w magazynie zaufanych certyfikatów")
+            return False
+        vc = self._trust_store.offline_validation_context(self._r)
+        if vc is not None:
+            print("Weryfikacja na podstawie danych walidacyjnych zapisanych w dokumencie (DSS)")
+        status = validate_pdf_signature(sig, vc if vc is not None else self._vc)
+        print(status.pretty_print_details())
+        return status.bottom_line
+
+    def _verify_incremental(self):
+        """!The body of `verify()` with a cache: only the revisions added since the last verification are examined.
+        Unless all the signatures are valid, the document is reported as invalid.
+
+        \return (int) the result code of `verify()`
+        """
+
+        path = self._file_path + self._file_name
+        entry = self._cache.lookup(path)
+        with open(path, 'rb') as doc:
+            length = os.fstat(doc.fileno()).st_size
+            SolutionMetrics.instance().inc('bsk_bytes_processed_total', length, operation='verify')
+            unchanged, sha256 = SolutionVerificationCache.read_prefix(doc, entry)
+            if unchanged and length == entry.length:
+                print("Dokument nie zmienił się od ostatniej weryfikacji")
+                return self._verdict(entry.signatures)
+            if entry is not None and not unchanged:
+                print("Dokument został zmieniony od ostatniej weryfikacji - pełna weryfikacja")
+
+            known = {(sig.field, sig.revision): sig.valid for sig in entry.signatures} if unchanged else {}
+            first_new_revision = entry.revisions if unchanged else 0
+            doc.seek(0)
+            self._r = PdfFileReader(doc, strict=False)
+            signatures = []
+            reviews = []
+            for sig in self._r.embedded_signatures:
+                valid = known.get((sig.field_name, sig.signed_revision))
+                if valid is None:
+                    valid = self._validate_signature(sig)
+                elif valid:
+                    valid = self._new_revisions_allowed(sig, first_new_revision, reviews)
+                signatures.append(VerifiedSignature(sig.field_name, sig.signed_revision, valid))
+            self._cache.store(path, VerifiedDocument(length, sha256, self._r.xrefs.total_revisions, signatures))
+        return self._verdict(signatures)
+
+    def _new_revisions_allowed(self, sig, first_revision, reviews):
+        """!It checks the modifications made by the new revisions of the document being verified against an already
+        verified signature. Like pyhanko's own review (`DiffPolicy.review_file()`), every revision is compared with the
+        signed revision on its own, so the verdict on the revisions verified before still holds, and only the new ones
+        are compared. The same review is shared by all the signatures of the same revision with the same modification
+        permissions (DocMDP and FieldMDP).
+
+        \param sig (EmbeddedPdfSignature): the signature
+        \param first_revision (int): the first new revision
+        \param reviews (List[Tuple[Tuple, bool]]): the reviews made so far, by the signed revision and the permissions
+        they were made with
+
+        \return (bool) whether the modifications are allowed by the signature
+        """
 
+        permissions = (sig.signed_revision, sig.docmdp_level, sig.fieldmdp)
+        for reviewed, allowed in reviews:
+            if reviewed == permissions:
+                return allowed
+
+        signed = self._r.get_historical_resolver(sig.signed_revision)
+        level = ModificationLevel.NONE
+        allowed = True
+        for revision in range(max(first_revision, sig.signed_revision + 1), self._r.xrefs.total_revisions):
+            try:
+                diff = DEFAULT_DIFF_POLICY.apply(old=signed, new=self._r.get_historical_resolver(revision),
+                                                 field_mdp_spec=sig.fieldmdp, doc_mdp=sig.docmdp_level)
+            except SuspiciousModification:
+                allowed = False
+                break
+            level = max(level, diff.modification_level)
+        docmdp = sig.docmdp_level
+        allowed = allowed and not (level == ModificationLevel.OTHER
+                                   or (docmdp is not None and level.value > docmdp.value))
+        if not allowed:
+            print("Niedozwolone zmiany w dokumencie po podpisie " + sig.field_name)
+        reviews.append((permissions, allowed))
+        return allowed
+
+    @staticmethod
+    def _verdict(signatures):
+        """!\return (int) the result code of `verify()` for the given signatures' verdicts"""
+
+        if not signatures:
+            return -1
+        return 1 if all(sig.valid for sig in signatures) else 0
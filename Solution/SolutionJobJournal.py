@@ -0,0 +1,123 @@
+"""!@package SolutionJobJournal
+A write-ahead journal of batch signing and verification runs, kept in an SQLite database.
+
+Every file of a run has one row, keyed by the job kind (`sign` or `verify`) and the file's path, holding its current
+state and, once written, the path and SHA256 fingerprint of its output. Each state change is also appended to a log of
+transitions. A state is committed before the step it describes has any effect that could not be redone, so after a
+crash a restarted run looks up every file with a single primary key query, skips the finished ones and picks the
+half-done ones up from their last recorded state. The journal can be shared by many threads, which take turns using the
+connection.
+
+Signing states: `started` (the signature is being made, the original is untouched), `written` (the signed pdf has been
+saved, the original not yet removed), `done`, `failed`. Verification states: `done` (with the result code), `failed`.
+A verification job also records the size and modification time the file had when it was verified, so a file changed
+since (for example a pdf which grew by an incremental update) is verified again.
+"""
+
+import sqlite3
+import threading
+import time
+from collections import namedtuple
+
+
+JobState = namedtuple('JobState', ['state', 'output_path', 'output_sha256', 'result', 'error', 'size', 'mtime_ns'])
+
+
+class SolutionJobJournal():
+    """!The journal class. It realizes all the functionalities of this package."""
+
+    Constants = namedtuple('Constants', ['STARTED', 'WRITTEN', 'DONE', 'FAILED'])
+    CONSTANTS = Constants(STARTED='started', WRITTEN='written', DONE='done', FAILED='failed')
+
+    def __init__(self, path):
+        """!Constructor. It opens the journal, creating it if needed.
+
+        \param path (str): path to the journal's database
+        """
+
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute("PRAGMA synchronous=FULL")
+        with self._connection:
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS jobs (kind TEXT NOT NULL, path TEXT NOT NULL, state TEXT NOT NULL, "
+                "output_path TEXT, output_sha256 TEXT, result INTEGER, error TEXT, updated REAL NOT NULL, "
+                "PRIMARY KEY (kind, path))")
+            self._connection.execute(
+                "CREATE TABLE IF NOT EXISTS transitions (kind TEXT NOT NULL, path TEXT NOT NULL, state TEXT NOT NULL, "
+                "at REAL NOT NULL)")
+            columns = [row[1] for row in self._connection.execute("PRAGMA table_info(jobs)")]
+            for column in ('size', 'mtime_ns'):
+                if column not in columns:
+                    self._connection.execute("ALTER TABLE jobs ADD COLUMN " + column + " INTEGER")
+
+    def state(self, kind, path):
+        """!It looks a file's job up.
+
+        \param kind (str): the job kind
+        \param path (str): path to the file
+
+        \return (JobState) the job's state, or None if the file has not been seen
+        """
+
+        with self._lock:
+            row = self._connection.execute(
+                "SELECT state, output_path, output_sha256, result, error, size, mtime_ns FROM jobs "
+                "WHERE kind = ? AND path = ?",
+                (kind, path)).fetchone()
+        return JobState(*row) if row is not None else None
+
+    def transition(self, kind, path, state, output_path=None, output_sha256=None, result=None, error=None, size=None,
+                   mtime_ns=None):
+        """!It records a new state of a file's job, durably, before returning.
+
+        \param kind (str): the job kind
+        \param path (str): path to the file
+        \param state (str): the new state
+        \param output_path (str): path to the job's output, if any
+        \param output_sha256 (str): the SHA256 fingerprint of the job's output, if any
+        \param result (int): the job's result code, if any
+        \param error (str): the reason of a failure, if any
+        \param size (int): the file's size when the job was done, if it is recorded
+        \param mtime_ns (int): the file's modification time when the job was done, if it is recorded
+        """
+
+        now = time.time()
+        with self._lock, self._connection:
+            self._connection.execute(
+                "INSERT OR REPLACE INTO jobs (kind, path, state, output_path, output_sha256, result, error, updated, "
+                "size, mtime_ns) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (kind, path, state, output_path, output_sha256, result, error, now, size, mtime_ns))
+            self._connection.execute("INSERT INTO transitions (kind, path, state, at) VALUES (?, ?, ?, ?)",
+                                     (kind, path, state, now))
+
+    def paths(self, kind, state):
+        """!\return (List[str]) paths to the files of the given job kind in the given state"""
+
+        with self._lock:
+            return [row[0] for row in self._connection.execute("SELECT path FROM jobs WHERE kind = ? AND state = ?",
+                                                               (kind, state))]
+
+    def summary(self, kind):
+        """!\return (Dict[str, int]) the number of files of the given job kind in every state"""
+
+        with self._lock:
+            return dict(self._connection.execute("SELECT state, COUNT(*) FROM jobs WHERE kind = ? GROUP BY state",
+                                                 (kind,)).fetchall())
+
+    def reset(self, kind):
+        """!It forgets all the jobs of the given kind, so the next run starts from scratch.
+
+        \param kind (str): the job kind
+        """
+
+        with self._lock, self._connection:
+            self._connection.execute("DELETE FROM jobs WHERE kind = ?", (kind,))
+            self._connection.execute("DELETE FROM transitions WHERE kind = ?", (kind,))
+
+    def close(self):
+        """!Closes the journal's database."""
+
+        with self._lock:
+            self._connection.close()
@@ -0,0 +1,224 @@
+"""!@package SolutionKeyStore
+A keystore holding many wrapped keys and their certificates, so a single signing host can serve many identities.
+
+The keystore is a directory of bundles, laid out the way [AuxiliaryBulkProvisioner](#AuxiliaryBulkProvisioner) writes
+them: one subdirectory per identity, with the encrypted private key and its certificate. An index of all the bundles,
+by key ID (the SHA256 fingerprint of the public key) and by certificate fingerprint, is kept in the keystore's
+directory, so opening the keystore does not parse any of the bundles. A key is read and unlocked only when a job
+needs it, and the most recently used unlocked keys are kept in memory. An unlocked key is kept along with a verifier of
+its PIN (a keyed hash of the passphrase, under a random key living only in memory), and every unlock checks the PIN
+against it before the kept key is handed out.
+
+The keystore is used by [SolutionBatch](#SolutionBatch) and [SolutionGUI](#SolutionGUI) when they are given a
+keystore's directory and a key ID, instead of the pendrive's key.
+"""
+
+import hashlib
+import hmac
+import json
+import os
+import threading
+from collections import namedtuple, OrderedDict
+
+from Crypto.PublicKey import RSA
+from Crypto.Random import get_random_bytes
+from pyhanko.keys import load_cert_from_pemder
+
+from FileIO import FileIO
+from PinDerivation import PinDerivation
+from SolutionSharedSigner import SolutionSharedSigner
+
+
+KeyStoreEntry = namedtuple('KeyStoreEntry', ['key_id', 'cert_sha256', 'subject', 'key_path', 'cert_path'])
+## An unlocked key kept in memory: its CMS signer, and the verifier of the PIN it was unlocked with.
+UnlockedKey = namedtuple('UnlockedKey', ['cms_signer', 'verifier'])
+
+
+class SolutionKeyStore():
+    """!The keystore class. It realizes all the functionalities of this package."""
+
+    def __init__(self, root_dir, max_unlocked=16):
+        """!Constructor. It sets the constants used and loads the index (building it if it is missing or stale).
+
+        \param root_dir (str): the keystore's directory
+        \param max_unlocked (int): how many unlocked keys are kept in memory at most
+        """
+
+        Constants = namedtuple('Constants', ['KEY_FILE_NAME', 'CERT_FILE_NAME', 'INDEX_NAME'])
+        self._constants = Constants(KEY_FILE_NAME="ProjectBSKPrivateKey.pem", CERT_FILE_NAME="certyfikat.pem",
+                                    INDEX_NAME="index.json")
+
+        self._root_dir = root_dir
+        self._max_unlocked = max_unlocked
+        self._by_key_id = {}
+        self._by_cert_sha256 = {}
+        self._unlocked = OrderedDict()
+        self._lock = threading.Lock()
+        self._index_lock = threading.Lock()
+        self._verifier_key = get_random_bytes(32)
+
+        self.load_index()
+
+    @property
+    def index_path(self):
+        """!\return (str) path to the keystore's index"""
+
+        return os.path.join(self._root_dir, self._constants.INDEX_NAME)
+
+    def __len__(self):
+        """!\return (int) the number of keys in the keystore"""
+
+        return len(self._by_key_id)
+
+    def entries(self):
+        """!\return (List[KeyStoreEntry]) all the keys in the keystore"""
+
+        return list(self._by_key_id.values())
+
+    def _set_entries(self, entries):
+        """!It replaces the in-memory index with the given entries.
+
+        \param entries (Iterable[KeyStoreEntry]): the entries
+        """
+
+        self._by_key_id = {entry.key_id: entry for entry in entries}
+        self._by_cert_sha256 = {entry.cert_sha256: entry for entry in entries}
+
+    def is_index_stale(self):
+        """!The index is stale if a bundle has been added, removed or changed since it was written, which shows in the
+        modification times of the keystore's directories.
+
+        \return (bool) whether the index has to be rebuilt
+        """
+
+        try:
+            index_mtime = os.stat(self.index_path).st_mtime
+        except FileNotFoundError:
+            return True
+        if os.stat(self._root_dir).st_mtime > index_mtime:
+            return True
+        with os.scandir(self._root_dir) as it:
+            return any(entry.is_dir() and entry.stat().st_mtime > index_mtime for entry in it)
+
+    def load_index(self):
+        """!It loads the index from the keystore's directory, rebuilding it first if needed."""
+
+        if self.is_index_stale():
+            self.rebuild_index()
+            return
+        with self._index_lock, open(self.index_path, "r", encoding='utf-8') as file:
+            self._set_entries([KeyStoreEntry(**entry) for entry in json.load(file)['entries']])
+
+    def rebuild_index(self):
+        """!It scans all the bundles, fingerprints their certificates and public keys, and saves the index. Only one
+        thread rebuilds the index at a time.
+        """
+
+        with self._index_lock:
+            entries = []
+            with os.scandir(self._root_dir) as it:
+                for bundle in sorted(it, key=lambda entry: entry.name):
+                    key_path = os.path.join(bundle.path, self._constants.KEY_FILE_NAME)
+                    cert_path = os.path.join(bundle.path, self._constants.CERT_FILE_NAME)
+                    if not bundle.is_dir() or not os.path.isfile(key_path) or not os.path.isfile(cert_path):
+                        continue
+                    cert = load_cert_from_pemder(cert_path)
+                    entries.append(KeyStoreEntry(key_id=hashlib.sha256(cert.public_key.dump()).hexdigest(),
+                                                 cert_sha256=cert.sha256.hex(), subject=cert.subject.human_friendly,
+                                                 key_path=key_path, cert_path=cert_path))
+
+            self._set_entries(entries)
+            FileIO.atomic_write(self.index_path, json.dumps({'entries': [entry._asdict() for entry in entries]},
+                                                            indent=2, ensure_ascii=False).encode('utf-8'))
+
+    def find(self, key_id=None, cert_sha256=None):
+        """!It finds a key by its key ID or by its certificate's fingerprint. A miss triggers a single index refresh,
+        in case the key has been added after the keystore was opened.
+
+        \param key_id (str): the SHA256 fingerprint of the public key, as a hex string
+        \param cert_sha256 (str): the SHA256 fingerprint of the certificate, as a hex string
+
+        \return (KeyStoreEntry) the key's entry, or None if there is no such key
+        """
+
+        for refreshed in (False, True):
+            if refreshed:
+                if not self.is_index_stale():
+                    return None
+                self.rebuild_index()
+            entry = self._by_key_id.get(key_id) if key_id is not None else self._by_cert_sha256.get(cert_sha256)
+            if entry is not None:
+                return entry
+        return None
+
+    def _verifier(self, passphrase):
+        """!\return (bytes) the verifier of a passphrase derived from a PIN, see `unlock()`"""
+
+        return hmac.new(self._verifier_key, passphrase, hashlib.sha256).digest()
+
+    def _unlocked_signer(self, key_id, verifier):
+        """!It returns a key that has already been unlocked, if it was unlocked with the same PIN.
+
+        \param key_id (str): the key's ID
+        \param verifier (bytes): the verifier of the PIN given now
+
+        \return (WarmSigner) the CMS signer, or None if the key is not unlocked or the PIN does not match
+        """
+
+        with self._lock:
+            unlocked = self._unlocked.get(key_id)
+            if unlocked is None or not hmac.compare_digest(unlocked.verifier, verifier):
+                return None
+            self._unlocked.move_to_end(key_id)
+            return unlocked.cms_signer
+
+    def unlock(self, key_id, pin, timestamper=None, profile='basic', trust_store=None, compact=False):
+        """!It checks the PIN, and reads and unlocks the key, unless it is already unlocked with the same PIN. When
+        there are too many unlocked keys, the least recently used one is dropped. A PIN which does not match the kept
+        key's is checked against the key's file, as the key may have been re-wrapped with another PIN.
+
+        \param key_id (str): the key's ID
+        \param pin (str): the key's PIN
+        \param timestamper (TimeStamper): see [SolutionSharedSigner](#SolutionSharedSigner)
+        \param profile (str): see [SolutionSharedSigner](#SolutionSharedSigner)
+        \param trust_store (SolutionTrustStore): see [SolutionSharedSigner](#SolutionSharedSigner)
+        \param compact (bool): see [SolutionSharedSigner](#SolutionSharedSigner)
+
+        \return (SolutionSharedSigner) the signer, or None if the PIN was wrong
+
+        \exception KeyError if there is no such key
+        """
+
+        entry = self.find(key_id=key_id)
+        if entry is None:
+            raise KeyError(key_id)
+        passphrase = PinDerivation.passphrase_for(entry.key_path, pin)
+        verifier = self._verifier(passphrase)
+
+        cms_signer = self._unlocked_signer(key_id, verifier)
+        if cms_signer is None:
+            with open(entry.key_path, "rb") as file:
+                encrypted_key = file.read()
+            try:
+                signing_key = RSA.import_key(encrypted_key, passphrase)
+            except ValueError:
+                return None
+            cms_signer = SolutionSharedSigner.build_cms_signer(signing_key, load_cert_from_pemder(entry.cert_path))
+            with self._lock:
+                self._unlocked[key_id] = UnlockedKey(cms_signer, verifier)
+                self._unlocked.move_to_end(key_id)
+                while len(self._unlocked) > self._max_unlocked:
+                    self._unlocked.popitem(last=False)
+        return SolutionSharedSigner(cms_signer, timestamper, profile, trust_store, compact)
+
+    def lock(self, key_id=None):
+        """!It drops an unlocked key from memory, or all of them.
+
+        \param key_id (str): the key's ID, None for all keys
+        """
+
+        with self._lock:
+            if key_id is None:
+                self._unlocked.clear()
+            else:
+                self._unlocked.pop(key_id, None)
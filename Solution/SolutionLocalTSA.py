@@ -0,0 +1,237 @@
+"""!@package SolutionLocalTSA
+A local stand-in RFC 3161 timestamping authority, for tests and benchmarks of timestamped signing without an external
+TSA. The tokens are issued by `LocalTimeStamper`, and served over HTTP/1.1 with keep-alive, like a real TSA.
+
+The TSA's key and certificate are loaded from files, or generated on start (a self-signed certificate with the critical
+`timeStamping` extended key usage). For timestamps to be validated, the certificate has to be in the verifier's trust
+store.
+
+Usage: `python SolutionLocalTSA.py [--port 8318] [--key <path> --cert <path>] [--cert-out <path>]`
+"""
+
+import argparse
+import datetime
+import secrets
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from asn1crypto import algos, cms, core, keys, tsp, x509
+from cryptography import x509 as cx509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import rsa
+from cryptography.hazmat.primitives.asymmetric.padding import PKCS1v15
+from cryptography.x509.oid import ExtendedKeyUsageOID, NameOID
+from pyhanko.keys import load_cert_from_pemder, load_private_key_from_pemder
+from pyhanko.sign.general import as_signing_certificate, simple_cms_attribute
+from pyhanko.sign.timestamps import TimeStamper
+
+
+class LocalTimeStamper(TimeStamper):
+    """!A timestamper acting as its own TSA, issuing the same tokens as pyhanko's `DummyTimeStamper`. It is built on
+    pyhanko's public `TimeStamper` interface only, so it does not depend on the internals of `DummyTimeStamper`, and it
+    parses the TSA's key once instead of for every token, so the stand-in TSA answers about as fast as a real one.
+    """
+
+    ## The policy of the tokens, the one `DummyTimeStamper` uses too.
+    POLICY = '1.3.6.1.4.1.4146.2.2'
+
+    def __init__(self, tsa_cert, tsa_key):
+        """!Constructor.
+
+        \param tsa_cert (x509.Certificate): the TSA's certificate
+        \param tsa_key (keys.PrivateKeyInfo): the TSA's RSA key
+        """
+
+        super().__init__()
+        self.tsa_cert = tsa_cert
+        self._pyca_key = serialization.load_der_private_key(tsa_key.dump(), password=None)
+
+    def request_tsa_response(self, req):
+        """!It issues a token for a timestamp request.
+
+        \param req (tsp.TimeStampReq): the request
+
+        \return (tsp.TimeStampResp) the response, with the token
+        """
+
+        message_imprint = req['message_imprint']
+        md_algorithm = message_imprint['hash_algorithm']['algorithm'].native
+        md = getattr(hashes, md_algorithm.upper())
+        now = datetime.datetime.now(datetime.timezone.utc)
+
+        tst_info = {'version': 'v1', 'policy': self.POLICY, 'message_imprint': message_imprint,
+                    'serial_number': secrets.randbits(64), 'gen_time': now,
+                    'tsa': x509.GeneralName(name='directory_name', value=self.tsa_cert.subject)}
+        if req['nonce'].native is not None:
+            tst_info['nonce'] = req['nonce']
+        tst_info_data = tsp.TSTInfo(tst_info).dump()
+
+        digest = hashes.Hash(md())
+        digest.update(tst_info_data)
+        signed_attrs = cms.CMSAttributes([
+            simple_cms_attribute('content_type', 'tst_info'),
+            simple_cms_attribute('signing_time', cms.Time({'utc_time': core.UTCTime(now)})),
+            simple_cms_attribute('signing_certificate', as_signing_certificate(self.tsa_cert)),
+            simple_cms_attribute('message_digest', digest.finalize())
+        ])
+        digest_algorithm = algos.DigestAlgorithm({'algorithm': md_algorithm})
+        signer_info = cms.SignerInfo({
+            'version': 'v1',
+            'sid': cms.SignerIdentifier({'issuer_and_serial_number': cms.IssuerAndSerialNumber(
+                {'issuer': self.tsa_cert.issuer, 'serial_number': self.tsa_cert.serial_number})}),
+            'digest_algorithm': digest_algorithm,
+            'signature_algorithm': algos.SignedDigestAlgorithm({'algorithm': 'rsassa_pkcs1v15'}),
+            'signed_attrs': signed_attrs,
+            'signature': self._pyca_key.sign(signed_attrs.dump(), PKCS1v15(), md())
+        })
+        signed_data = cms.SignedData({
+            'version': 'v3',
+            'digest_algorithms': [digest_algorithm],
+            'encap_content_info': {'content_type': 'tst_info', 'content': cms.ParsableOctetString(tst_info_data)},
+            'certificates': [self.tsa_cert],
+            'signer_infos': [signer_info]
+        })
+        return tsp.TimeStampResp({'status': {'status': 'granted'},
+                                  'time_stamp_token': {'content_type': 'signed_data', 'content': signed_data}})
+
+    async def async_request_tsa_response(self, req):
+        """!The asynchronous variant of `request_tsa_response()`, called by pyhanko."""
+
+        return self.request_tsa_response(req)
+
+
+class SolutionLocalTSA():
+    """!The local TSA class. It realizes all the functionalities of this package."""
+
+    def __init__(self, port=8318, host='127.0.0.1', key_path=None, cert_path=None):
+        """!Constructor. It loads or generates the TSA's key and certificate.
+
+        \param port (int): the port to listen on, 0 for any free port
+        \param host (str): the address to listen on, the loopback interface by default
+        \param key_path (str): path to the TSA's unencrypted private key, generated if not given
+        \param cert_path (str): path to the TSA's certificate, generated if not given
+        """
+
+        if key_path is not None and cert_path is not None:
+            tsa_key, tsa_cert = load_private_key_from_pemder(key_path, None), load_cert_from_pemder(cert_path)
+        else:
+            tsa_key, tsa_cert = self.generate_identity()
+        self._tsa_cert = tsa_cert
+        self._timestamper = LocalTimeStamper(tsa_cert, tsa_key)
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._thread = None
+
+    @staticmethod
+    def generate_identity(common_name="ProjectBSK Local TSA"):
+        """!It generates a TSA key and a self-signed certificate valid for timestamping.
+
+        \param common_name (str): the TSA's name
+
+        \return (Tuple[keys.PrivateKeyInfo, x509.Certificate]) the key and the certificate
+        """
+
+        key = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+        name = cx509.Name([cx509.NameAttribute(NameOID.COMMON_NAME, common_name)])
+        now = datetime.datetime.now(datetime.timezone.utc)
+        cert = (cx509.CertificateBuilder()
+                .subject_name(name).issuer_name(name).public_key(key.public_key())
+                .serial_number(cx509.random_serial_number())
+                .not_valid_before(now - datetime.timedelta(minutes=5))
+                .not_valid_after(now + datetime.timedelta(days=365))
+                .add_extension(cx509.BasicConstraints(ca=False, path_length=None), critical=True)
+                .add_extension(cx509.KeyUsage(digital_signature=True, content_commitment=True, key_encipherment=False,
+                                              data_encipherment=False, key_agreement=False, key_cert_sign=False,
+                                              crl_sign=False, encipher_only=False, decipher_only=False), critical=True)
+                .add_extension(cx509.ExtendedKeyUsage([ExtendedKeyUsageOID.TIME_STAMPING]), critical=True)
+                .add_extension(cx509.SubjectKeyIdentifier.from_public_key(key.public_key()), critical=False)
+                .sign(key, hashes.SHA256()))
+        key_der = key.private_bytes(serialization.Encoding.DER, serialization.PrivateFormat.PKCS8,
+                                    serialization.NoEncryption())
+        return keys.PrivateKeyInfo.load(key_der), x509.Certificate.load(cert.public_bytes(serialization.Encoding.DER))
+
+    @property
+    def url(self):
+        """!\return (str) the TSA's URL"""
+
+        host, port = self._server.server_address[:2]
+        return "http://%s:%d/" % (host, port)
+
+    @property
+    def cert_pem(self):
+        """!\return (bytes) the TSA's certificate in .pem format"""
+
+        return cx509.load_der_x509_certificate(self._tsa_cert.dump()).public_bytes(serialization.Encoding.PEM)
+
+    def respond(self, body):
+        """!It answers a DER-encoded timestamp request.
+
+        \param body (bytes): the request
+
+        \return (bytes) the DER-encoded response
+        """
+
+        request = tsp.TimeStampReq.load(body)
+        with self._lock:
+            return self._timestamper.request_tsa_response(request).dump()
+
+    def _handler(self):
+        """!\return (type) the HTTP request handler class, bound to this TSA"""
+
+        tsa = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                try:
+                    reply, status = tsa.respond(body), 200
+                except ValueError:
+                    reply, status = b'', 400
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/timestamp-reply')
+                self.send_header('Content-Length', str(len(reply)))
+                self.end_headers()
+                self.wfile.write(reply)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def serve_forever(self):
+        """!It serves requests on the calling thread, until `stop()` is called."""
+
+        self._server.serve_forever()
+
+    def start(self):
+        """!It starts serving requests on a daemon thread."""
+
+        self._thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """!It stops serving requests and closes the socket."""
+
+        self._server.shutdown()
+        self._server.server_close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="A local stand-in timestamping authority")
+    parser.add_argument('--port', type=int, default=8318)
+    parser.add_argument('--key', default=None)
+    parser.add_argument('--cert', default=None)
+    parser.add_argument('--cert-out', default=None)
+    args = parser.parse_args()
+
+    local_tsa = SolutionLocalTSA(args.port, key_path=args.key, cert_path=args.cert)
+    if args.cert_out is not None:
+        with open(args.cert_out, "wb") as file:
+            file.write(local_tsa.cert_pem)
+    print("Serwer znaczników czasu nasłuchuje pod adresem " + local_tsa.url)
+    try:
+        local_tsa.serve_forever()
+    except KeyboardInterrupt:
+        local_tsa.stop()
@@ -0,0 +1,168 @@
+"""!@package SolutionMerkleBatch
+Batch signing with a single private key operation for the whole batch: a Merkle tree is built over the SHA256
+fingerprints of the documents, and only its root is signed, so signing a batch takes time in proportion to hashing it.
+
+The tree follows RFC 6962's domain separation: a leaf is `SHA256(0x00 || fingerprint)` and an inner node is
+`SHA256(0x01 || left || right)`, so a leaf can never pass for an inner node. The nodes are paired level by level, and
+the last node of a level with an odd number of them moves up unchanged. The root is signed with a detached CMS
+signature (see `SolutionSharedSigner.sign_data()`) of a small canonical JSON manifest holding the root and the number of
+documents.
+
+Every document gets a sidecar, next to it, with `.merkle.json` appended to its name, holding its fingerprint, its
+inclusion proof (the sibling of every node on the way from its leaf to the root, with its side), the root and the
+root's signature, so each document can be verified on its own (see [SolutionMerkleVerifier](#SolutionMerkleVerifier)).
+The documents themselves are not modified.
+"""
+
+import base64
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from FileIO import FileIO
+from SolutionMetrics import SolutionMetrics
+from SolutionSharedSigner import SolutionSharedSigner
+
+
+class SolutionMerkleBatch():
+    """!The Merkle batch signer class. It realizes all the functionalities of this package."""
+
+    VERSION = 1
+    SIDECAR_SUFFIX = ".merkle.json"
+
+    def __init__(self, signer, workers=1):
+        """!Constructor.
+
+        \param signer (SolutionSharedSigner): the shared signer, with the key unlocked
+        \param workers (int): how many documents are hashed at once
+        """
+
+        self._signer = signer
+        self._workers = max(1, workers)
+
+    @staticmethod
+    def stream_sha256(file):
+        """!\return (bytes) the SHA256 fingerprint of a stream, read in chunks"""
+
+        digest = hashlib.sha256()
+        for chunk in iter(lambda: file.read(SolutionSharedSigner.CHUNK_SIZE), b''):
+            digest.update(chunk)
+        return digest.digest()
+
+    @classmethod
+    def file_sha256(cls, path):
+        """!\return (bytes) the SHA256 fingerprint of a file, read in chunks"""
+
+        with open(path, "rb") as file:
+            return cls.stream_sha256(file)
+
+    @staticmethod
+    def leaf(fingerprint):
+        """!\return (bytes) the tree's leaf of a document's fingerprint"""
+
+        return hashlib.sha256(b'\x00' + fingerprint).digest()
+
+    @staticmethod
+    def node(left, right):
+        """!\return (bytes) the tree's inner node over two nodes"""
+
+        return hashlib.sha256(b'\x01' + left + right).digest()
+
+    @classmethod
+    def build(cls, leaves):
+        """!It builds a Merkle tree over the leaves.
+
+        \param leaves (List[bytes]): the leaves, at least one
+
+        \return (Tuple[bytes, List[List[Tuple[str, bytes]]]]) the root, and the inclusion proof of every leaf: the
+        siblings on the way from the leaf to the root, each with its side (`left` or `right`)
+        """
+
+        proofs = [[] for _ in leaves]
+        level = list(leaves)
+        members = [[index] for index in range(len(leaves))]
+        while len(level) > 1:
+            next_level, next_members = [], []
+            for i in range(0, len(level) - 1, 2):
+                for index in members[i]:
+                    proofs[index].append(('right', level[i + 1]))
+                for index in members[i + 1]:
+                    proofs[index].append(('left', level[i]))
+                next_level.append(cls.node(level[i], level[i + 1]))
+                next_members.append(members[i] + members[i + 1])
+            if len(level) % 2 == 1:
+                next_level.append(level[-1])
+                next_members.append(members[-1])
+            level, members = next_level, next_members
+        return level[0], proofs
+
+    @classmethod
+    def root_from_proof(cls, fingerprint, proof):
+        """!It computes the root a document's inclusion proof leads to.
+
+        \param fingerprint (bytes): the document's SHA256 fingerprint
+        \param proof (List[Tuple[str, bytes]]): the inclusion proof, see `build()`
+
+        \return (bytes) the root
+        """
+
+        node = cls.leaf(fingerprint)
+        for side, sibling in proof:
+            if side == 'left':
+                node = cls.node(sibling, node)
+            elif side == 'right':
+                node = cls.node(node, sibling)
+            else:
+                raise ValueError("Nieznana strona węzła w dowodzie: " + str(side))
+        return node
+
+    @staticmethod
+    def manifest(root, size):
+        """!\return (bytes) the canonical manifest of a batch, the data the root's signature is made over"""
+
+        return json.dumps({'algorithm': 'sha256', 'root': root.hex(), 'size': size},
+                          sort_keys=True, separators=(',', ':')).encode('ascii')
+
+    @classmethod
+    def sidecar_path(cls, path):
+        """!\return (str) path to a document's sidecar"""
+
+        return path + cls.SIDECAR_SUFFIX
+
+    def sign(self, paths):
+        """!It signs a batch of documents with a single signature of the root of their Merkle tree, and writes every
+        document's sidecar atomically.
+
+        \param paths (List[str]): paths to the documents
+
+        \return (List[str]) paths to the sidecars, in the documents' order
+        """
+
+        if not paths:
+            raise ValueError("Brak dokumentów do podpisania")
+        metrics = SolutionMetrics.instance()
+        with ThreadPoolExecutor(max_workers=self._workers) as executor:
+            fingerprints = list(executor.map(self.file_sha256, paths))
+        root, proofs = self.build([self.leaf(fingerprint) for fingerprint in fingerprints])
+        with metrics.timer('bsk_sign_seconds'):
+            signature = base64.b64encode(self._signer.sign_data(self.manifest(root, len(paths)))).decode('ascii')
+        metrics.inc('bsk_merkle_roots_signed_total')
+
+        sidecar_paths = []
+        for index, (path, fingerprint, proof) in enumerate(zip(paths, fingerprints, proofs)):
+            sidecar = {
+                'version': self.VERSION,
+                'algorithm': 'sha256',
+                'document_sha256': fingerprint.hex(),
+                'index': index,
+                'size': len(paths),
+                'proof': [[side, sibling.hex()] for side, sibling in proof],
+                'root': root.hex(),
+                'signature': signature
+            }
+            FileIO.atomic_write(self.sidecar_path(path), json.dumps(sidecar, indent=2).encode('utf-8'))
+            sidecar_paths.append(self.sidecar_path(path))
+            metrics.inc('bsk_documents_signed_total')
+            metrics.inc('bsk_bytes_processed_total', os.path.getsize(path), operation='sign')
+        return sidecar_paths
@@ -0,0 +1,68 @@
+"""!@package SolutionMerkleVerifier
+Verification of the documents signed in batches with Merkle trees, by
+[SolutionMerkleBatch](#SolutionMerkleBatch).
+
+A document is checked against the root its sidecar's inclusion proof leads to, and the root against its signature,
+validated as a detached signature (see [SolutionDetachedVerifier](#SolutionDetachedVerifier)). The verdict on every
+signed root is kept by the verifier, so the rest of a batch is verified by hashing alone.
+"""
+
+import base64
+import hashlib
+import json
+import os
+
+from SolutionDetachedVerifier import SolutionDetachedVerifier
+from SolutionMerkleBatch import SolutionMerkleBatch
+from SolutionMetrics import SolutionMetrics
+
+
+class SolutionMerkleVerifier(SolutionDetachedVerifier):
+    """!The Merkle batch verifier class. It realizes all the functionalities of this package."""
+
+    def __init__(self):
+        """!Constructor."""
+
+        super().__init__()
+        self._roots = {}
+
+    def signature_path(self):
+        """!\return (str) path to the chosen document's sidecar"""
+
+        return SolutionMerkleBatch.sidecar_path(self._file_path + self._file_name)
+
+    def _verify(self):
+        """!It checks the chosen document against the signed root of its batch and prints the details.
+
+        \return (int) the result code of `verify()`: -1 if the document has no sidecar next to it
+        """
+
+        if not os.path.isfile(self.signature_path()):
+            return -1
+        with open(self._file_path + self._file_name, "rb") as file:
+            SolutionMetrics.instance().inc('bsk_bytes_processed_total', os.fstat(file.fileno()).st_size,
+                                           operation='verify')
+            fingerprint = SolutionMerkleBatch.stream_sha256(file)
+        try:
+            with open(self.signature_path(), "r", encoding='utf-8') as file:
+                sidecar = json.load(file)
+            if fingerprint.hex() != sidecar['document_sha256']:
+                print("Dokument został zmieniony po podpisaniu")
+                return 0
+            proof = [(side, bytes.fromhex(sibling)) for side, sibling in sidecar['proof']]
+            root = SolutionMerkleBatch.root_from_proof(fingerprint, proof)
+            if root.hex() != sidecar['root']:
+                print("Dowód przynależności nie prowadzi do podpisanego korzenia")
+                return 0
+            manifest = SolutionMerkleBatch.manifest(root, sidecar['size'])
+            signature = base64.b64decode(sidecar['signature'])
+        except (ValueError, KeyError, TypeError):
+            print("Uszkodzony plik z dowodem przynależności")
+            return 0
+
+        key = hashlib.sha256(manifest + signature).digest()
+        if key not in self._roots:
+            self._roots[key] = self._validate_detached(manifest, signature)
+        else:
+            print("Korzeń partii został już zweryfikowany")
+        return 1 if self._roots[key] else 0
@@ -0,0 +1,216 @@
+"""!@package SolutionMetrics
+Counters, gauges and latency histograms of the signing and verification pipelines, exposed in the Prometheus text
+format, either over HTTP on a local port or as a textfile (for the node exporter's textfile collector).
+
+Recording a value takes a dictionary lookup and a short critical section, so the instrumented code paths do not slow
+down noticeably. The metrics are kept in a single process-wide registry, returned by `SolutionMetrics.instance()`.
+
+Exported metrics:
++ bsk_documents_signed_total, bsk_documents_verified_total
++ bsk_prepare_results_total{code}, bsk_verify_results_total{code}: result codes of `prepare_file()` and `verify()`
++ bsk_key_unlock_seconds{result}: the scrypt key unlock time
++ bsk_rsa_sign_seconds: the raw RSA signature time
++ bsk_warm_up_seconds: the time of preparing the signing speculatively, before the PIN is known
++ bsk_sign_seconds, bsk_verify_seconds: the time of a whole document signature and verification
++ bsk_self_check_seconds, bsk_self_check_failures_total: the in-memory checks of fresh signatures, and their failures
++ bsk_compact_resigned_total: compact timestamped signatures made again, as the token did not fit the placeholder
++ bsk_merkle_roots_signed_total: the roots signed for batches of documents signed with Merkle trees
++ bsk_bytes_processed_total{operation}: the size of the documents signed and verified
++ bsk_queue_depth{queue}: the number of documents waiting in a queue
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from FileIO import FileIO
+
+
+class SolutionMetrics():
+    """!The metrics registry class. It realizes all the functionalities of this package."""
+
+    ## Default upper bounds of the latency histograms' buckets, in seconds.
+    DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    ## Help texts and types of the known metrics, by name.
+    METRICS = {
+        'bsk_documents_signed_total': ('counter', "Documents signed"),
+        'bsk_documents_verified_total': ('counter', "Documents verified"),
+        'bsk_prepare_results_total': ('counter', "Result codes of preparing a document for signing"),
+        'bsk_verify_results_total': ('counter', "Result codes of verifying a document"),
+        'bsk_key_unlock_seconds': ('histogram', "Time of decrypting the private key (scrypt and AES)"),
+        'bsk_rsa_sign_seconds': ('histogram', "Time of the raw RSA signature"),
+        'bsk_warm_up_seconds': ('histogram', "Time of preparing the signing before the PIN is known"),
+        'bsk_sign_seconds': ('histogram', "Time of signing a whole document"),
+        'bsk_verify_seconds': ('histogram', "Time of verifying a whole document"),
+        'bsk_self_check_seconds': ('histogram', "Time of checking a fresh signature in memory"),
+        'bsk_self_check_failures_total': ('counter', "Fresh signatures that failed the in-memory check"),
+        'bsk_compact_resigned_total': ('counter', "Compact timestamped signatures made again with a margin"),
+        'bsk_merkle_roots_signed_total': ('counter', "Merkle roots signed for batches of documents"),
+        'bsk_bytes_processed_total': ('counter', "Bytes of documents signed and verified"),
+        'bsk_queue_depth': ('gauge', "Documents waiting in a queue")
+    }
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        """!Constructor.
+
+        \param buckets (Tuple[float]): upper bounds of the histograms' buckets, in seconds, sorted
+        """
+
+        self._buckets = tuple(buckets)
+        self._values = {}
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._server = None
+
+    @classmethod
+    def instance(cls):
+        """!\return (SolutionMetrics) the process-wide registry"""
+
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+        return cls._instance
+
+    @staticmethod
+    def _key(name, labels):
+        """!\return (Tuple) the registry key of a metric with the given labels"""
+
+        return (name, tuple(sorted(labels.items()))) if labels else (name, ())
+
+    def inc(self, name, amount=1, **labels):
+        """!It increments a counter.
+
+        \param name (str): the metric's name
+        \param amount (float): the increment
+        \param labels: the metric's labels
+        """
+
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def set(self, name, value, **labels):
+        """!It sets a gauge.
+
+        \param name (str): the metric's name
+        \param value (float): the new value
+        \param labels: the metric's labels
+        """
+
+        key = self._key(name, labels)
+        with self._lock:
+            self._values[key] = value
+
+    def observe(self, name, value, **labels):
+        """!It records a value in a histogram.
+
+        \param name (str): the metric's name
+        \param value (float): the observed value
+        \param labels: the metric's labels
+        """
+
+        key = self._key(name, labels)
+        index = bisect.bisect_left(self._buckets, value)
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = [[0] * (len(self._buckets) + 1), 0.0]
+            histogram[0][index] += 1
+            histogram[1] += value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        """!A context manager recording the duration of its block in a histogram.
+
+        \param name (str): the metric's name
+        \param labels: the metric's labels
+        """
+
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    @staticmethod
+    def _format_labels(labels, extra=()):
+        """!\return (str) the labels in the Prometheus text format"""
+
+        pairs = list(labels) + list(extra)
+        if not pairs:
+            return ''
+        return '{' + ','.join('%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+                              for name, value in pairs) + '}'
+
+    def render(self):
+        """!\return (str) all the metrics in the Prometheus text format"""
+
+        with self._lock:
+            values = dict(self._values)
+            histograms = {key: (list(counts), total) for key, (counts, total) in self._histograms.items()}
+
+        lines = []
+        names = sorted({name for name, _ in values} | {name for name, _ in histograms})
+        for name in names:
+            metric_type, help_text = self.METRICS.get(name, ('untyped', name))
+            lines.append('# HELP %s %s' % (name, help_text))
+            lines.append('# TYPE %s %s' % (name, metric_type))
+            for key in sorted(key for key in values if key[0] == name):
+                lines.append('%s%s %s' % (name, self._format_labels(key[1]), repr(float(values[key]))))
+            for key in sorted(key for key in histograms if key[0] == name):
+                counts, total = histograms[key]
+                cumulative = 0
+                for bound, count in zip(self._buckets + (float('inf'),), counts):
+                    cumulative += count
+                    le = '+Inf' if bound == float('inf') else repr(bound)
+                    lines.append('%s_bucket%s %d' % (name, self._format_labels(key[1], [('le', le)]), cumulative))
+                lines.append('%s_sum%s %s' % (name, self._format_labels(key[1]), repr(total)))
+                lines.append('%s_count%s %d' % (name, self._format_labels(key[1]), cumulative))
+        return '\n'.join(lines) + '\n'
+
+    def write_textfile(self, path):
+        """!It atomically writes all the metrics to a file.
+
+        \param path (str): path to the file, conventionally ending with `.prom`
+        """
+
+        FileIO.atomic_write(path, self.render().encode('utf-8'))
+
+    def serve(self, port=9464, host='127.0.0.1'):
+        """!It starts serving the metrics over HTTP, on a daemon thread. Any path returns the metrics.
+
+        \param port (int): the port
+        \param host (str): the address to listen on, the loopback interface by default
+        """
+
+        registry = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = registry.render().encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), Handler)
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+
+    def stop(self):
+        """!It stops serving the metrics over HTTP."""
+
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
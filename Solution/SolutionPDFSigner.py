@@ -1,40 +1,102 @@
 """!@package SolutionPDFSigner
 It provides all the functionalities necessary from the technical perspective to execute the signing proccess.
+
+Everything the signing needs apart from the unlocked key can be prepared speculatively, as soon as the key's pendrive
+is inserted (see `start_warm_up()`), while the user is still typing the PIN. Once the PIN is known, what remains is the
+key's unlocking (its scrypt derivation and decryption) and the signature itself.
+
+A key of a keystore (see [SolutionKeyStore](#SolutionKeyStore)) is unlocked by the keystore, which checks the PIN and
+keeps the most recently used unlocked keys, instead of being read and decrypted by the signer.
 """
 
 import os
+import threading
+import time
 from collections import namedtuple
+from io import BytesIO
 
-from Crypto.Hash import SHA256
 from Crypto.Cipher import AES
 from Crypto.PublicKey import RSA
+from pyhanko.keys import load_cert_from_pemder
+from pyhanko.pdf_utils import generic, writer
 from pyhanko.pdf_utils.reader import PdfFileReader
 
-from pyhanko.sign import signers
-from pyhanko.sign.fields import SigSeedSubFilter, append_signature_field, SigFieldSpec
+from pyhanko.sign.fields import append_signature_field, enumerate_sig_fields, SigFieldSpec
 from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
 
+from PinDerivation import PinDerivation
+from SolutionMetrics import SolutionMetrics
+from SolutionSharedSigner import SolutionSharedSigner
+from SolutionTrustStore import SolutionTrustStore
+
 
 class SolutionPDFSigner():
     """!The signer class. It realizes all the functionalities of this package."""
 
-    def __init__(self):
-        """!Constructor. It sets the used constants and loads the encrypted private key from a file."""
+    def __init__(self, key_path=None, cert_path=None, timestamper=None, profile='basic', trust_store=None,
+                 compact=False, keystore=None, key_id=None):
+        """!Constructor. It sets the used constants and loads the encrypted private key from a file.
+
+        \param key_path (str): path to the encrypted private key, the pendrive's key by default
+        \param cert_path (str): path to the key's certificate, the auxiliary app's certificate by default
+        \param timestamper (TimeStamper): the RFC 3161 timestamping client (e.g.
+        [SolutionTimeStamper](#SolutionTimeStamper)), None for signatures without a trusted time
+        \param profile (str): the signature profile: `basic` (PAdES B-B, or B-T with a timestamper), `ltv` (the
+        certificate chain and revocation data are embedded in the document's DSS, PAdES B-LT) or `lta` (as `ltv`,
+        followed by a document timestamp, PAdES B-LTA; requires a timestamper)
+        \param trust_store (SolutionTrustStore): the store the chain and revocation data are taken from for the `ltv`
+        and `lta` profiles; by default, the signer's certificate and the trust store directory
+        \param compact (bool): whether the signed pdfs are written in the compact output mode (see
+        [SolutionSharedSigner](#SolutionSharedSigner))
+        \param keystore (SolutionKeyStore): the keystore unlocking the key, None to read and decrypt the key file;
+        with a keystore, the key's and certificate's paths are taken from its entry
+        \param key_id (str): the key's ID in the keystore
+
+        \exception KeyError if the keystore has no such key
+        """
 
         Constants = namedtuple('Constants',
-                               ['LENGTH_OF_RSA_KEY', 'KEY_FORMAT', 'CIPHER_MODE', 'PATH_FOR_SIGNED_FILES', 'PATH_TO_PRIVATE_KEY'])
+                               ['LENGTH_OF_RSA_KEY', 'KEY_FORMAT', 'CIPHER_MODE', 'PATH_FOR_SIGNED_FILES', 'PATH_TO_PRIVATE_KEY',
+                                'PATH_TO_CERTIFICATE', 'PATH_TO_TRUST_STORE', 'SIGNING_PROFILES'])
         self._constants = Constants(LENGTH_OF_RSA_KEY=4096, KEY_FORMAT='PEM', CIPHER_MODE=AES.MODE_CBC,
-                                    PATH_FOR_SIGNED_FILES="C:/Studia/BSK/ProjektBSK/Solution/", PATH_TO_PRIVATE_KEY="D:/ProjectBSKPrivateKey.pem")
-
-        self._path_to_ske = self._constants.PATH_TO_PRIVATE_KEY
-        with open(self._path_to_ske, "rb") as file:
-            self._signing_key_encrypted = file.read()
+                                    PATH_FOR_SIGNED_FILES="C:/Studia/BSK/ProjektBSK/Solution/", PATH_TO_PRIVATE_KEY="D:/ProjectBSKPrivateKey.pem",
+                                    PATH_TO_CERTIFICATE="C:/Studia/BSK/ProjektBSK/AuxiliaryApp/certyfikat.pem",
+                                    PATH_TO_TRUST_STORE="C:/Studia/BSK/ProjektBSK/truststore",
+                                    SIGNING_PROFILES=('basic', 'ltv', 'lta'))
+        if profile not in self._constants.SIGNING_PROFILES:
+            raise ValueError("Nieznany profil podpisu: " + profile)
+        if profile == 'lta' and timestamper is None:
+            raise ValueError("Profil lta wymaga serwera znaczników czasu")
+
+        self._keystore = keystore
+        self._key_id = key_id
+        if keystore is not None:
+            entry = keystore.find(key_id=key_id)
+            if entry is None:
+                raise KeyError(key_id)
+            key_path, cert_path = entry.key_path, entry.cert_path
+        self._path_to_ske = key_path or self._constants.PATH_TO_PRIVATE_KEY
+        self._path_to_cert = cert_path or self._constants.PATH_TO_CERTIFICATE
+        self._timestamper = timestamper
+        self._profile = profile
+        self._trust_store = trust_store
+        self._compact = compact
+        self._signing_key_encrypted = None
+        if keystore is None:
+            with open(self._path_to_ske, "rb") as file:
+                self._signing_key_encrypted = file.read()
+        self._pin = None
         self._signing_key = None
+        self._key_metadata = None
+        self._cert = None
+        self._warm = False
+        self._warm_up_lock = threading.Lock()
         self._file_to_sign_path = None
         self._file_to_sign = None
         self._hashed_pin = None
         self._hashed_file = None
         self._signature = None
+        self._shared_signer = None
 
     def set_file(self, path, file):
         """!A setter for all pdf-related information.
@@ -46,76 +108,168 @@ class SolutionPDFSigner():
         self._file_to_sign_path = path
         self._file_to_sign = file
 
+    def start_warm_up(self):
+        """!It starts `warm_up()` on a daemon thread."""
+
+        threading.Thread(target=self.warm_up, daemon=True).start()
+
+    def warm_up(self):
+        """!\brief Speculative preparation of the signing.
+
+        It does everything the signing needs that does not depend on the PIN: reads the key's KDF metadata, loads the
+         certificate (and the trust store of the `ltv` and `lta` profiles), and rehearses adding a signature field to
+         a blank pdf in memory, so the modules pyhanko loads lazily are imported. It is done once; a call made while
+         it is running on another thread waits for it to finish.
+        """
+
+        with self._warm_up_lock:
+            if self._warm:
+                return
+            start = time.perf_counter()
+            self._key_metadata = PinDerivation.read_metadata(self._path_to_ske)
+            self._cert = load_cert_from_pemder(self._path_to_cert)
+            if self._profile != 'basic' and self._trust_store is None:
+                self._trust_store = SolutionTrustStore(cert_paths=[self._path_to_cert],
+                                                       directories=[self._constants.PATH_TO_TRUST_STORE])
+            blank = writer.PdfFileWriter()
+            blank.insert_page(writer.PageObject(contents=blank.add_object(generic.StreamObject(stream_data=b'')),
+                                                media_box=(0, 0, 595, 842)))
+            document = BytesIO()
+            blank.write(document)
+            w = IncrementalPdfFileWriter(document, strict=False)
+            append_signature_field(w, SigFieldSpec(sig_field_name="Signature", on_page=-1, box=(10, 10, 500, 100)))
+            w.write(BytesIO())
+            self._warm = True
+            SolutionMetrics.instance().observe('bsk_warm_up_seconds', time.perf_counter() - start)
+
     def hash_pin(self, pin):
-        """!It hashes the pin provided.
+        """!It derives the key's passphrase from the pin provided (see [PinDerivation](#PinDerivation)). A key of a
+        keystore is only given the pin, which the keystore derives the passphrase from when it unlocks the key.
 
-        \param pin (int): pin
+        \param pin (str): pin
         """
-        self._hashed_pin = SHA256.new(bytes(pin))
+        self.warm_up()
+        if self._keystore is not None:
+            self._pin = pin
+            return
+        self._hashed_pin = PinDerivation.passphrase_from(self._key_metadata, pin)
 
     def decrypt(self):
-        """!It decrypts the private key the hash of the pin provided.
+        """!It decrypts the private key the hash of the pin provided. A key of a keystore is unlocked by the keystore
+        (see `SolutionKeyStore.unlock()`), which builds the shared signer.
 
         \return (bool) whether the key was decrypted correctly or not (in other words, if the pin was correct)
         """
 
-        try:
-            self._signing_key = RSA.import_key(self._signing_key_encrypted, self._hashed_pin.digest())
-            return True
-        except:
-            return False
+        start = time.perf_counter()
+        if self._keystore is not None:
+            self._shared_signer = self._keystore.unlock(self._key_id, self._pin, self._timestamper, self._profile,
+                                                        self._trust_store, self._compact)
+            result = self._shared_signer is not None
+        else:
+            try:
+                self._signing_key = RSA.import_key(self._signing_key_encrypted, self._hashed_pin)
+                result = True
+            except:
+                result = False
+        SolutionMetrics.instance().observe('bsk_key_unlock_seconds', time.perf_counter() - start,
+                                           result='ok' if result else 'wrong_pin')
+        return result
 
 
     def prepare_file(self):
         """!It conducts all the necessary preparations before signing the chosen pdf: add a signature field to the pdf,
-        sets the signature type to PAdES, and initializes an adequate PAdES signer object.
+        sets the signature type to PAdES, and initializes an adequate PAdES signer object. The signature field is
+        added only if it is not there yet, so a pdf left with an empty field by an interrupted run can be prepared again.
 
         \return   1: the method succeeded
         \return   0: pdf has already been signed
         \return  -1: no writing permissions
         """
 
-        flag = False
+        result = self._prepare_file()
+        SolutionMetrics.instance().inc('bsk_prepare_results_total', code=result)
+        return result
+
+    def _prepare_file(self):
+        """!The body of `prepare_file()`.
+
+        \return (int) the result code of `prepare_file()`
+        """
+
         with open(self._file_to_sign_path + self._file_to_sign, 'rb') as doc:
             rd = PdfFileReader(doc)
             if len(rd.embedded_signatures) > 0:
                 return 0
+            has_field = any(enumerate_sig_fields(rd, with_name="Signature"))
 
         try:
-            with open(self._file_to_sign_path + self._file_to_sign, 'rb+') as doc:
-                w = IncrementalPdfFileWriter(doc, strict=False)
-                append_signature_field(w, SigFieldSpec(sig_field_name="Signature", on_page=-1, box=(10, 10, 500, 100)))
-                w.write_in_place()
+            if not has_field:
+                with open(self._file_to_sign_path + self._file_to_sign, 'rb+') as doc:
+                    w = IncrementalPdfFileWriter(doc, strict=False)
+                    append_signature_field(w, SigFieldSpec(sig_field_name="Signature", on_page=-1, box=(10, 10, 500, 100)))
+                    w.write_in_place()
         except PermissionError:
             return -1
 
-        self._cms_signer = signers.SimpleSigner.load(
-            self._constants.PATH_TO_PRIVATE_KEY, "C:/Studia/BSK/ProjektBSK/AuxiliaryApp/certyfikat.pem",
-            key_passphrase=self._hashed_pin.digest()
-        )
-
-        self._signature_meta = signers.PdfSignatureMetadata(
-            field_name='Signature', md_algorithm='sha256',
-            subfilter=SigSeedSubFilter.PADES,
-            use_pades_lta=False
-        )
+        self.shared_signer()
         return 1
 
-    def sign(self):
-        """!It signs and saves the pdf, using setting set in the `prepare_file()` method."""
+    def shared_signer(self):
+        """!It builds, once, a [SolutionSharedSigner](#SolutionSharedSigner) with the decrypted key and the signer's
+        options, which can sign many documents at once, from many threads.
+
+        \return (SolutionSharedSigner) the shared signer
+        """
+
+        if self._shared_signer is None:
+            self.warm_up()
+            cms_signer = self.build_cms_signer(self._signing_key, self._cert)
+            self._shared_signer = SolutionSharedSigner(cms_signer, self._timestamper, self._profile, self._trust_store,
+                                                       self._compact)
+        return self._shared_signer
+
+    @staticmethod
+    def build_cms_signer(signing_key, cert):
+        """!It builds a CMS signer from an already decrypted private key, so the key does not have to be read and
+        decrypted again.
+
+        \param signing_key (RsaKey): the decrypted private key
+        \param cert (asn1crypto.x509.Certificate): the key's certificate
 
-        with open(self._file_to_sign_path + self._file_to_sign, 'rb') as inf:
-            w = IncrementalPdfFileWriter(inf, strict=False)
-            with open('../pdfs/signed'+self._file_to_sign, 'wb') as outf:
-                signers.sign_pdf(
-                    w, signature_meta=self._signature_meta, signer=self._cms_signer,
-                    output=outf
-                )
+        \return (SimpleSigner) the signer
+        """
+
+        return SolutionSharedSigner.build_cms_signer(signing_key, cert)
 
-        os.remove(self._file_to_sign_path + self._file_to_sign)
+    def output_path(self):
+        """!\return (str) path the signed pdf is saved to"""
 
+        return '../pdfs/signed' + self._file_to_sign
 
+    def sign(self, remove_original=True, self_check=False):
+        """!It signs and saves the pdf, using setting set in the `prepare_file()` method. The signed pdf is written
+        atomically, so it is either complete or absent.
 
+        \param remove_original (bool): whether the unsigned pdf is removed once the signed one is saved
+        \param self_check (bool): whether the fresh signature is checked in memory before the signed pdf is saved (see
+        `SolutionSharedSigner.check_signature()`); a signature failing the check raises ValueError, and nothing is saved
+
+        \return (Tuple[str, str]) path to the signed pdf and its SHA256 fingerprint, as a hex string
+        """
 
+        output_sha256 = self.shared_signer().sign_file(self._file_to_sign_path + self._file_to_sign, self.output_path(),
+                                                       self_check=self_check)
 
+        if remove_original:
+            os.remove(self._file_to_sign_path + self._file_to_sign)
+        return self.output_path(), output_sha256
+
+    def sign_detached(self):
+        """!It signs the chosen file, of any kind, with a detached CMS signature saved next to it (see
+        `SolutionSharedSigner.sign_detached()`). The file is left untouched.
+
+        \return (str) path to the signature
+        """
 
+        return self.shared_signer().sign_detached(self._file_to_sign_path + self._file_to_sign)
@@ -0,0 +1,468 @@
+"""!@package SolutionQueueView
+A queue of pdfs to sign or verify, processed in the background, with the status of every file.
+
+Files are added with a multi-select dialog or dragged onto the window (folders are searched for pdfs). A configurable
+number of worker threads takes files from the queue: signing goes through one
+[SolutionSharedSigner](#SolutionSharedSigner), unlocked with the PIN asked for once per session (the session ends when
+the pendrive is removed), and every worker verifies with its own [SolutionHashComparer](#SolutionHashComparer). The
+queue can be paused (the files being processed are finished) and cancelled (the waiting files are dropped).
+
+The workers never touch the widgets: they post their results to a queue, drained by a timer on the GUI thread, which
+updates the table model with a single change notification per tick. The table only ever renders its visible rows, so
+the window stays responsive with thousands of queued files.
+"""
+
+import collections
+import os
+import queue
+import threading
+import time
+from collections import namedtuple
+
+from PySide6 import QtCore, QtWidgets
+
+from SolutionBatch import SolutionBatch
+from SolutionHashComparer import SolutionHashComparer
+from SolutionPDFSigner import SolutionPDFSigner
+
+
+QueueItem = namedtuple('QueueItem', ['path', 'operation', 'state', 'result', 'seconds', 'size'])
+
+
+class SolutionQueueModel(QtCore.QAbstractTableModel):
+    """!The table model of the queue, one row per file."""
+
+    HEADERS = ("Plik", "Operacja", "Stan", "Wynik", "Czas [ms]")
+    OPERATIONS = {'sign': "podpis", 'verify': "weryfikacja"}
+
+    def __init__(self, parent=None):
+        """!Constructor.
+
+        \param parent (QObject): the model's parent
+        """
+
+        super().__init__(parent)
+        self._items = []
+
+    def rowCount(self, parent=QtCore.QModelIndex()):
+        """!\return (int) the number of queued files"""
+
+        return 0 if parent.isValid() else len(self._items)
+
+    def columnCount(self, parent=QtCore.QModelIndex()):
+        """!\return (int) the number of columns"""
+
+        return 0 if parent.isValid() else len(self.HEADERS)
+
+    def data(self, index, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        """!\return (str) the text of a cell, or the file's full path as its tooltip"""
+
+        if not index.isValid():
+            return None
+        item = self._items[index.row()]
+        if role == QtCore.Qt.ItemDataRole.ToolTipRole:
+            return item.path
+        if role != QtCore.Qt.ItemDataRole.DisplayRole:
+            return None
+        column = index.column()
+        if column == 0:
+            return os.path.basename(item.path)
+        if column == 1:
+            return self.OPERATIONS[item.operation]
+        if column == 2:
+            return item.state
+        if column == 3:
+            return item.result
+        return "" if item.seconds is None else "%.0f" % (item.seconds * 1000)
+
+    def headerData(self, section, orientation, role=QtCore.Qt.ItemDataRole.DisplayRole):
+        """!\return (str) the column's name"""
+
+        if orientation == QtCore.Qt.Orientation.Horizontal and role == QtCore.Qt.ItemDataRole.DisplayRole:
+            return self.HEADERS[section]
+        return None
+
+    def item(self, row):
+        """!\return (QueueItem) the file in the given row"""
+
+        return self._items[row]
+
+    def add(self, paths, operation):
+        """!It appends files to the queue.
+
+        \param paths (List[str]): paths to the pdfs
+        \param operation (str): `sign` or `verify`
+
+        \return (range) the rows of the added files
+        """
+
+        first = len(self._items)
+        if paths:
+            self.beginInsertRows(QtCore.QModelIndex(), first, first + len(paths) - 1)
+            self._items.extend(QueueItem(path, operation, "oczekuje", "", None, None) for path in paths)
+            self.endInsertRows()
+        return range(first, len(self._items))
+
+    def apply(self, updates):
+        """!It changes the state of many files at once, with a single change notification.
+
+        \param updates (Dict[int, Dict[str, Any]]): the changed fields of every changed row
+        """
+
+        if not updates:
+            return
+        for row, changes in updates.items():
+            self._items[row] = self._items[row]._replace(**changes)
+        self.dataChanged.emit(self.index(min(updates), 0), self.index(max(updates), len(self.HEADERS) - 1))
+
+    def clear(self):
+        """!It removes all the files from the queue."""
+
+        self.beginResetModel()
+        self._items = []
+        self.endResetModel()
+
+
+class SolutionQueueView(QtWidgets.QWidget):
+    """!The queue window class. It realizes all the functionalities of this package."""
+
+    def __init__(self, parent=None):
+        """!Constructor. It initializes the window's elements and the update timer.
+
+        \param parent (QWidget): the widget's parent
+        """
+
+        super().__init__(parent)
+
+        Constants = namedtuple('Constants', ['UPDATE_INTERVAL_MS', 'PDF_DIRECTORY', 'OUTPUT_DIRECTORY'])
+        self._constants = Constants(UPDATE_INTERVAL_MS=100, PDF_DIRECTORY="C:/Studia/BSK/ProjektBSK/pdfs",
+                                    OUTPUT_DIRECTORY="../pdfs")
+
+        self._key_path = None
+        self._cert_path = None
+        self._keystore = None
+        self._key_id = None
+        self._shared_signer = None
+        self._pending = collections.deque()
+        self._lock = threading.Lock()
+        self._resume = threading.Event()
+        self._resume.set()
+        self._updates = queue.SimpleQueue()
+        self._workers = []
+        self._done = 0
+        self._bytes = 0
+        # the current run's start, its last completion, and the files and bytes done before it
+        self._run = None
+
+        self._model = SolutionQueueModel(self)
+        self._table = QtWidgets.QTableView(self)
+        self._table.setModel(self._model)
+        self._table.setSelectionBehavior(QtWidgets.QAbstractItemView.SelectionBehavior.SelectRows)
+        self._table.verticalHeader().setSectionResizeMode(QtWidgets.QHeaderView.ResizeMode.Fixed)
+        self._table.horizontalHeader().setSectionResizeMode(0, QtWidgets.QHeaderView.ResizeMode.Stretch)
+
+        self._operation = QtWidgets.QComboBox(self)
+        self._operation.addItem("Podpisz upuszczone pliki", 'sign')
+        self._operation.addItem("Weryfikuj upuszczone pliki", 'verify')
+        self._worker_count = QtWidgets.QSpinBox(self)
+        self._worker_count.setRange(1, 2 * (os.cpu_count() or 1))
+        self._worker_count.setValue(min(4, os.cpu_count() or 1))
+        self._worker_count.setPrefix("Wątki: ")
+        self._button_add_sign = QtWidgets.QPushButton("Dodaj pliki do podpisu")
+        self._button_add_verify = QtWidgets.QPushButton("Dodaj pliki do weryfikacji")
+        self._button_start = QtWidgets.QPushButton("Uruchom")
+        self._button_pause = QtWidgets.QPushButton("Wstrzymaj")
+        self._button_cancel = QtWidgets.QPushButton("Anuluj")
+        self._button_clear = QtWidgets.QPushButton("Wyczyść")
+        self._status = QtWidgets.QLabel("Przeciągnij pliki lub foldery z plikami PDF do okna")
+
+        self._button_add_sign.clicked.connect(lambda: self.choose_files('sign'))
+        self._button_add_verify.clicked.connect(lambda: self.choose_files('verify'))
+        self._button_start.clicked.connect(self.start)
+        self._button_pause.clicked.connect(self.toggle_pause)
+        self._button_cancel.clicked.connect(self.cancel)
+        self._button_clear.clicked.connect(self.clear)
+
+        controls = QtWidgets.QHBoxLayout()
+        for widget in (self._button_add_sign, self._button_add_verify, self._operation, self._worker_count,
+                       self._button_start, self._button_pause, self._button_cancel, self._button_clear):
+            controls.addWidget(widget)
+        layout = QtWidgets.QVBoxLayout(self)
+        layout.addLayout(controls)
+        layout.addWidget(self._table)
+        layout.addWidget(self._status)
+
+        self.setAcceptDrops(True)
+        self.setWindowTitle("Kolejka plików")
+
+        self._timer = QtCore.QTimer(self)
+        self._timer.setInterval(self._constants.UPDATE_INTERVAL_MS)
+        self._timer.timeout.connect(self.apply_updates)
+        self._timer.start()
+
+    def set_key_path(self, key_path, cert_path=None):
+        """!It sets the private key used for signing. When the key changes (or the pendrive is removed), the session's
+        unlocked key is dropped, and the PIN is asked for again.
+
+        \param key_path (str): path to the encrypted private key, None if there is none
+        \param cert_path (str): path to the key's certificate, None for the auxiliary app's certificate
+        """
+
+        if (key_path, cert_path) != (self._key_path, self._cert_path):
+            self._key_path, self._cert_path = key_path, cert_path
+            self._shared_signer = None
+
+    def set_keystore(self, keystore, key_id):
+        """!It sets a key of a keystore as the private key used for signing, instead of the pendrive's key. The key is
+        unlocked with [SolutionKeyStore](#SolutionKeyStore), which checks the PIN every time.
+
+        \param keystore (SolutionKeyStore): the keystore
+        \param key_id (str): the key's ID
+        """
+
+        self._keystore, self._key_id = keystore, key_id
+        self._shared_signer = None
+
+    @staticmethod
+    def expand_paths(paths):
+        """!\return (List[str]) the given pdfs, and the pdfs found in the given folders and their subfolders"""
+
+        found = []
+        for path in paths:
+            if os.path.isdir(path):
+                for directory, _, names in os.walk(path):
+                    found.extend(os.path.join(directory, name) for name in sorted(names)
+                                 if name.lower().endswith('.pdf'))
+            elif path.lower().endswith('.pdf'):
+                found.append(path)
+        return found
+
+    def enqueue(self, paths, operation):
+        """!It appends pdfs to the queue. If the queue is running, they are processed right away.
+
+        \param paths (List[str]): paths to the pdfs or folders
+        \param operation (str): `sign` or `verify`
+        """
+
+        paths = self.expand_paths(paths)
+        rows = self._model.add(paths, operation)
+        with self._lock:
+            self._pending.extend(zip(rows, paths, [operation] * len(paths)))
+        self.update_status()
+
+    def choose_files(self, operation):
+        """!It lets the user choose many pdfs at once and appends them to the queue.
+
+        \param operation (str): `sign` or `verify`
+        """
+
+        paths = QtWidgets.QFileDialog.getOpenFileNames(self, "Open PDF", self._constants.PDF_DIRECTORY,
+                                                       "PDF Files (*.pdf)")[0]
+        self.enqueue(paths, operation)
+
+    def dragEnterEvent(self, event):
+        """!It accepts files and folders dragged onto the window."""
+
+        if event.mimeData().hasUrls():
+            event.acceptProposedAction()
+
+    def dropEvent(self, event):
+        """!It appends the dropped files and folders to the queue, with the operation chosen in the window."""
+
+        paths = [url.toLocalFile() for url in event.mimeData().urls() if url.isLocalFile()]
+        self.enqueue(paths, self._operation.currentData())
+        event.acceptProposedAction()
+
+    def unlock(self):
+        """!It asks for the PIN, unless the key is already unlocked in this session, and builds the shared signer.
+
+        \return (bool) whether the key is unlocked
+        """
+
+        if self._shared_signer is not None:
+            return True
+        if self._key_path is None and self._keystore is None:
+            self._status.setText("Pendrive z kluczem nie jest podpięty")
+            return False
+        pin, ok = QtWidgets.QInputDialog.getText(self, "Wprowadź dane", "Podaj PIN:",
+                                                 QtWidgets.QLineEdit.EchoMode.Password)
+        if not ok or not pin.isdigit():
+            self._status.setText("Nie podano PIN-u")
+            return False
+        if self._keystore is not None:
+            self._shared_signer = self._keystore.unlock(self._key_id, pin)
+        else:
+            signer = SolutionPDFSigner(key_path=self._key_path, cert_path=self._cert_path)
+            signer.hash_pin(pin)
+            self._shared_signer = signer.shared_signer() if signer.decrypt() else None
+        if self._shared_signer is None:
+            self._status.setText("Niepoprawny PIN")
+            return False
+        return True
+
+    @QtCore.Slot()
+    def start(self):
+        """!It starts processing the queue, with the chosen number of worker threads. The PIN is asked for first, if
+        there are files to sign.
+        """
+
+        with self._lock:
+            needs_key = any(operation == 'sign' for _, _, operation in self._pending)
+        if needs_key and not self.unlock():
+            return
+        self._resume.set()
+        self._button_pause.setText("Wstrzymaj")
+        self._workers = [worker for worker in self._workers if worker.is_alive()]
+        if not self._workers:
+            now = time.perf_counter()
+            self._run = [now, now, self._done, self._bytes]
+        for _ in range(self._worker_count.value() - len(self._workers)):
+            worker = threading.Thread(target=self._work, daemon=True)
+            worker.start()
+            self._workers.append(worker)
+
+    @QtCore.Slot()
+    def toggle_pause(self):
+        """!It pauses or resumes the queue. The files being processed when it is paused are finished."""
+
+        if self._resume.is_set():
+            self._resume.clear()
+            self._button_pause.setText("Wznów")
+        else:
+            self._resume.set()
+            self._button_pause.setText("Wstrzymaj")
+
+    @QtCore.Slot()
+    def cancel(self):
+        """!It drops all the waiting files from the queue. The files being processed are finished."""
+
+        with self._lock:
+            cancelled, self._pending = self._pending, collections.deque()
+        for row, _, _ in cancelled:
+            self._updates.put((row, {'state': "anulowano"}))
+        self._resume.set()
+        self._button_pause.setText("Wstrzymaj")
+
+    @QtCore.Slot()
+    def clear(self):
+        """!It removes all the files from the queue, once no file is being processed."""
+
+        if any(worker.is_alive() for worker in self._workers):
+            self._status.setText("Najpierw anuluj lub poczekaj na zakończenie kolejki")
+            return
+        self.apply_updates()
+        with self._lock:
+            self._pending.clear()
+        self._model.clear()
+        self._done = 0
+        self._bytes = 0
+        self._run = None
+        self.update_status()
+
+    def _next(self):
+        """!\return (Tuple[int, str, str]) the row, path and operation of the next waiting file, or None"""
+
+        with self._lock:
+            return self._pending.popleft() if self._pending else None
+
+    def _work(self):
+        """!The worker threads' loop: it processes the waiting files until there are none left."""
+
+        comparer = None
+        while True:
+            self._resume.wait()
+            job = self._next()
+            if job is None:
+                return
+            row, path, operation = job
+            self._updates.put((row, {'state': "w toku"}))
+            start = time.perf_counter()
+            try:
+                size = os.path.getsize(path)
+                if operation == 'sign':
+                    result = self._sign(path)
+                else:
+                    if comparer is None:
+                        comparer = SolutionHashComparer()
+                        comparer.set_public_key()
+                    result = self._verify(comparer, path)
+                state = "zakończono"
+            except Exception as e:
+                size, result, state = 0, str(e), "błąd"
+            self._updates.put((row, {'state': state, 'result': result, 'seconds': time.perf_counter() - start,
+                                     'size': size}))
+
+    def _sign(self, path):
+        """!It signs a pdf with the session's shared signer. The signed pdf is saved as `signed<name>` in the output
+        directory, and then the original is removed, as in the single file mode.
+
+        \param path (str): path to the pdf
+
+        \return (str) the result's description
+        """
+
+        shared_signer = self._shared_signer
+        if shared_signer is None:
+            raise ValueError("klucz nie jest odblokowany")
+        output_path = SolutionBatch.output_path(path, self._constants.OUTPUT_DIRECTORY)
+        shared_signer.sign_file(path, output_path)
+        os.remove(path)
+        return "podpisano: " + output_path
+
+    @staticmethod
+    def _verify(comparer, path):
+        """!It verifies a pdf.
+
+        \param comparer (SolutionHashComparer): the worker's verifier
+        \param path (str): path to the pdf
+
+        \return (str) the result's description
+        """
+
+        directory, name = os.path.split(path)
+        comparer.set_file(directory + os.sep, name)
+        valid = comparer.verify()
+        if valid == -1:
+            return "plik nie jest podpisany"
+        return "dokument jest poprawny" if valid == 1 else "dokument był zmieniany"
+
+    @QtCore.Slot()
+    def apply_updates(self):
+        """!It applies the results posted by the workers since the last tick to the table, and refreshes the status."""
+
+        updates = {}
+        while True:
+            try:
+                row, changes = self._updates.get_nowait()
+            except queue.Empty:
+                break
+            updates.setdefault(row, {}).update(changes)
+            if 'seconds' in changes:
+                self._done += 1
+                self._bytes += changes['size']
+                self._run[1] = time.perf_counter()
+        if updates:
+            self._model.apply(updates)
+            self.update_status()
+
+    def update_status(self):
+        """!It shows the queue's progress and throughput."""
+
+        with self._lock:
+            waiting = len(self._pending)
+        total = self._model.rowCount()
+        text = "Gotowe: %d / %d, oczekuje: %d" % (self._done, total, waiting)
+        if self._run is not None and self._done > self._run[2]:
+            started, last, done, processed = self._run
+            elapsed = max(last - started, 1e-6)
+            text += ", %.1f dok./s, %.1f MB/s" % ((self._done - done) / elapsed,
+                                                  (self._bytes - processed) / elapsed / 2 ** 20)
+        if not self._resume.is_set():
+            text += " (wstrzymano)"
+        self._status.setText(text)
+
+    def shutdown(self):
+        """!It drops the waiting files and the session's key, so the app can be closed."""
+
+        self.cancel()
+        self._shared_signer = None
@@ -0,0 +1,352 @@
+"""!@package SolutionSharedSigner
+A stateless, reentrant pdf signer, which one thread pool can share.
+
+[SolutionPDFSigner](#SolutionPDFSigner) keeps the document being signed on the object and adds the signature field to
+the file in place, so it can sign only one document at a time. This signer keeps only the unlocked key, its
+certificate and the signing options, none of which change once it is built, and takes the document with every call.
+Each call signs in memory and builds its own signature metadata, validation context and pyhanko writer, so any number
+of threads can sign with one warm signer at once, while their hashing and file I/O (which release the GIL) overlap.
+
+The CMS signer keeps the private key parsed, too: pyhanko parses it from DER again for every raw signature, including
+the dry runs it makes to estimate the signature's size, which took about as long as the RSA signature itself.
+
+A signature can be checked right after it is made (`self_check`), before anything is written to disk: the signature
+dictionary is found in the new revision of the signed pdf still in memory, and the signature is checked against the
+signed bytes and the signer's own certificate. It takes a fraction of a separate verification, which would read and
+parse the saved file again and validate the certificate's trust path.
+
+In the compact output mode (`compact`), the incremental update is written with a cross-reference stream instead of a
+classic xref section, its dictionaries are packed into one compressed object stream, and the signature's `/Contents`
+placeholder is sized to the signature instead of with pyhanko's 50% margin. A timestamp token's size cannot be known
+in advance, so a timestamped signature which does not fit is made again with the margin.
+
+Files of any other kind are signed with detached CMS signatures (`sign_detached()`), saved next to them in `.p7s` files
+(DER encoded, CAdES-BES, with a timestamp token if there is a timestamper). The file is hashed in fixed-size chunks, so
+its size does not matter for the memory used. The signature profiles do not apply to them.
+"""
+
+import asyncio
+import dataclasses
+import hashlib
+import os
+import re
+from io import BytesIO
+
+from Crypto.PublicKey import RSA
+from asn1crypto import cms, keys
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.padding import PKCS1v15
+from pyhanko.keys import load_cert_from_pemder
+from pyhanko.pdf_utils import generic
+from pyhanko.pdf_utils.incremental_writer import IncrementalPdfFileWriter
+from pyhanko.sign import signers
+from pyhanko.sign.fields import SigFieldSpec, SigSeedSubFilter
+from pyhanko.sign.general import SigningError, get_pyca_cryptography_hash
+from pyhanko.sign.signers.pdf_byterange import PdfByteRangeDigest, PreparedByteRangeDigest
+from pyhanko.sign.validation.generic_cms import validate_sig_integrity
+from pyhanko_certvalidator.registry import SimpleCertificateStore
+
+from FileIO import FileIO
+from PinDerivation import PinDerivation
+from SolutionMetrics import SolutionMetrics
+
+
+class WarmSigner(signers.SimpleSigner):
+    """!A CMS signer keeping its RSA key parsed, and recording the time of every raw RSA signature in
+    [SolutionMetrics](#SolutionMetrics). The dry runs pyhanko makes to estimate the signature's size are recorded
+    separately.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """!Constructor, see `SimpleSigner.__init__()`. It parses the private key once. The key is not validated again
+        by OpenSSL (which takes about half a second for a 4096-bit RSA key), as PyCryptodome has checked its
+        consistency when it was decrypted.
+        """
+
+        super().__init__(*args, **kwargs)
+        self._pyca_key = serialization.load_der_private_key(self.signing_key.dump(), password=None,
+                                                            unsafe_skip_rsa_key_validation=True)
+
+    def sign_raw(self, data, digest_algorithm):
+        """!It signs the data with the parsed key, see `SimpleSigner.sign_raw()`."""
+
+        mechanism = self.get_signature_mechanism_for_digest(digest_algorithm).signature_algo
+        if mechanism != 'rsassa_pkcs1v15':
+            return super().sign_raw(data, digest_algorithm)
+        return self._pyca_key.sign(data, PKCS1v15(), get_pyca_cryptography_hash(digest_algorithm))
+
+    async def async_sign_raw(self, data, digest_algorithm, dry_run=False):
+        """!It signs the data, see `SimpleSigner.async_sign_raw()`."""
+
+        with SolutionMetrics.instance().timer('bsk_rsa_sign_seconds', dry_run=str(dry_run).lower()):
+            return await super().async_sign_raw(data, digest_algorithm, dry_run)
+
+
+class CompactPdfFileWriter(IncrementalPdfFileWriter):
+    """!An incremental writer writing its update compactly: with a cross-reference stream, and with the new and updated
+    dictionaries in one compressed object stream. Streams, and the signature dictionary (whose `/Contents` are filled
+    in after the file is written), are written as plain objects.
+    """
+
+    def __init__(self, *args, **kwargs):
+        """!Constructor, see `IncrementalPdfFileWriter.__init__()`. Cross-reference streams need pdf 1.5."""
+
+        super().__init__(*args, **kwargs)
+        self.stream_xrefs = True
+        self.ensure_output_version((1, 5))
+
+    def _write_objects(self, stream, object_position_dict):
+        """!It moves the dictionaries into an object stream, and writes the objects, see
+        `BasePdfFileWriter._write_objects()`.
+        """
+
+        if self.security_handler is None:
+            object_stream = None
+            for (generation, idnum), obj in list(self.objects.items()):
+                if generation != 0 or isinstance(obj, (generic.StreamObject, PdfByteRangeDigest)):
+                    continue
+                object_stream = object_stream or self.prepare_object_stream()
+                object_stream.add_object(idnum, obj)
+                self.objs_in_streams[idnum] = obj
+                del self.objects[(generation, idnum)]
+        super()._write_objects(stream, object_position_dict)
+
+
+class SolutionSharedSigner():
+    """!The shared signer class. It realizes all the functionalities of this package."""
+
+    ## The signature field's name, and its placement on the last page, as in [SolutionPDFSigner](#SolutionPDFSigner).
+    FIELD_NAME = "Signature"
+    FIELD_BOX = (10, 10, 500, 100)
+    ## The byte range of a signature dictionary, as written by pyhanko.
+    BYTE_RANGE = re.compile(rb'/ByteRange\s*\[\s*(\d+)\s+(\d+)\s+(\d+)\s+(\d+)\s*\]')
+    ## The size of the chunks a file signed with a detached signature is hashed in.
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, cms_signer, timestamper=None, profile='basic', trust_store=None, compact=False):
+        """!Constructor.
+
+        \param cms_signer (SimpleSigner): the CMS signer, with the key unlocked (see `build_cms_signer()`)
+        \param timestamper (TimeStamper): the RFC 3161 timestamping client, None for signatures without a trusted time;
+        it has to be thread-safe, like [SolutionTimeStamper](#SolutionTimeStamper)
+        \param profile (str): the signature profile, see [SolutionPDFSigner](#SolutionPDFSigner)
+        \param trust_store (SolutionTrustStore): the source of the embedded validation data, required for the `ltv` and
+        `lta` profiles
+        \param compact (bool): whether the signed pdfs are written in the compact output mode
+        """
+
+        if profile not in ('basic', 'ltv', 'lta'):
+            raise ValueError("Nieznany profil podpisu: " + profile)
+        if profile == 'lta' and timestamper is None:
+            raise ValueError("Profil lta wymaga serwera znaczników czasu")
+        if profile != 'basic' and trust_store is None:
+            raise ValueError("Profil " + profile + " wymaga magazynu zaufanych certyfikatów")
+
+        self._cms_signer = cms_signer
+        self._timestamper = timestamper
+        self._profile = profile
+        self._trust_store = trust_store
+        self._compact = compact
+
+    @staticmethod
+    def build_cms_signer(signing_key, cert):
+        """!It builds a CMS signer from an already decrypted private key, so the key does not have to be read and
+        decrypted again.
+
+        \param signing_key (RsaKey): the decrypted private key
+        \param cert (asn1crypto.x509.Certificate): the key's certificate
+
+        \return (WarmSigner) the signer
+        """
+
+        return WarmSigner(
+            signing_cert=cert, signing_key=keys.PrivateKeyInfo.load(signing_key.export_key(format='DER', pkcs=8)),
+            cert_registry=SimpleCertificateStore.from_certs([cert])
+        )
+
+    @classmethod
+    def from_key_file(cls, key_path, cert_path, pin, timestamper=None, profile='basic', trust_store=None,
+                      compact=False):
+        """!It unlocks an encrypted private key and builds a signer with it.
+
+        \param key_path (str): path to the encrypted private key
+        \param cert_path (str): path to the key's certificate
+        \param pin (str): the key's PIN
+        \param timestamper (TimeStamper): see the constructor
+        \param profile (str): see the constructor
+        \param trust_store (SolutionTrustStore): see the constructor
+        \param compact (bool): see the constructor
+
+        \return (SolutionSharedSigner) the signer, or None if the PIN was wrong
+        """
+
+        with open(key_path, "rb") as file:
+            encrypted_key = file.read()
+        try:
+            signing_key = RSA.import_key(encrypted_key, PinDerivation.passphrase_for(key_path, pin))
+        except ValueError:
+            return None
+        return cls(cls.build_cms_signer(signing_key, load_cert_from_pemder(cert_path)), timestamper, profile,
+                   trust_store, compact)
+
+    def signature_meta(self, field_name=FIELD_NAME):
+        """!\return (PdfSignatureMetadata) new signature metadata of the signer's profile, for a single signature"""
+
+        long_term = self._profile != 'basic'
+        return signers.PdfSignatureMetadata(
+            field_name=field_name, md_algorithm='sha256',
+            subfilter=SigSeedSubFilter.PADES,
+            embed_validation_info=long_term,
+            validation_context=self._trust_store.validation_context() if long_term else None,
+            use_pades_lta=self._profile == 'lta',
+            tight_size_estimates=self._compact
+        )
+
+    def check_signature(self, signed, start=0):
+        """!It checks a signature just made, in memory: the first signature dictionary after `start` has to cover
+        everything before it (and its own dictionary), its digest has to match the signed bytes, and it has to verify
+        with the signer's public key. The pdf is not parsed again, and the certificate's trust path is not validated
+        again, as the signer has loaded the certificate itself.
+
+        \param signed (bytes): the signed pdf
+        \param start (int): the offset the signature's revision starts at (the length of the unsigned pdf)
+
+        \return (bool) whether the signature is correct
+        """
+
+        with SolutionMetrics.instance().timer('bsk_self_check_seconds'):
+            match = self.BYTE_RANGE.search(signed, start)
+            if match is None:
+                return False
+            offset, first, second, length = map(int, match.groups())
+            contents = signed[first:second]
+            if offset != 0 or not start <= first < second or not match.end() <= second + length <= len(signed) \
+                    or contents[:1] != b'<' or contents[-1:] != b'>':
+                return False
+            try:
+                signed_data = cms.ContentInfo.load(bytes.fromhex(contents[1:-1].decode('ascii')))['content']
+                signer_info = signed_data['signer_infos'][0]
+                digest = hashlib.new(signer_info['digest_algorithm']['algorithm'].native)
+                digest.update(memoryview(signed)[:first])
+                digest.update(memoryview(signed)[second:second + length])
+                intact, valid = validate_sig_integrity(signer_info, self._cms_signer.signing_cert, 'data',
+                                                       digest.digest())
+            except (ValueError, KeyError):
+                return False
+            return intact and valid
+
+    @staticmethod
+    def is_placeholder_overflow(error):
+        """!It tells whether a signing error was raised because the signature did not fit its `/Contents`
+        placeholder. pyhanko has no exception type of its own for it, so the error is recognised by where it was
+        raised: the method filling the placeholder, `PreparedByteRangeDigest.fill_reserved_region()`.
+
+        \param error (SigningError): the error
+
+        \return (bool) whether the signature did not fit its placeholder
+        """
+
+        traceback = error.__traceback__
+        if traceback is None:
+            return False
+        while traceback.tb_next is not None:
+            traceback = traceback.tb_next
+        return traceback.tb_frame.f_code is PreparedByteRangeDigest.fill_reserved_region.__code__
+
+    def sign_bytes(self, document, field_name=FIELD_NAME, self_check=False):
+        """!It signs a pdf in memory. The signature field is used if the pdf has an empty one with the given name, and
+        added to the last page otherwise.
+
+        \param document (bytes): the pdf
+        \param field_name (str): the signature field's name
+        \param self_check (bool): whether the signature is checked with `check_signature()` before it is returned
+
+        \return (bytes) the signed pdf
+        """
+
+        metrics = SolutionMetrics.instance()
+        with metrics.timer('bsk_sign_seconds'):
+            try:
+                signed = self._sign(document, self.signature_meta(field_name))
+            except SigningError as error:
+                if not self._compact or self._timestamper is None or not self.is_placeholder_overflow(error):
+                    raise
+                metrics.inc('bsk_compact_resigned_total')
+                signed = self._sign(document, dataclasses.replace(self.signature_meta(field_name),
+                                                                  tight_size_estimates=False))
+        if self_check and not self.check_signature(signed, len(document)):
+            metrics.inc('bsk_self_check_failures_total')
+            raise ValueError("podpis nie przeszedł samokontroli")
+        metrics.inc('bsk_documents_signed_total')
+        metrics.inc('bsk_bytes_processed_total', len(signed), operation='sign')
+        return signed
+
+    def _sign(self, document, signature_meta):
+        """!It signs a pdf in memory, see `sign_bytes()`.
+
+        \param document (bytes): the pdf
+        \param signature_meta (PdfSignatureMetadata): the signature's metadata
+
+        \return (bytes) the signed pdf
+        """
+
+        w = (CompactPdfFileWriter if self._compact else IncrementalPdfFileWriter)(BytesIO(document), strict=False)
+        if len(w.prev.embedded_signatures) > 0:
+            raise ValueError("dokument jest już podpisany")
+        output = BytesIO()
+        signers.sign_pdf(
+            w, signature_meta=signature_meta, signer=self._cms_signer, timestamper=self._timestamper,
+            new_field_spec=SigFieldSpec(sig_field_name=signature_meta.field_name, on_page=-1, box=self.FIELD_BOX),
+            output=output
+        )
+        return output.getvalue()
+
+    def sign_file(self, input_path, output_path, field_name=FIELD_NAME, self_check=False):
+        """!It signs a pdf file, leaving the original untouched. The signed pdf is written atomically, so it is either
+        complete or absent; with `self_check`, it is written only if its signature passes `check_signature()`.
+
+        \param input_path (str): path to the pdf
+        \param output_path (str): path the signed pdf is saved to
+        \param field_name (str): the signature field's name
+        \param self_check (bool): whether the signature is checked before the signed pdf is written
+
+        \return (str) the SHA256 fingerprint of the signed pdf, as a hex string
+        """
+
+        with open(input_path, "rb") as file:
+            signed = self.sign_bytes(file.read(), field_name, self_check)
+        FileIO.atomic_write(output_path, signed)
+        return hashlib.sha256(signed).hexdigest()
+
+    def sign_detached(self, input_path, output_path=None):
+        """!It makes a detached CMS signature of a file of any kind, hashing the file in chunks of `CHUNK_SIZE` bytes.
+        The signature is written atomically, and the file is left untouched.
+
+        \param input_path (str): path to the file
+        \param output_path (str): path the signature is saved to, the file's path with `.p7s` appended by default
+
+        \return (str) path to the signature
+        """
+
+        output_path = output_path or input_path + ".p7s"
+        metrics = SolutionMetrics.instance()
+        with metrics.timer('bsk_sign_seconds'):
+            with open(input_path, "rb") as file:
+                length = os.fstat(file.fileno()).st_size
+                signature = self.sign_data(file)
+        FileIO.atomic_write(output_path, signature)
+        metrics.inc('bsk_documents_signed_total')
+        metrics.inc('bsk_bytes_processed_total', length, operation='sign')
+        return output_path
+
+    def sign_data(self, data):
+        """!It makes a detached CMS signature of arbitrary data, as `sign_detached()` does for a file.
+
+        \param data (bytes|BinaryIO): the data, or a stream it is read from in chunks of `CHUNK_SIZE` bytes
+
+        \return (bytes) the DER encoded signature
+        """
+
+        return asyncio.run(self._cms_signer.async_sign_general_data(
+            data, 'sha256', detached=True, use_cades=True, timestamper=self._timestamper, chunk_size=self.CHUNK_SIZE
+        )).dump()
@@ -0,0 +1,120 @@
+"""!@package SolutionTimeStamper
+An RFC 3161 timestamping client for pyhanko, which keeps a pool of persistent HTTP connections to the TSA.
+
+pyhanko runs every signature in its own event loop, so a client session bound to a loop cannot be carried over from one
+document to the next, and its default client opens a new connection for every request. This client uses blocking
+keep-alive connections instead, taken from a thread-safe pool, so consecutive and concurrent signatures reuse
+established connections (and TLS sessions). Failed requests are retried with exponential backoff.
+"""
+
+import asyncio
+import http.client
+import queue
+import threading
+import time
+from urllib.parse import urlsplit
+
+from asn1crypto import tsp
+from pyhanko.sign.timestamps import TimeStamper, TimestampRequestError
+
+
+class SolutionTimeStamper(TimeStamper):
+    """!The timestamping client class. It realizes all the functionalities of this package."""
+
+    def __init__(self, url, max_connections=4, timeout=5, retries=3, backoff=0.2):
+        """!Constructor.
+
+        \param url (str): the TSA's URL (`http://` or `https://`)
+        \param max_connections (int): how many requests may be in flight at once, and connections kept open
+        \param timeout (float): the timeout of a single request, in seconds
+        \param retries (int): how many times a failed request is retried
+        \param backoff (float): the delay before the first retry, in seconds, doubled after every retry
+        """
+
+        super().__init__()
+        parts = urlsplit(url)
+        if parts.scheme not in ('http', 'https'):
+            raise ValueError("Nieobsługiwany adres serwera znaczników czasu: " + url)
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self._host = parts.hostname
+        self._port = parts.port
+        self._path = (parts.path or '/') + ('?' + parts.query if parts.query else '')
+        self._timeout = timeout
+        self._retries = retries
+        self._backoff = backoff
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+
+    def _acquire(self):
+        """!\return (HTTPConnection) an idle connection from the pool, or a new one"""
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            return self._connection_class(self._host, self._port, timeout=self._timeout)
+
+    def _post(self, connection, body):
+        """!It sends a single timestamp request.
+
+        \param connection (HTTPConnection): the connection
+        \param body (bytes): the DER-encoded request
+
+        \return (Tuple[int, str, bytes, bool]) the status code, media type (in lower case, without the parameters of its
+        content type) and body of the response, and whether the connection can be reused
+        """
+
+        connection.request('POST', self._path, body=body, headers={'Content-Type': 'application/timestamp-query',
+                                                                     'Accept': 'application/timestamp-reply'})
+        response = connection.getresponse()
+        data = response.read()
+        return response.status, response.headers.get_content_type(), data, not response.will_close
+
+    def request_tsa_response_sync(self, req):
+        """!It sends a timestamp request over a pooled connection, retrying transient failures.
+
+        \param req (tsp.TimeStampReq): the request
+
+        \return (tsp.TimeStampResp) the TSA's response
+        """
+
+        body = req.dump()
+        error = None
+        for attempt in range(self._retries + 1):
+            if attempt > 0:
+                time.sleep(self._backoff * 2 ** (attempt - 1))
+            with self._slots:
+                connection = self._acquire()
+                try:
+                    status, content_type, data, reusable = self._post(connection, body)
+                except (OSError, http.client.HTTPException) as e:
+                    connection.close()
+                    error = e
+                    continue
+                if reusable:
+                    self._idle.put(connection)
+                else:
+                    connection.close()
+            if status >= 500:
+                error = TimestampRequestError("Serwer znaczników czasu zwrócił kod %d" % status)
+                continue
+            if status != 200 or content_type != 'application/timestamp-reply':
+                raise TimestampRequestError("Niepoprawna odpowiedź serwera znaczników czasu (kod %d, typ %s)"
+                                            % (status, content_type))
+            return tsp.TimeStampResp.load(data)
+        raise TimestampRequestError("Serwer znaczników czasu jest niedostępny: " + str(error))
+
+    async def async_request_tsa_response(self, req):
+        """!It sends a timestamp request without blocking pyhanko's event loop, see
+        `TimeStamper.async_request_tsa_response()`.
+        """
+
+        return await asyncio.to_thread(self.request_tsa_response_sync, req)
+
+    def close(self):
+        """!It closes all the idle connections."""
+
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
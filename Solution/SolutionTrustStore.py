@@ -0,0 +1,172 @@
+"""!@package SolutionTrustStore
+A store of trusted certificates for validating signatures of many signers. Certificates are indexed by their subject
+key identifier and by their issuer and serial number, so the signer's certificate referenced by a signature is found
+with a single dictionary lookup, regardless of the number of signers.
+
+Self-signed certificates (the local CA's root, or legacy per-signer certificates) become trust roots, all the others
+are treated as intermediate or signer certificates. CRLs (`*.crl` files, e.g. the local CA's) found in the store's
+directories are used as revocation data, and embedded in long-term validation signatures.
+"""
+
+import glob
+import os
+
+from asn1crypto import cms, crl, pem
+from pyhanko.keys import load_certs_from_pemder
+from pyhanko.sign.validation import DocumentSecurityStore
+from pyhanko.sign.validation.errors import NoDSSFoundError
+from pyhanko_certvalidator import ValidationContext
+
+
+class SolutionTrustStore():
+    """!The trust store class. It realizes all the functionalities of this package."""
+
+    def __init__(self, cert_paths=(), directories=()):
+        """!Constructor. It loads and indexes all the given certificates.
+
+        \param cert_paths (Iterable[str]): paths to certificate files (.pem or .der)
+        \param directories (Iterable[str]): directories, all of whose `*.pem`, `*.crt` and `*.der` files are loaded
+        as certificates, and `*.crl` files as CRLs
+        """
+
+        self._by_key_id = {}
+        self._by_issuer_serial = {}
+        self._roots = []
+        self._others = []
+        self._crls = []
+        self._validation_context = None
+
+        paths = [path for path in cert_paths if os.path.isfile(path)]
+        for directory in directories:
+            for pattern in ("*.pem", "*.crt", "*.der"):
+                paths.extend(sorted(glob.glob(os.path.join(directory, pattern))))
+        for path in paths:
+            for cert in load_certs_from_pemder([path]):
+                self.add(cert)
+        for directory in directories:
+            for path in sorted(glob.glob(os.path.join(directory, "*.crl"))):
+                self.add_crl(path)
+
+    def __len__(self):
+        """!\return (int) the number of certificates in the store"""
+
+        return len(self._by_issuer_serial)
+
+    @staticmethod
+    def issuer_serial_key(issuer, serial_number):
+        """!\return (Tuple[bytes, int]) the index key of a certificate's issuer and serial number"""
+
+        return issuer.sha256, serial_number
+
+    def add(self, cert):
+        """!It adds a certificate to the store and its indexes.
+
+        \param cert (asn1crypto.x509.Certificate): the certificate
+        """
+
+        key = self.issuer_serial_key(cert.issuer, cert.serial_number)
+        if key in self._by_issuer_serial:
+            return
+        self._by_issuer_serial[key] = cert
+        if cert.key_identifier is not None:
+            self._by_key_id[cert.key_identifier] = cert
+        if cert.self_signed != 'no':
+            self._roots.append(cert)
+        else:
+            self._others.append(cert)
+        self._validation_context = None
+
+    def add_crl(self, path):
+        """!It adds a CRL to the store.
+
+        \param path (str): path to the CRL (.pem or .der)
+        """
+
+        with open(path, "rb") as file:
+            data = file.read()
+        if pem.detect(data):
+            _, _, data = pem.unarmor(data)
+        self._crls.append(crl.CertificateList.load(data))
+        self._validation_context = None
+
+    @property
+    def roots(self):
+        """!\return (List[asn1crypto.x509.Certificate]) the trust roots"""
+
+        return list(self._roots)
+
+    def lookup(self, sid):
+        """!It finds the certificate referenced by a CMS signer identifier.
+
+        \param sid (asn1crypto.cms.SignerIdentifier): the signer identifier of a signature
+
+        \return (asn1crypto.x509.Certificate) the certificate, or None if the signer is unknown
+        """
+
+        if sid.name == 'subject_key_identifier':
+            return self._by_key_id.get(sid.chosen.native)
+        issuer_and_serial: cms.IssuerAndSerialNumber = sid.chosen
+        return self._by_issuer_serial.get(self.issuer_serial_key(issuer_and_serial['issuer'],
+                                                                 issuer_and_serial['serial_number'].native))
+
+    def lookup_issuer(self, cert):
+        """!It finds the issuer of a certificate, by its authority key identifier or, if there is none, by its name.
+
+        \param cert (asn1crypto.x509.Certificate): the certificate
+
+        \return (asn1crypto.x509.Certificate) the issuer's certificate, or None if the issuer is unknown
+        """
+
+        if cert.authority_key_identifier is not None:
+            return self._by_key_id.get(cert.authority_key_identifier)
+        for root in self._roots:
+            if root.subject == cert.issuer:
+                return root
+        return None
+
+    def lookup_signer(self, embedded_sig):
+        """!It finds the certificate of the signer of a pdf signature. The signer is known if its certificate is in the
+        store, or if the certificate embedded in the signature was issued by a certificate in the store.
+
+        \param embedded_sig (EmbeddedPdfSignature): the signature, or anything else with its `signer_info` and
+        `signer_cert` (e.g. a detached signature, see [SolutionDetachedVerifier](#SolutionDetachedVerifier))
+
+        \return (asn1crypto.x509.Certificate) the certificate, or None if the signer is unknown
+        """
+
+        cert = self.lookup(embedded_sig.signer_info['sid'])
+        if cert is not None:
+            return cert
+        cert = embedded_sig.signer_cert
+        if cert is None or cert.self_signed != 'no' or self.lookup_issuer(cert) is None:
+            return None
+        return cert
+
+    def validation_context(self):
+        """!It builds a validation context trusting the roots of the store, with the store's CRLs. It is built once
+        and reused until the store changes.
+
+        \return (ValidationContext) the validation context
+        """
+
+        if self._validation_context is None:
+            self._validation_context = ValidationContext(trust_roots=list(self._roots), other_certs=list(self._others),
+                                                         crls=list(self._crls))
+        return self._validation_context
+
+    def offline_validation_context(self, reader):
+        """!It builds a validation context for a pdf carrying its own validation data in a DSS (Document Security
+        Store). Apart from the trust roots of the store, only the certificates and revocation data embedded in the
+        document are used, nothing is fetched, and revocation data is required for certificates that point to it.
+
+        \param reader (PdfFileReader): the pdf
+
+        \return (ValidationContext) the validation context, or None if the pdf has no DSS
+        """
+
+        try:
+            dss = DocumentSecurityStore.read_dss(reader)
+        except NoDSSFoundError:
+            return None
+        return dss.as_validation_context({'trust_roots': list(self._roots), 'allow_fetching': False,
+                                          'revocation_mode': 'hard-fail'})
@@ -0,0 +1,111 @@
+"""!@package SolutionVerificationCache
+The verdicts of earlier verifications, so a document that only grew by incremental updates since it was last verified
+is not validated from scratch (see [SolutionHashComparer](#SolutionHashComparer)).
+
+For every document, by its absolute path, the cache keeps the length and the SHA256 fingerprint of the verified bytes,
+the number of revisions they held, and the verdict of every signature (by its field's name and signed revision). When
+the document still starts with the verified bytes, only the revisions appended after them are examined: the signatures
+they add are validated, and the earlier signatures are only checked for the modifications the new revisions make. The
+cache is kept in a JSON file on the host. A verification only changes the cache in memory; the file is rewritten,
+atomically, by `flush()`, once per batch of verifications rather than once per document.
+"""
+
+import hashlib
+import json
+import os
+import threading
+from collections import namedtuple
+
+from FileIO import FileIO
+
+
+VerifiedDocument = namedtuple('VerifiedDocument', ['length', 'sha256', 'revisions', 'signatures'])
+VerifiedSignature = namedtuple('VerifiedSignature', ['field', 'revision', 'valid'])
+
+
+class SolutionVerificationCache():
+    """!The verification cache class. It realizes all the functionalities of this package."""
+
+    def __init__(self, path="verified.json"):
+        """!Constructor. It loads the cache.
+
+        \param path (str): path to the cache's file
+        """
+
+        self._path = path
+        self._lock = threading.Lock()
+        self._documents = self.load()
+        self._dirty = False
+
+    def load(self):
+        """!\return (dict) the cached documents, by path"""
+
+        try:
+            with open(self._path, "r", encoding='utf-8') as file:
+                documents = json.load(file)['documents']
+        except (FileNotFoundError, ValueError, KeyError):
+            return {}
+        return {path: VerifiedDocument(entry['length'], entry['sha256'], entry['revisions'],
+                                       [VerifiedSignature(*signature) for signature in entry['signatures']])
+                for path, entry in documents.items()}
+
+    def save(self):
+        """!It atomically writes the cache. The lock is held until the file is replaced, so two writers cannot save
+        their snapshots in the reverse order.
+        """
+
+        with self._lock:
+            documents = {path: dict(entry._asdict(), signatures=[list(signature) for signature in entry.signatures])
+                         for path, entry in self._documents.items()}
+            FileIO.atomic_write(self._path, json.dumps({'documents': documents}, indent=2).encode('utf-8'))
+            self._dirty = False
+
+    def flush(self):
+        """!It saves the cache if a verification has been stored since it was last saved."""
+
+        if self._dirty:
+            self.save()
+
+    def lookup(self, path):
+        """!\return (VerifiedDocument) the document's last verification, or None if it has not been verified"""
+
+        with self._lock:
+            return self._documents.get(os.path.abspath(path))
+
+    def store(self, path, document):
+        """!It records a document's verification in memory; it is saved by the next `flush()`.
+
+        \param path (str): path to the document
+        \param document (VerifiedDocument): the verification
+        """
+
+        with self._lock:
+            self._documents[os.path.abspath(path)] = document
+            self._dirty = True
+
+    @staticmethod
+    def read_prefix(file, entry):
+        """!It checks whether a file still starts with the bytes verified before, and fingerprints the whole file, in a
+        single pass.
+
+        \param file (BinaryIO): the file, positioned at its start
+        \param entry (VerifiedDocument): the last verification, or None
+
+        \return (Tuple[bool, str]) whether the verified bytes are unchanged, and the SHA256 fingerprint of the file
+        """
+
+        digest = hashlib.sha256()
+        unchanged = entry is not None
+        remaining = entry.length if entry is not None else 0
+        while remaining > 0:
+            chunk = file.read(min(remaining, 1024 * 1024))
+            if not chunk:
+                unchanged = False
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+        if unchanged:
+            unchanged = digest.hexdigest() == entry.sha256
+        for chunk in iter(lambda: file.read(1024 * 1024), b''):
+            digest.update(chunk)
+        return unchanged, digest.hexdigest()
@@ -1,22 +1,35 @@
 """!@package main
 
-The entrypoint to the main app. It starts the widget and a thread checking for a pendrive with a key.
+The entrypoint to the main app. It starts the widget, which looks for a pendrive with a key in the background.
+
+Usage: `python main.py [--keystore <directory> --key-id <id>]`; with a keystore (see
+[SolutionKeyStore](#SolutionKeyStore)), the app signs with the given key of it instead of the pendrive's key.
 """
 
+import argparse
 import sys
-import threading
 
 from PySide6 import QtWidgets
 
 from SolutionGUI import SolutionGUI
+from SolutionKeyStore import SolutionKeyStore
 
 if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="ProjectBSK signing app")
+    parser.add_argument('--keystore', default=None)
+    parser.add_argument('--key-id', default=None)
+    args = parser.parse_args()
+
+    keystore = None
+    if args.keystore is not None:
+        keystore = SolutionKeyStore(args.keystore)
+        if args.key_id is None or keystore.find(key_id=args.key_id) is None:
+            parser.error("--keystore wymaga --key-id klucza z magazynu kluczy")
+
     app = QtWidgets.QApplication([])
 
-    widget = SolutionGUI()
+    widget = SolutionGUI(keystore, args.key_id)
     widget.resize(800, 600)
     widget.setWindowTitle("Adam Zarzycki 193243")
     widget.show()
-    sign_on_start = threading.Thread(widget.sign_if_pendrive_on_start())
-    sign_on_start.start()
     sys.exit(app.exec())